@@ -3,10 +3,24 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from config import config
+from .utils.job_queue import JobQueue
+from .utils.generation_cache import GenerationCache
+from .utils.llm_client import LLMClient
+from .utils.rate_limit import RateLimiter
+from .utils.single_flight import SingleFlight
+from .utils.access import AccessCache
+from .utils.response_cache import ResponseCache
 
 # 初始化扩展
 db = SQLAlchemy()
 jwt = JWTManager()
+job_queue = JobQueue()
+generation_cache = GenerationCache()
+llm_client = LLMClient()
+rate_limiter = RateLimiter()
+single_flight = SingleFlight()
+access_cache = AccessCache()
+response_cache = ResponseCache()
 
 def create_app(config_name='default'):
     app = Flask(__name__)
@@ -16,6 +30,12 @@ def create_app(config_name='default'):
     db.init_app(app)
     jwt.init_app(app)
     CORS(app)
+    generation_cache.init_app(app)
+    llm_client.init_app(app)
+    rate_limiter.init_app(app)
+    single_flight.init_app(app)
+    access_cache.init_app(app)
+    response_cache.init_app(app)
     
     # 注册蓝图
     from .api.users import users_bp
@@ -26,4 +46,11 @@ def create_app(config_name='default'):
     app.register_blueprint(requirements_bp, url_prefix='/api/requirements')
     app.register_blueprint(test_blueprint)
     
+    # 所有模型均已导入，创建表并执行迁移
+    from .utils.migrations import init_migrations
+    init_migrations(app)
+    
+    # 蓝图注册后再启动任务队列，确保任务处理函数均已注册
+    job_queue.init_app(app)
+    
     return app
\ No newline at end of file
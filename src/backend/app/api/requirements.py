@@ -1,11 +1,30 @@
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, request, jsonify, current_app, send_file, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.requirement import Requirement, UserRequirement, RequirementContent
 from ..models.document import RequirementDocument
+from ..models.job import GenerationJob
+from ..models.upload import UploadSession
 from ..models.user import User
-from .. import db
+from .. import db, generation_cache, rate_limiter, single_flight, access_cache, response_cache
 from ..utils.llm_integration import DocumentGenerator
+from ..utils.storage import detect_content_type, temp_path, copy_stream, safe_filename
+from ..utils import blob_store
+from ..utils.text_extraction import request_extraction
+from ..utils.uploads import session_expiry, schedule_cleanup
+from ..utils.access import requirement_access
+from ..utils.http_cache import bump_revision, revalidated
+from ..utils.compression import compress_body, negotiate_encoding
+from ..utils.file_urls import signed_file_url, verify_file_signature
+from ..utils.documents import (
+    GENERATION_MODES, GENERATION_PURPOSES, build_requirement_data, content_sources, enqueue_generation_job,
+    save_document_version, lookup_document_version, generation_flight_key, newer_version_lookup,
+    expire_stale_job
+)
 import uuid
+import json
+import base64
+import mimetypes
+from urllib.parse import quote
 from datetime import datetime
 import os
 import time
@@ -17,6 +36,74 @@ logger = logging.getLogger(__name__)
 
 requirements_bp = Blueprint('requirements', __name__)
 
+
+# 需求列表分页大小
+LIST_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 200
+
+# 需求内容分页上限及流式输出时每批加载的行数
+CONTENT_MAX_PAGE_SIZE = 500
+CONTENT_STREAM_BATCH = 200
+
+
+def _encode_list_cursor(requirement):
+    """将分页位置(updated_at, id)编码为不透明的游标字符串"""
+    raw = f"{requirement.updated_at.isoformat()}|{requirement.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_list_cursor(cursor):
+    if not cursor:
+        return None
+    raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+    updated_at, req_id = raw.split('|', 1)
+    return datetime.fromisoformat(updated_at), req_id
+
+
+# 上传文件按内容寻址存储，内容不会变化，浏览器可长期缓存
+FILE_CACHE_MAX_AGE = 365 * 24 * 3600
+
+
+def _private_file_cache(response):
+    """文件需要登录才能访问，只允许浏览器缓存，禁止共享缓存"""
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = FILE_CACHE_MAX_AGE
+    return response
+
+
+def _inline_disposition(file_name):
+    return f"inline; filename*=UTF-8''{quote(file_name)}"
+
+
+def _force_regenerate():
+    """请求是否要求跳过生成缓存（?force=1）"""
+    return request.args.get('force', '').lower() in ('1', 'true', 'yes')
+
+
+def _generation_mode():
+    """请求指定的生成方式（?mode=auto|full|incremental），无效值返回None"""
+    mode = request.args.get('mode', 'auto').lower()
+    return mode if mode in GENERATION_MODES else None
+
+
+def _generation_rate_limited(user_id, req_id):
+    """文档生成限流（按用户和按需求的令牌桶），超出限额时返回429响应，否则返回None"""
+    retry_after = rate_limiter.check_generation(user_id, req_id)
+    if not retry_after:
+        return None
+    response = jsonify({'message': 'Too many document generation requests', 'retry_after': retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _generation_purpose(default='final'):
+    """请求指定的生成用途（?purpose=final|preview），用于选择模型，无效值返回None"""
+    purpose = request.args.get('purpose', default).lower()
+    return purpose if purpose in GENERATION_PURPOSES else None
+
+
 @requirements_bp.route('/create', methods=['POST'])
 @jwt_required()
 def create_requirement():
@@ -47,6 +134,7 @@ def create_requirement():
         
         db.session.add(user_req)
         db.session.commit()
+        response_cache.invalidate_lists([current_user_id])
         
         return jsonify({
             'message': 'Requirement created successfully',
@@ -58,48 +146,76 @@ def create_requirement():
 
 @requirements_bp.route('/<req_id>/invite', methods=['POST'])
 @jwt_required()
+@requirement_access('creator')
 def invite_member(req_id):
     try:
-        current_user_id = get_jwt_identity()
         data = request.get_json()
         
         # 验证输入
         if not data or not data.get('user_ids'):
             return jsonify({'message': 'User IDs are required'}), 400
         
-        # 检查需求任务是否存在
-        requirement = Requirement.query.get(req_id)
-        if not requirement:
-            return jsonify({'message': 'Requirement not found'}), 404
-        
-        # 验证当前用户是任务创建者
-        # 确保类型一致再比较
-        if str(requirement.creator_id) != current_user_id:
-            return jsonify({'message': 'Permission denied'}), 403
+        # 规范化并去重用户ID，保持请求中的顺序
+        results = {}
+        user_ids = []
+        for raw_id in data['user_ids']:
+            try:
+                user_id = int(raw_id)
+            except (TypeError, ValueError):
+                results[str(raw_id)] = 'invalid'
+                continue
+            if user_id not in user_ids:
+                user_ids.append(user_id)
+        
+        # 一次查询取得所有被邀请用户及其现有成员关系
+        rows = db.session.query(User, UserRequirement.user_id)\
+            .outerjoin(UserRequirement, db.and_(
+                UserRequirement.user_id == User.id,
+                UserRequirement.requirement_id == req_id
+            ))\
+            .filter(User.id.in_(user_ids)).all() if user_ids else []
+        found = {user.id: (user, member_id is not None) for user, member_id in rows}
         
-        # 邀请用户
         invited_users = []
-        for user_id in data['user_ids']:
-            user = User.query.get(user_id)
-            if not user:
-                continue
-            
-            # 检查是否已关联
-            if not UserRequirement.query.get((user_id, req_id)):
-                user_req = UserRequirement(
-                    user_id=user_id,
-                    requirement_id=req_id,
-                    role='member',
-                    joined_at=datetime.utcnow()
+        new_ids = []
+        for user_id in user_ids:
+            if user_id not in found:
+                results[str(user_id)] = 'not_found'
+            elif found[user_id][1]:
+                results[str(user_id)] = 'already_member'
+            else:
+                results[str(user_id)] = 'invited'
+                new_ids.append(user_id)
+                invited_users.append(found[user_id][0].to_dict())
+        
+        if new_ids:
+            # 单条INSERT ... SELECT语句批量写入，并跳过并发请求中已加入的成员
+            existing = db.select(UserRequirement.user_id).where(
+                UserRequirement.user_id == User.id,
+                UserRequirement.requirement_id == req_id
+            ).exists()
+            select_new = db.select(
+                User.id,
+                db.literal(req_id),
+                db.literal('member'),
+                db.literal(datetime.utcnow())
+            ).where(User.id.in_(new_ids), ~existing)
+            db.session.execute(
+                db.insert(UserRequirement).from_select(
+                    ['user_id', 'requirement_id', 'role', 'joined_at'], select_new
                 )
-                db.session.add(user_req)
-                invited_users.append(user.to_dict())
+            )
+            bump_revision(req_id)
         
         db.session.commit()
+        # 新成员此前可能缓存了无权限的结果
+        access_cache.invalidate(req_id, new_ids)
+        response_cache.invalidate_lists(new_ids)
         
         return jsonify({
             'message': f'{len(invited_users)} users invited successfully',
-            'invited_users': invited_users
+            'invited_users': invited_users,
+            'results': results
         }), 200
     except Exception as e:
         db.session.rollback()
@@ -107,47 +223,63 @@ def invite_member(req_id):
 
 @requirements_bp.route('/list', methods=['GET'])
 @jwt_required()
+@response_cache.cached('requirements', scope='user')
 def list_requirements():
     try:
         current_user_id = get_jwt_identity()
         
-        # 获取用户参与的所有需求任务
-        user_requirements = UserRequirement.query.filter_by(user_id=current_user_id).all()
-        req_ids = [ur.requirement_id for ur in user_requirements]
-        
-        # 查询需求任务
-        requirements = Requirement.query.filter(Requirement.id.in_(req_ids)).all()
+        # 分页参数：limit每页数量，cursor为上一页返回的next_cursor
+        try:
+            limit = min(max(int(request.args.get('limit', LIST_PAGE_SIZE)), 1), LIST_MAX_PAGE_SIZE)
+            cursor = _decode_list_cursor(request.args.get('cursor'))
+        except (TypeError, ValueError):
+            return jsonify({'message': 'Invalid limit or cursor'}), 400
+        status = request.args.get('status')
+        
+        # 一次联表查询同时取得需求、当前用户角色和创建者用户名
+        query = db.session.query(Requirement, UserRequirement.role, User.username)\
+            .join(UserRequirement, UserRequirement.requirement_id == Requirement.id)\
+            .outerjoin(User, User.id == Requirement.creator_id)\
+            .filter(UserRequirement.user_id == current_user_id)
+        
+        if status:
+            query = query.filter(Requirement.status == status)
+        
+        if cursor:
+            cursor_updated_at, cursor_id = cursor
+            query = query.filter(db.or_(
+                Requirement.updated_at < cursor_updated_at,
+                db.and_(Requirement.updated_at == cursor_updated_at, Requirement.id < cursor_id)
+            ))
+        
+        # 多取一条用于判断是否还有下一页
+        rows = query.order_by(Requirement.updated_at.desc(), Requirement.id.desc())\
+            .limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
-        # 为每个需求添加用户角色信息
         requirements_with_role = []
-        for req in requirements:
-            # 查找当前用户在该需求中的角色
-            user_req = UserRequirement.query.get((current_user_id, req.id))
-            req_dict = req.to_dict()
-            req_dict['role'] = user_req.role if user_req else 'member'
+        for req, role, creator_name in rows:
+            req_dict = req.to_dict(creator_name=creator_name or 'Unknown')
+            req_dict['role'] = role or 'member'
             requirements_with_role.append(req_dict)
         
+        next_cursor = _encode_list_cursor(rows[-1][0]) if has_more else None
+        
         return jsonify({
-            'requirements': requirements_with_role
+            'requirements': requirements_with_role,
+            'next_cursor': next_cursor
         }), 200
     except Exception as e:
         return jsonify({'message': 'Error fetching requirements', 'error': str(e)}), 500
 
 @requirements_bp.route('/<req_id>', methods=['GET'])
 @jwt_required()
+@requirement_access()
+@revalidated('requirement', last_modified=True)
 def get_requirement(req_id):
     try:
-        current_user_id = get_jwt_identity()
-        
-        # 检查需求任务是否存在
         requirement = Requirement.query.get(req_id)
-        if not requirement:
-            return jsonify({'message': 'Requirement not found'}), 404
-        
-        # 检查用户是否有权限访问
-        user_req = UserRequirement.query.get((current_user_id, req_id))
-        if not user_req:
-            return jsonify({'message': 'Permission denied'}), 403
         
         return jsonify({
             'requirement': requirement.to_dict()
@@ -157,31 +289,18 @@ def get_requirement(req_id):
 
 @requirements_bp.route('/<req_id>/participants', methods=['GET'])
 @jwt_required()
+@requirement_access()
+@revalidated('participants')
 def get_participants(req_id):
     try:
-        current_user_id = get_jwt_identity()
-        
-        # 检查需求任务是否存在
-        requirement = Requirement.query.get(req_id)
-        if not requirement:
-            return jsonify({'message': 'Requirement not found'}), 404
-        
-        # 检查用户是否有权限访问
-        user_req = UserRequirement.query.get((current_user_id, req_id))
-        if not user_req:
-            return jsonify({'message': 'Permission denied'}), 403
-        
-        # 获取参与者列表
-        user_requirements = UserRequirement.query.filter_by(requirement_id=req_id).all()
-        participants = []
-        for ur in user_requirements:
-            user = User.query.get(ur.user_id)
-            if user:
-                participants.append({
-                    'id': user.id,
-                    'username': user.username,
-                    'role': ur.role
-                })
+        # 一次联表查询获取参与者列表
+        rows = db.session.query(User.id, User.username, UserRequirement.role)\
+            .join(UserRequirement, UserRequirement.user_id == User.id)\
+            .filter(UserRequirement.requirement_id == req_id).all()
+        participants = [
+            {'id': user_id, 'username': username, 'role': role}
+            for user_id, username, role in rows
+        ]
         
         return jsonify({
             'participants': participants
@@ -191,45 +310,68 @@ def get_participants(req_id):
 
 @requirements_bp.route('/<req_id>/contents', methods=['GET'])
 @jwt_required()
+@requirement_access()
+@revalidated('contents')
+@response_cache.cached('contents')
 def get_contents(req_id):
     try:
-        current_user_id = get_jwt_identity()
-        
-        # 检查需求任务是否存在
-        requirement = Requirement.query.get(req_id)
-        if not requirement:
-            return jsonify({'message': 'Requirement not found'}), 404
-        
-        # 检查用户是否有权限访问
-        user_req = UserRequirement.query.get((current_user_id, req_id))
-        if not user_req:
-            return jsonify({'message': 'Permission denied'}), 403
-        
-        # 获取已提交内容
-        contents = RequirementContent.query.filter_by(requirement_id=req_id).all()
+        # fields参数选择输出字段，例如列表视图可省略content_text
+        fields = None
+        if request.args.get('fields'):
+            fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+            unknown = set(fields) - set(RequirementContent.SERIALIZABLE_FIELDS)
+            if unknown:
+                return jsonify({'message': f"Unknown fields: {', '.join(sorted(unknown))}"}), 400
+            if 'id' not in fields:
+                fields.insert(0, 'id')
+        
+        try:
+            limit = int(request.args['limit']) if request.args.get('limit') else None
+            cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError:
+            return jsonify({'message': 'Invalid limit or cursor'}), 400
+        
+        query = RequirementContent.query.filter_by(requirement_id=req_id)
+        if fields:
+            query = query.options(db.load_only(*[getattr(RequirementContent, f) for f in fields]))
+        if cursor is not None:
+            query = query.filter(RequirementContent.id > cursor)
+        query = query.order_by(RequirementContent.id)
+        
+        # 完整导出时以流的形式逐条输出，避免一次性加载全部内容
+        if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+            def generate():
+                yield '{"contents": ['
+                for i, content in enumerate(query.yield_per(CONTENT_STREAM_BATCH)):
+                    yield (',' if i else '') + json.dumps(content.to_dict(fields), ensure_ascii=False)
+                yield ']}'
+            
+            return Response(stream_with_context(generate()), mimetype='application/json')
+        
+        # 未指定limit时返回全部内容，指定时按id做键集分页
+        if limit is None:
+            contents = query.all()
+            next_cursor = None
+        else:
+            limit = min(max(limit, 1), CONTENT_MAX_PAGE_SIZE)
+            contents = query.limit(limit + 1).all()
+            next_cursor = str(contents[limit - 1].id) if len(contents) > limit else None
+            contents = contents[:limit]
         
         return jsonify({
-            'contents': [content.to_dict() for content in contents]
+            'contents': [content.to_dict(fields) for content in contents],
+            'next_cursor': next_cursor
         }), 200
     except Exception as e:
         return jsonify({'message': 'Error fetching contents', 'error': str(e)}), 500
 
 @requirements_bp.route('/<req_id>/submit', methods=['POST'])
 @jwt_required()
+@requirement_access()
 def submit_content(req_id):
     try:
         current_user_id = get_jwt_identity()
         
-        # 检查需求任务是否存在
-        requirement = Requirement.query.get(req_id)
-        if not requirement:
-            return jsonify({'message': 'Requirement not found'}), 404
-        
-        # 检查用户是否有权限提交
-        user_req = UserRequirement.query.get((current_user_id, req_id))
-        if not user_req:
-            return jsonify({'message': 'Permission denied'}), 403
-        
         # 处理文本内容
         text_content = request.form.get('text', '')
         
@@ -238,29 +380,19 @@ def submit_content(req_id):
         
         # 处理文件上传
         file_path = None
+        file_name = None
+        content_hash = None
         
         if 'file' in request.files:
             file = request.files['file']
             if file and file.filename != '':
-                # 创建上传目录
-                upload_dir = current_app.config['UPLOAD_FOLDER']
-                if not os.path.exists(upload_dir):
-                    os.makedirs(upload_dir)
-                
-                # 保存文件
-                filename = f"{req_id}_{uuid.uuid4().hex}_{file.filename}"
-                file_path = os.path.join(upload_dir, filename)
-                file.save(file_path)
+                # 写入内容寻址存储，相同文件只保存一份
+                file_name = safe_filename(file.filename)
+                content_hash, file_path = blob_store.store_stream(file.stream)
                 
                 # 如果上传了文件，但内容类型已经设置为markdown，则保留markdown类型
                 # 否则根据文件类型设置内容类型
-                if content_type != 'markdown':
-                    if file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                        content_type = 'image'
-                    elif file.filename.lower().endswith('.mp3'):
-                        content_type = 'audio'
-                    else:
-                        content_type = 'file'
+                content_type = detect_content_type(file.filename, content_type)
         
         # 保存内容记录
         content_record = RequirementContent(
@@ -268,12 +400,18 @@ def submit_content(req_id):
             content_type=content_type,
             content_text=text_content if content_type in ['text', 'markdown'] else None,
             file_path=file_path,
+            file_name=file_name,
+            content_hash=content_hash,
             submitted_by=current_user_id
         )
         
         db.session.add(content_record)
+        bump_revision(req_id)
         db.session.commit()
         
+        # 附件文本（语音转写、PDF文本、图片OCR）在后台提取，供后续生成文档使用
+        request_extraction(content_record)
+        
         return jsonify({
             'message': 'Content submitted successfully',
             'content': content_record.to_dict()
@@ -282,148 +420,425 @@ def submit_content(req_id):
         db.session.rollback()
         return jsonify({'message': 'Error submitting content', 'error': str(e)}), 500
 
-@requirements_bp.route('/<req_id>/generate-document', methods=['POST'])
+@requirements_bp.route('/<req_id>/uploads', methods=['POST'])
 @jwt_required()
-def generate_document(req_id):
+@requirement_access()
+def create_upload(req_id):
     try:
         current_user_id = get_jwt_identity()
-        logger.info(f"Received request to generate document for requirement: {req_id} by user: {current_user_id}")
+        data = request.get_json()
         
-        # 检查需求任务是否存在
-        requirement = Requirement.query.get(req_id)
-        if not requirement:
-            logger.warning(f"Requirement not found: {req_id} requested by user: {current_user_id}")
-            return jsonify({'message': 'Requirement not found'}), 404
+        # 验证输入
+        if not data or not data.get('filename') or not isinstance(data.get('size'), int) or data['size'] < 0:
+            return jsonify({'message': 'Filename and size are required'}), 400
         
-        # 检查用户是否有权限访问
-        user_req = UserRequirement.query.get((current_user_id, req_id))
-        if not user_req:
-            logger.warning(f"Permission denied: User {current_user_id} tried to access requirement {req_id}")
-            return jsonify({'message': 'Permission denied'}), 403
+        if data['size'] > current_app.config['UPLOAD_MAX_FILE_SIZE']:
+            return jsonify({'message': 'File too large'}), 413
         
-        # 获取需求的所有内容
-        contents = RequirementContent.query.filter_by(requirement_id=req_id).all()
-        logger.info(f"Found {len(contents)} content items for requirement: {req_id}")
+        upload = UploadSession(
+            id=str(uuid.uuid4()),
+            requirement_id=req_id,
+            user_id=int(current_user_id),
+            filename=safe_filename(data['filename']),
+            total_size=data['size'],
+            received_size=0,
+            expires_at=session_expiry()
+        )
         
-        # 准备需求数据
-        requirement_data = {
-            'title': requirement.title,
-            'description': requirement.description,
-            'contents': [content.to_dict() for content in contents]
-        }
+        # 预先创建空的临时文件，后续分块追加写入
+        open(temp_path(current_app.config['UPLOAD_FOLDER'], upload.id), 'wb').close()
         
-        # 生成文档
-        generator = DocumentGenerator()
-        logger.info(f"Starting document generation for requirement: {req_id} - {requirement.title}")
-        document = generator.generate_requirement_doc(requirement_data)
+        db.session.add(upload)
+        db.session.commit()
         
-        logger.info(f"Successfully generated document for requirement: {req_id} - {requirement.title}")
+        # 顺带清理放弃的上传会话
+        schedule_cleanup()
         
-        # 保存文档版本
-        # 获取当前最新版本号
-        latest_version = db.session.query(db.func.max(RequirementDocument.version))\
-            .filter_by(requirement_id=req_id).scalar() or 0
-        new_version = latest_version + 1
+        return jsonify({
+            'upload': upload.to_dict(),
+            'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE']
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Error creating upload', 'error': str(e)}), 500
+
+def _get_upload_session(req_id, upload_id, current_user_id):
+    upload = UploadSession.query.get(upload_id)
+    if not upload or upload.requirement_id != req_id or str(upload.user_id) != str(current_user_id):
+        return None
+    return upload
+
+def _upload_expired_response(upload):
+    return jsonify({'message': 'Upload expired', 'upload': upload.to_dict()}), 410
+
+@requirements_bp.route('/<req_id>/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+@requirement_access()
+def get_upload(req_id, upload_id):
+    try:
+        upload = _get_upload_session(req_id, upload_id, get_jwt_identity())
+        if not upload:
+            return jsonify({'message': 'Upload not found'}), 404
+        if upload.is_expired():
+            return _upload_expired_response(upload)
+        
+        # 断点续传：客户端根据received_size从该偏移继续上传
+        return jsonify({'upload': upload.to_dict()}), 200
+    except Exception as e:
+        return jsonify({'message': 'Error fetching upload', 'error': str(e)}), 500
+
+@requirements_bp.route('/<req_id>/uploads/<upload_id>', methods=['PUT'])
+@jwt_required()
+@requirement_access()
+def upload_chunk(req_id, upload_id):
+    try:
+        upload = _get_upload_session(req_id, upload_id, get_jwt_identity())
+        if not upload:
+            return jsonify({'message': 'Upload not found'}), 404
+        if upload.is_expired():
+            return _upload_expired_response(upload)
+        
+        # 分块必须从当前已接收的位置开始
+        try:
+            offset = int(request.args.get('offset', upload.received_size))
+        except ValueError:
+            return jsonify({'message': 'Invalid offset'}), 400
+        if offset != upload.received_size:
+            return jsonify({'message': 'Offset mismatch', 'upload': upload.to_dict()}), 409
+        
+        # 直接从请求流分块追加写入临时文件，不在内存中缓存整个分块
+        partial = temp_path(current_app.config['UPLOAD_FOLDER'], upload.id)
+        with open(partial, 'ab') as target:
+            target.truncate(offset)
+            try:
+                copy_stream(
+                    request.stream, target, current_app.config['UPLOAD_CHUNK_SIZE'],
+                    limit=upload.total_size - offset
+                )
+            except ValueError:
+                target.truncate(offset)
+                return jsonify({'message': 'Chunk exceeds declared file size'}), 400
+        
+        upload.received_size = os.path.getsize(partial)
+        upload.expires_at = session_expiry()
+        db.session.commit()
         
-        # 创建文档版本记录（不再生成PDF）
-        doc_record = RequirementDocument(
+        return jsonify({'upload': upload.to_dict()}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Error uploading chunk', 'error': str(e)}), 500
+
+@requirements_bp.route('/<req_id>/uploads/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+@requirement_access()
+def complete_upload(req_id, upload_id):
+    try:
+        current_user_id = get_jwt_identity()
+        upload = _get_upload_session(req_id, upload_id, current_user_id)
+        if not upload:
+            return jsonify({'message': 'Upload not found'}), 404
+        if upload.is_expired():
+            return _upload_expired_response(upload)
+        
+        if upload.received_size != upload.total_size:
+            return jsonify({'message': 'Upload incomplete', 'upload': upload.to_dict()}), 409
+        
+        data = request.get_json(silent=True) or {}
+        content_type = detect_content_type(upload.filename, data.get('content_type', 'text'))
+        text_content = data.get('text', '')
+        
+        # 写入内容寻址存储，相同文件只保存一份
+        content_hash, file_path = blob_store.store_partial(
+            temp_path(current_app.config['UPLOAD_FOLDER'], upload.id)
+        )
+        
+        content_record = RequirementContent(
             requirement_id=req_id,
-            version=new_version,
-            content=document,
-            pdf_path=None  # PDF不再生成，设为None
+            content_type=content_type,
+            content_text=text_content if content_type in ['text', 'markdown'] else None,
+            file_path=file_path,
+            file_name=upload.filename,
+            content_hash=content_hash,
+            submitted_by=current_user_id
         )
         
-        db.session.add(doc_record)
+        db.session.add(content_record)
+        db.session.delete(upload)
+        bump_revision(req_id)
         db.session.commit()
         
+        # 附件文本（语音转写、PDF文本、图片OCR）在后台提取，供后续生成文档使用
+        request_extraction(content_record)
+        
         return jsonify({
-            'message': 'Document generated successfully',
-            'document': document,
-            'version': new_version
-        }), 200
+            'message': 'Content submitted successfully',
+            'content': content_record.to_dict()
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Error completing upload', 'error': str(e)}), 500
+
+@requirements_bp.route('/<req_id>/generate-document', methods=['POST'])
+@jwt_required()
+@requirement_access()
+def generate_document(req_id):
+    try:
+        current_user_id = get_jwt_identity()
+        logger.info(f"Received request to generate document for requirement: {req_id} by user: {current_user_id}")
+        
+        mode = _generation_mode()
+        if mode is None:
+            return jsonify({'message': f"Invalid mode, expected one of: {', '.join(GENERATION_MODES)}"}), 400
+        purpose = _generation_purpose()
+        if purpose is None:
+            return jsonify({'message': f"Invalid purpose, expected one of: {', '.join(GENERATION_PURPOSES)}"}), 400
+        
+        # 输入未变化时直接返回已生成的版本，不创建任务，也不计入生成频率限制
+        force = _force_regenerate()
+        doc_record = None if force else lookup_document_version(Requirement.query.get(req_id), purpose, mode)
+        if doc_record is not None:
+            return jsonify({
+                'message': 'Document already generated',
+                'version': doc_record.version,
+                'document': doc_record.content
+            }), 200
+        
+        limited = _generation_rate_limited(current_user_id, req_id)
+        if limited:
+            return limited
+        
+        # 创建后台生成任务，请求线程不再等待LLM返回
+        job = enqueue_generation_job(req_id, int(current_user_id), force=force, mode=mode, purpose=purpose)
+        
+        return jsonify({
+            'message': 'Document generation queued',
+            'job': job.to_dict()
+        }), 202
     except Exception as e:
-        logger.error(f"Error generating document for requirement: {req_id}, error: {str(e)}", exc_info=True)
+        db.session.rollback()
+        logger.error(f"Error queueing document generation for requirement: {req_id}, error: {str(e)}", exc_info=True)
         return jsonify({'message': 'Error generating document', 'error': str(e)}), 500
 
-@requirements_bp.route('/<req_id>/documents', methods=['GET'])
+@requirements_bp.route('/<req_id>/generate-document/stream', methods=['POST'])
 @jwt_required()
-def get_requirement_documents(req_id):
-    user_id = get_jwt_identity()
+@requirement_access()
+def stream_document(req_id):
+    try:
+        current_user_id = get_jwt_identity()
+        logger.info(f"Received request to stream document for requirement: {req_id} by user: {current_user_id}")
+        
+        requirement = Requirement.query.get(req_id)
+        
+        # 流式生成的结果同样保存为正式版本，默认按final选择模型；交互式预览由调用方显式传入purpose=preview
+        purpose = _generation_purpose()
+        if purpose is None:
+            return jsonify({'message': f"Invalid purpose, expected one of: {', '.join(GENERATION_PURPOSES)}"}), 400
+        
+        requirement_data = build_requirement_data(requirement)
+        generator = DocumentGenerator(purpose=purpose)
+        # 流式响应总是完整生成
+        prompt_hash = generator.cache_key(requirement_data, 'full')
+        
+        # 输入未变化时直接返回已生成的版本；只有需要调用模型时才计入生成频率限制
+        cached = None if _force_regenerate() else generation_cache.lookup(req_id, prompt_hash)
+        if cached is None:
+            limited = _generation_rate_limited(current_user_id, req_id)
+            if limited:
+                return limited
+    except Exception as e:
+        logger.error(f"Error preparing document stream for requirement: {req_id}, error: {str(e)}", exc_info=True)
+        return jsonify({'message': 'Error generating document', 'error': str(e)}), 500
+    
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
     
-    # 检查用户权限
-    if not UserRequirement.query.filter_by(
-        user_id=user_id, requirement_id=req_id
-    ).first():  
-        return jsonify({'message': 'Unauthorized access'}), 403
+    def generate():
+        if cached:
+            yield sse('delta', {'content': cached.content})
+            yield sse('done', {'version': cached.version, 'cached': True})
+            return
+        
+        # 相同输入的生成已在进行中时等待其完成并返回同一版本，不再重复调用模型
+        flight_key = generation_flight_key(req_id, prompt_hash)
+        lookup = newer_version_lookup(req_id, prompt_hash)
+        flight = single_flight.acquire(flight_key)
+        try:
+            while flight is None:
+                found, doc_id = single_flight.wait(flight_key, lookup)
+                if found:
+                    db.session.rollback()
+                    shared = RequirementDocument.query.get(doc_id)
+                    yield sse('delta', {'content': shared.content})
+                    yield sse('done', {'version': shared.version, 'cached': True})
+                    return
+                flight = single_flight.acquire(flight_key)
+        except Exception as e:
+            logger.error(f"Error waiting for in-flight generation for requirement: {req_id}, error: {str(e)}")
+            yield sse('error', {'message': 'Error generating document', 'error': str(e)})
+            return
+        
+        chunks = []
+        doc_id = None
+        error = None
+        try:
+            for delta in generator.stream_requirement_doc(requirement_data):
+                chunks.append(delta)
+                yield sse('delta', {'content': delta})
+            
+            # 流结束后保存完整文档版本，示例文档不参与缓存
+            doc_record = save_document_version(
+                req_id, ''.join(chunks),
+                prompt_hash=None if generator.is_mock_mode() else prompt_hash,
+                sources=content_sources(generator, requirement_data)
+            )
+            doc_id = doc_record.id
+            logger.info(f"Saved streamed document version {doc_record.version} for requirement: {req_id}")
+            yield sse('done', {'version': doc_record.version, 'cached': False})
+        except Exception as e:
+            db.session.rollback()
+            error = e
+            logger.error(f"Error streaming document for requirement: {req_id}, error: {str(e)}", exc_info=True)
+            yield sse('error', {'message': 'Error generating document', 'error': str(e)})
+        finally:
+            single_flight.finish(flight, result=doc_id, error=error)
     
-    # 获取所有文档版本
-    documents = RequirementDocument.query.filter_by(
-        requirement_id=req_id
-    ).order_by(RequirementDocument.version.desc()).all()
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 禁止nginx缓冲，保证数据块即时送达
+        }
+    )
+
+@requirements_bp.route('/llm/status', methods=['GET'])
+@jwt_required()
+def get_llm_status():
+    try:
+        return jsonify({'status': current_app.extensions['llm_client'].status()}), 200
+    except Exception as e:
+        return jsonify({'message': 'Error fetching LLM status', 'error': str(e)}), 500
+
+@requirements_bp.route('/generation-cache/stats', methods=['GET'])
+@jwt_required()
+def get_generation_cache_stats():
+    try:
+        return jsonify({'stats': generation_cache.stats()}), 200
+    except Exception as e:
+        return jsonify({'message': 'Error fetching cache stats', 'error': str(e)}), 500
+
+@requirements_bp.route('/<req_id>/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+@requirement_access()
+def get_generation_job(req_id, job_id):
+    try:
+        job = GenerationJob.query.get(job_id)
+        if not job or job.requirement_id != req_id:
+            return jsonify({'message': 'Job not found'}), 404
+        # 任务长时间未完成（例如多次执行均中断）时标记为失败，避免客户端无限等待
+        expire_stale_job(job)
+        
+        result = {'job': job.to_dict()}
+        
+        # 任务完成时直接返回生成的文档，省去一次额外请求
+        if job.status == 'done':
+            document = RequirementDocument.query.filter_by(
+                requirement_id=req_id, version=job.version
+            ).first()
+            if document:
+                result['document'] = document.content
+        
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({'message': 'Error fetching job', 'error': str(e)}), 500
+
+@requirements_bp.route('/<req_id>/documents', methods=['GET'])
+@jwt_required()
+@requirement_access()
+@revalidated('documents')
+@response_cache.cached('documents')
+def get_requirement_documents(req_id):
+    # 版本列表默认只返回摘要字段，?include=content时附带完整内容
+    include_content = request.args.get('include') == 'content'
+    query = RequirementDocument.query.filter_by(requirement_id=req_id)
+    if not include_content:
+        query = query.options(db.load_only(
+            *[getattr(RequirementDocument, field) for field in RequirementDocument.SUMMARY_FIELDS]
+        ))
+    documents = query.order_by(RequirementDocument.version.desc()).all()
     
     return jsonify({
-        'documents': [doc.to_dict() for doc in documents]
+        'documents': [doc.to_dict(include_content) for doc in documents]
     }), 200
 
 
 @requirements_bp.route('/<req_id>/documents/<int:version>', methods=['GET'])
 @jwt_required()
+@requirement_access()
 def get_requirement_document_version(req_id, version):
-    user_id = get_jwt_identity()
-    
-    # 检查用户权限
-    if not UserRequirement.query.filter_by(
-        user_id=user_id, requirement_id=req_id
-    ).first():  
-        return jsonify({'message': 'Unauthorized access'}), 403
-    
-    # 获取特定版本文档
-    document = RequirementDocument.query.filter_by(
-        requirement_id=req_id, version=version
-    ).first()
-    
-    if not document:
-        return jsonify({'message': 'Document version not found'}), 404
+    # 版本写入后不再变化，ETag只由需求、版本号和编码决定，客户端已缓存时无需查询文档
+    encoding = negotiate_encoding(request.accept_encodings)
+    etag = f"{req_id}-{version}-{encoding or 'identity'}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        # 压缩后的响应体按需求、版本号和编码缓存，命中时不查询也不压缩文档
+        body = response_cache.get_document_body(req_id, version, encoding) if encoding else None
+        if body is None:
+            document = RequirementDocument.query.filter_by(requirement_id=req_id, version=version).first()
+            if not document:
+                return jsonify({'message': 'Document version not found'}), 404
+            
+            if encoding is None:
+                response = jsonify({'document': document.to_dict()})
+            else:
+                body = compress_body(
+                    json.dumps({'document': document.to_dict()}, ensure_ascii=False).encode('utf-8'), encoding
+                )
+                response_cache.set_document_body(req_id, version, encoding, body)
+        if body is not None:
+            response = current_app.response_class(body, mimetype='application/json')
+            response.content_encoding = encoding
     
-    return jsonify({
-        'document': document.to_dict()
-    }), 200
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response = _private_file_cache(response)
+    response.cache_control.immutable = True
+    return response
 
 
 @requirements_bp.route('/<req_id>/export-markdown', methods=['GET'])
 @jwt_required()
+@requirement_access()
 def export_markdown(req_id):
     try:
         current_user_id = get_jwt_identity()
         logger.info(f"Received request to export Markdown for requirement: {req_id} by user: {current_user_id}")
         
-        # 检查需求任务是否存在
         requirement = Requirement.query.get(req_id)
-        if not requirement:
-            logger.warning(f"Requirement not found: {req_id} requested by user: {current_user_id}")
-            return jsonify({'message': 'Requirement not found'}), 404
         
-        # 检查用户是否有权限访问
-        user_req = UserRequirement.query.get((current_user_id, req_id))
-        if not user_req:
-            logger.warning(f"Permission denied: User {current_user_id} tried to access requirement {req_id}")
-            return jsonify({'message': 'Permission denied'}), 403
-        
-        # 获取需求的所有内容
-        contents = RequirementContent.query.filter_by(requirement_id=req_id).all()
-        logger.info(f"Found {len(contents)} content items for requirement: {req_id}")
-        
-        # 准备需求数据
-        requirement_data = {
-            'title': requirement.title,
-            'description': requirement.description,
-            'contents': [content.to_dict() for content in contents]
-        }
-        
-        # 生成文档
         generator = DocumentGenerator()
-        logger.info(f"Starting document generation for Markdown export: {req_id} - {requirement.title}")
-        document = generator.generate_requirement_doc(requirement_data)
+        if generator.is_mock_mode():
+            # 未配置模型密钥时示例文档不保存为可复用的版本，排队生成后也无法命中，直接导出示例文档（不调用模型）
+            document = generator.generate_requirement_doc(build_requirement_data(requirement))
+            logger.info(f"Markdown export for requirement: {req_id} uses mock document")
+        else:
+            # 需求内容未变化时直接导出最新的已生成版本，否则创建后台生成任务，客户端完成后重新导出
+            force = _force_regenerate()
+            doc_record = None if force else lookup_document_version(requirement)
+            if doc_record is None:
+                # 只有需要生成新版本时才计入生成频率限制，导出已有版本不受限制
+                limited = _generation_rate_limited(current_user_id, req_id)
+                if limited:
+                    return limited
+                job = enqueue_generation_job(req_id, int(current_user_id), force=force)
+                logger.info(f"Markdown export for requirement: {req_id} queued generation job {job.id}")
+                return jsonify({
+                    'message': 'Document generation queued',
+                    'job': job.to_dict()
+                }), 202
+            document = doc_record.content
+            logger.info(f"Markdown export for requirement: {req_id} uses version {doc_record.version}")
         
         # 使用BytesIO而不是临时文件，避免Windows上的文件锁定问题
         from io import BytesIO
@@ -454,19 +869,11 @@ def export_markdown(req_id):
 
 @requirements_bp.route('/<req_id>/remove_participant/<user_id>', methods=['DELETE'])
 @jwt_required()
+@requirement_access('creator')
 def remove_participant(req_id, user_id):
     try:
         current_user_id = get_jwt_identity()
         
-        # 检查需求任务是否存在
-        requirement = Requirement.query.get(req_id)
-        if not requirement:
-            return jsonify({'message': 'Requirement not found'}), 404
-        
-        # 验证当前用户是任务创建者
-        if str(requirement.creator_id) != current_user_id:
-            return jsonify({'message': 'Permission denied'}), 403
-        
         # 不能删除自己
         if str(user_id) == current_user_id:
             return jsonify({'message': 'Cannot remove yourself'}), 400
@@ -478,7 +885,10 @@ def remove_participant(req_id, user_id):
         
         # 删除用户-需求关联
         db.session.delete(user_req)
+        bump_revision(req_id)
         db.session.commit()
+        access_cache.invalidate(req_id, [user_id])
+        response_cache.invalidate_lists([user_id])
         
         return jsonify({
             'message': 'Participant removed successfully'
@@ -489,15 +899,12 @@ def remove_participant(req_id, user_id):
 
 @requirements_bp.route('/<req_id>/content/<content_id>', methods=['DELETE'])
 @jwt_required()
+@requirement_access(None)
 def delete_content(req_id, content_id):
+    orphan_path = None
     try:
         current_user_id = get_jwt_identity()
         
-        # 检查需求任务是否存在
-        requirement = Requirement.query.get(req_id)
-        if not requirement:
-            return jsonify({'message': 'Requirement not found'}), 404
-        
         # 检查内容是否存在
         content = RequirementContent.query.get(content_id)
         if not content:
@@ -511,33 +918,112 @@ def delete_content(req_id, content_id):
         if str(content.submitted_by) != current_user_id:
             return jsonify({'message': 'Permission denied'}), 403
         
-        # 删除内容
+        # 删除内容，并释放其对上传文件的引用
+        orphan_path = blob_store.release(content)
         db.session.delete(content)
+        bump_revision(req_id)
         db.session.commit()
         
+        # 文件已无任何引用时从磁盘删除
+        blob_store.remove_file(orphan_path)
+        
         return jsonify({
             'message': 'Content deleted successfully'
         }), 200
     except Exception as e:
         db.session.rollback()
+        blob_store.restore_file(orphan_path)
         return jsonify({'message': 'Error deleting content', 'error': str(e)}), 500
 
+@requirements_bp.route('/<req_id>/content-file-urls', methods=['GET'])
+@jwt_required()
+@requirement_access()
+def get_content_file_urls(req_id):
+    try:
+        current_user_id = int(get_jwt_identity())
+        content_ids = [row.id for row in db.session.query(RequirementContent.id).filter(
+            RequirementContent.requirement_id == req_id,
+            RequirementContent.file_path.isnot(None)
+        )]
+        
+        # 每个文件单独签名，地址只能访问对应的文件
+        urls = {}
+        expires = None
+        for content_id in content_ids:
+            urls[str(content_id)], expires = signed_file_url(req_id, content_id, current_user_id)
+        
+        return jsonify({
+            'urls': urls,
+            'expires_at': datetime.utcfromtimestamp(expires).isoformat() if expires else None
+        }), 200
+    except Exception as e:
+        return jsonify({'message': 'Error signing file urls', 'error': str(e)}), 500
+
+@requirements_bp.route('/<req_id>/content/<int:content_id>/file', methods=['GET'])
+@jwt_required(optional=True)  # <img>/<audio>无法设置请求头，使用content-file-urls返回的签名地址
+def download_content_file(req_id, content_id):
+    try:
+        current_user_id = get_jwt_identity() or verify_file_signature(content_id, request.args)
+        if current_user_id is None:
+            return jsonify({'message': 'Missing or expired file signature'}), 401
+        
+        # 一次查询同时校验内容归属和成员权限
+        content = RequirementContent.query\
+            .join(UserRequirement, db.and_(
+                UserRequirement.requirement_id == RequirementContent.requirement_id,
+                UserRequirement.user_id == current_user_id
+            ))\
+            .filter(RequirementContent.id == content_id, RequirementContent.requirement_id == req_id)\
+            .first()
+        if not content or not content.file_path:
+            return jsonify({'message': 'File not found'}), 404
+        
+        file_name = content.file_name or os.path.basename(content.file_path)
+        mimetype = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+        
+        # 文件内容不可变，使用内容哈希作为强ETag
+        if content.content_hash and request.if_none_match.contains(content.content_hash):
+            response = current_app.response_class(status=304)
+            response.set_etag(content.content_hash)
+            return _private_file_cache(response)
+        
+        # 交由nginx直接发送文件（X-Accel-Redirect），应用进程不再传输文件内容
+        accel_prefix = current_app.config.get('UPLOAD_ACCEL_REDIRECT_PREFIX')
+        upload_dir = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+        file_path = os.path.abspath(content.file_path)
+        if accel_prefix and file_path.startswith(upload_dir + os.sep):
+            response = current_app.response_class(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + \
+                os.path.relpath(file_path, upload_dir).replace(os.sep, '/')
+            response.headers['Content-Disposition'] = _inline_disposition(file_name)
+            if content.content_hash:
+                response.set_etag(content.content_hash)
+            return _private_file_cache(response)
+        
+        if not os.path.isfile(file_path):
+            return jsonify({'message': 'File not found'}), 404
+        
+        # conditional=True支持Range和条件请求，文件由WSGI服务器的file_wrapper（sendfile）发送
+        response = send_file(
+            file_path,
+            mimetype=mimetype,
+            download_name=file_name,
+            conditional=True,
+            etag=content.content_hash or True,
+            max_age=FILE_CACHE_MAX_AGE
+        )
+        return _private_file_cache(response)
+    except Exception as e:
+        logger.error(f"Error serving file for content: {content_id}, error: {str(e)}", exc_info=True)
+        return jsonify({'message': 'Error fetching file', 'error': str(e)}), 500
+
 @requirements_bp.route('/<req_id>', methods=['PUT'])
 @jwt_required()
+@requirement_access('creator')
 def update_requirement(req_id):
     try:
-        # 注意：get_jwt_identity()返回的是字符串类型，需要转换为整数
-        current_user_id = int(get_jwt_identity())
         data = request.get_json()
-        
-        # 检查需求任务是否存在
         requirement = Requirement.query.get(req_id)
-        if not requirement:
-            return jsonify({'message': 'Requirement not found'}), 404
-        
-        # 检查用户是否有权限编辑（只有创建者可以编辑）
-        if requirement.creator_id != current_user_id:
-            return jsonify({'message': 'Permission denied'}), 403
         
         # 更新需求信息
         if 'title' in data:
@@ -548,7 +1034,12 @@ def update_requirement(req_id):
             requirement.status = data['status']
         
         requirement.updated_at = datetime.utcnow()
+        bump_revision(req_id)
         db.session.commit()
+        access_cache.invalidate(req_id)
+        # 需求的标题、状态等出现在所有成员的需求列表中
+        member_ids = db.session.query(UserRequirement.user_id).filter_by(requirement_id=req_id).all()
+        response_cache.invalidate_lists([member_id for member_id, in member_ids])
         
         return jsonify({
             'message': 'Requirement updated successfully',
@@ -0,0 +1,4 @@
+# 数据库迁移脚本
+#
+# 每个模块定义revision（按字符串排序执行）和upgrade(ops)，ops为MigrationOps。
+# 变更须可在线执行：新列必须可为空，大表数据通过ops.backfill分批回填。
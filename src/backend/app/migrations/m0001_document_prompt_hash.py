@@ -0,0 +1,9 @@
+"""requirement_documents添加prompt_hash列及索引"""
+from .. import db
+
+revision = '0001'
+
+
+def upgrade(ops):
+    ops.add_column('requirement_documents', db.Column('prompt_hash', db.String(64)))
+    ops.create_index('requirement_documents', 'ix_requirement_documents_prompt_hash', ['prompt_hash'])
@@ -0,0 +1,10 @@
+"""热点查询路径索引"""
+
+revision = '0002'
+
+
+def upgrade(ops):
+    ops.create_index('requirements', 'ix_requirements_creator_id', ['creator_id'])
+    ops.create_index('user_requirements', 'ix_user_requirements_requirement_id', ['requirement_id'])
+    ops.create_index('requirement_contents', 'ix_requirement_contents_requirement_id_id',
+                     ['requirement_id', 'id'])
@@ -0,0 +1,21 @@
+"""requirement_contents添加file_name、content_hash列并回填已有文件的哈希"""
+import os
+
+from .. import db
+from ..utils.storage import file_sha256
+
+revision = '0003'
+
+
+def _hash_existing_file(row):
+    path = row['file_path']
+    if path and os.path.isfile(path):
+        return file_sha256(path, 1024 * 1024)
+    return None
+
+
+def upgrade(ops):
+    ops.add_column('requirement_contents', db.Column('file_name', db.String(255)))
+    ops.add_column('requirement_contents', db.Column('content_hash', db.String(64)))
+    ops.create_index('requirement_contents', 'ix_requirement_contents_content_hash', ['content_hash'])
+    ops.backfill('requirement_contents', 'content_hash', ['file_path'], _hash_existing_file, batch_size=100)
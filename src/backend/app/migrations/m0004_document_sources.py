@@ -0,0 +1,11 @@
+"""requirement_documents添加mode、sources列，记录每个版本的生成方式和所用内容"""
+from sqlalchemy.dialects import mysql
+
+from .. import db
+
+revision = '0004'
+
+
+def upgrade(ops):
+    ops.add_column('requirement_documents', db.Column('mode', db.String(20)))
+    ops.add_column('requirement_documents', db.Column('sources', db.Text().with_variant(mysql.MEDIUMTEXT(), 'mysql')))
@@ -0,0 +1,8 @@
+"""requirements添加revision列，记录需求及其内容、成员、文档的修订号"""
+from .. import db
+
+revision = '0005'
+
+
+def upgrade(ops):
+    ops.add_column('requirements', db.Column('revision', db.Integer))
@@ -0,0 +1,9 @@
+"""requirement_documents添加content_size列，并回填已有版本的内容长度"""
+from .. import db
+
+revision = '0006'
+
+
+def upgrade(ops):
+    ops.add_column('requirement_documents', db.Column('content_size', db.Integer))
+    ops.backfill('requirement_documents', 'content_size', ['content'], lambda row: len(row['content'] or ''))
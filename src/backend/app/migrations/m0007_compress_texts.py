@@ -0,0 +1,23 @@
+"""压缩存储已有的文档版本内容和需求内容文本"""
+from flask import current_app
+
+from ..utils.compression import STORED_MARKER, encode_stored_text
+
+revision = '0007'
+
+
+def upgrade(ops):
+    codec = current_app.config.get('TEXT_COMPRESSION', 'zlib')
+    min_length = current_app.config.get('TEXT_COMPRESSION_MIN_LENGTH', 1024)
+    if codec == 'none':
+        return
+
+    # 只改写尚未压缩且足够长的行，列本身已有值，按条件而非IS NULL选择
+    for table, column in (('requirement_documents', 'content'), ('requirement_contents', 'content_text')):
+        ops.backfill(
+            table, column, [column],
+            lambda row, column=column: encode_stored_text(row[column], codec, min_length),
+            batch_size=200,
+            where=f'{column} NOT LIKE :marker AND LENGTH({column}) >= :min_length',
+            where_params={'marker': f'{STORED_MARKER}%', 'min_length': min_length}
+        )
@@ -0,0 +1,12 @@
+from .. import db
+from datetime import datetime
+
+
+class FileBlob(db.Model):
+    __tablename__ = 'file_blobs'
+    
+    hash = db.Column(db.String(64), primary_key=True)  # 文件内容的SHA-256
+    path = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # 引用该文件的RequirementContent数量
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,25 @@
+from .. import db
+from datetime import datetime
+
+
+class DerivedText(db.Model):
+    """派生文本缓存：附件提取的文字按文件内容哈希缓存，需求内容摘要按原文哈希缓存"""
+    __tablename__ = 'derived_texts'
+    
+    content_hash = db.Column(db.String(64), primary_key=True)  # 文件内容（或摘要原文）的SHA-256
+    kind = db.Column(db.String(20), primary_key=True)  # transcript, pdf_text, ocr, summary
+    status = db.Column(db.String(20), default='pending')  # pending, running, done, failed, unavailable
+    text = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'content_hash': self.content_hash,
+            'kind': self.kind,
+            'status': self.status,
+            'text': self.text,
+            'error': self.error,
+            'updated_at': self.updated_at.isoformat()
+        }
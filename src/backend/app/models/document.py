@@ -1,5 +1,7 @@
 from .. import db
+from ..utils.compression import CompressedText
 from datetime import datetime
+from sqlalchemy.dialects import mysql
 
 
 class RequirementDocument(db.Model):
@@ -8,21 +10,38 @@ class RequirementDocument(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     requirement_id = db.Column(db.String(36), db.ForeignKey('requirements.id'), nullable=False)
     version = db.Column(db.Integer, nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    content = db.Column(CompressedText, nullable=False)  # 较长的文档压缩存储
     generated_at = db.Column(db.DateTime, default=datetime.utcnow)
     pdf_path = db.Column(db.String(255))
+    # 生成该版本所用提示词、模型及温度的哈希，用于复用未变化的生成结果
+    prompt_hash = db.Column(db.String(64), index=True)
+    # 生成方式：full（完整生成）、incremental（在上一版本基础上按内容变化更新章节）或sections（按章节并行生成）
+    mode = db.Column(db.String(20))
+    # 生成该版本所用的需求内容（JSON：标题描述哈希及每条内容的哈希和摘录），用于计算下次的内容变化；
+    # 内容较多时超过MySQL TEXT的64KB上限，MySQL下使用MEDIUMTEXT
+    sources = db.Column(db.Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'))
+    # 文档内容的字符数，版本列表中代替完整内容返回
+    content_size = db.Column(db.Integer)
     
-    # 确保每个需求的版本唯一
     __table_args__ = (
+        # 唯一约束的(requirement_id, version)索引同时用于按需求查询最新版本（反向扫描），无需单独的降序索引
         db.UniqueConstraint('requirement_id', 'version'),
     )
     
-    def to_dict(self):
-        return {
+    # 版本列表只输出的摘要字段（配合load_only避免加载content）
+    SUMMARY_FIELDS = ('id', 'requirement_id', 'version', 'generated_at', 'pdf_path', 'prompt_hash', 'mode', 'content_size')
+    
+    def to_dict(self, include_content=True):
+        data = {
             'id': self.id,
             'requirement_id': self.requirement_id,
             'version': self.version,
-            'content': self.content,
             'generated_at': self.generated_at.isoformat(),
-            'pdf_path': self.pdf_path
-        }
\ No newline at end of file
+            'pdf_path': self.pdf_path,
+            'prompt_hash': self.prompt_hash,
+            'mode': self.mode,
+            'content_size': self.content_size
+        }
+        if include_content:
+            data['content'] = self.content
+        return data
\ No newline at end of file
@@ -0,0 +1,41 @@
+from .. import db
+from datetime import datetime
+
+
+class GenerationJob(db.Model):
+    __tablename__ = 'generation_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)  # UUID
+    requirement_id = db.Column(db.String(36), db.ForeignKey('requirements.id'), nullable=False)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    status = db.Column(db.String(20), default='queued')  # queued, running, done, failed
+    version = db.Column(db.Integer)  # 生成成功后对应的文档版本号
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'requirement_id': self.requirement_id,
+            'requested_by': self.requested_by,
+            'status': self.status,
+            'version': self.version,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class QueuedJob(db.Model):
+    """未配置Redis时的后台任务队列，任务执行完成后删除"""
+    __tablename__ = 'queued_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON：任务类型和参数
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # 被worker认领的次数
+    claimed_at = db.Column(db.DateTime, index=True)  # 最近一次认领或续期的时间，为空表示等待执行
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,4 +1,5 @@
 from .. import db
+from ..utils.compression import CompressedText
 from datetime import datetime
 
 
@@ -8,21 +9,26 @@ class Requirement(db.Model):
     id = db.Column(db.String(36), primary_key=True)  # UUID
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
-    creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     status = db.Column(db.String(50), default='draft')  # draft, in_progress, completed
+    # 修订号：需求、内容、成员或文档每次变化时递增，用于计算读接口的ETag
+    revision = db.Column(db.Integer, default=0)
     
     # 关系
     user_requirements = db.relationship('UserRequirement', backref='requirement', lazy='dynamic')
     
-    def to_dict(self):
+    def to_dict(self, creator_name=None):
+        # 调用方已通过联表查询取得创建者用户名时直接使用，避免逐行懒加载creator
+        if creator_name is None:
+            creator_name = self.creator.username if self.creator else 'Unknown'
         return {
             'id': self.id,
             'title': self.title,
             'description': self.description,
             'creator_id': self.creator_id,
-            'creator_name': self.creator.username if self.creator else 'Unknown',
+            'creator_name': creator_name,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'status': self.status
@@ -36,6 +42,11 @@ class UserRequirement(db.Model):
     requirement_id = db.Column(db.String(36), db.ForeignKey('requirements.id'), primary_key=True)
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
     role = db.Column(db.String(50), default='member')  # owner, member
+    
+    # 主键顺序为(user_id, requirement_id)，按需求查询成员时需要单独的索引
+    __table_args__ = (
+        db.Index('ix_user_requirements_requirement_id', 'requirement_id'),
+    )
 
 
 class RequirementContent(db.Model):
@@ -44,18 +55,28 @@ class RequirementContent(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     requirement_id = db.Column(db.String(36), db.ForeignKey('requirements.id'), nullable=False)
     content_type = db.Column(db.String(50))  # text, image, audio
-    content_text = db.Column(db.Text)
+    content_text = db.Column(CompressedText)  # 较长的文本压缩存储
     file_path = db.Column(db.String(255))
+    file_name = db.Column(db.String(255))  # 上传时的原始文件名
+    content_hash = db.Column(db.String(64), index=True)  # 文件内容的SHA-256，对应FileBlob
     submitted_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'requirement_id': self.requirement_id,
-            'content_type': self.content_type,
-            'content_text': self.content_text,
-            'file_path': self.file_path,
-            'submitted_by': self.submitted_by,
-            'submitted_at': self.submitted_at.isoformat()
-        }
\ No newline at end of file
+    # 按需求查询内容并按id排序
+    __table_args__ = (
+        db.Index('ix_requirement_contents_requirement_id_id', 'requirement_id', 'id'),
+    )
+    
+    # 接口可输出的字段，列表视图可只选择部分字段（配合load_only避免加载content_text）；
+    # file_path是服务器上的存储路径，不对外输出
+    SERIALIZABLE_FIELDS = (
+        'id', 'requirement_id', 'content_type', 'content_text',
+        'file_name', 'content_hash', 'submitted_by', 'submitted_at'
+    )
+    
+    def to_dict(self, fields=None):
+        data = {}
+        for field in fields or self.SERIALIZABLE_FIELDS:
+            value = getattr(self, field)
+            data[field] = value.isoformat() if isinstance(value, datetime) else value
+        return data
\ No newline at end of file
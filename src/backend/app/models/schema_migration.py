@@ -0,0 +1,9 @@
+from .. import db
+from datetime import datetime
+
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    revision = db.Column(db.String(32), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
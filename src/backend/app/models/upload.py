@@ -0,0 +1,30 @@
+from .. import db
+from datetime import datetime
+
+
+class UploadSession(db.Model):
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(36), primary_key=True)  # UUID
+    requirement_id = db.Column(db.String(36), db.ForeignKey('requirements.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received_size = db.Column(db.BigInteger, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # 超过该时间仍未完成的上传视为放弃，拒绝继续上传并由清理任务删除记录和临时文件；每收到一个分块顺延
+    expires_at = db.Column(db.DateTime, index=True)
+    
+    def is_expired(self):
+        return self.expires_at is not None and self.expires_at <= datetime.utcnow()
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'requirement_id': self.requirement_id,
+            'filename': self.filename,
+            'total_size': self.total_size,
+            'received_size': self.received_size,
+            'created_at': self.created_at.isoformat(),
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
@@ -0,0 +1,156 @@
+import json
+import logging
+from functools import wraps
+
+from flask import g, jsonify
+from flask_jwt_extended import get_jwt_identity
+
+from .redis_client import get_redis, redis_available
+
+logger = logging.getLogger(__name__)
+
+
+class RequirementAccess:
+    """某个用户对某个需求的访问信息：需求是否存在、创建者和成员角色"""
+
+    def __init__(self, exists, creator_id=None, role=None):
+        self.exists = exists
+        self.creator_id = creator_id
+        self.role = role
+
+    @property
+    def is_member(self):
+        return self.role is not None
+
+    def is_creator(self, user_id):
+        return self.exists and str(self.creator_id) == str(user_id)
+
+    def to_json(self):
+        return json.dumps({'exists': self.exists, 'creator_id': self.creator_id, 'role': self.role})
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(**json.loads(data))
+
+
+class AccessCache:
+    """需求访问权限缓存
+
+    每个请求内同一(需求, 用户)只解析一次（保存在flask.g中）；跨请求使用短TTL的共享缓存，
+    存放在Redis中（每个需求一个hash，字段为用户ID），成员和需求变化时由写接口调用invalidate精确失效。
+    Redis不可用时不做跨请求缓存：进程内缓存无法被其他进程失效，被移除的成员会在其他进程中继续有权限。
+    """
+
+    def __init__(self, app=None):
+        self.redis = None
+        self.prefix = None
+        self.ttl = 30
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.redis = get_redis(app)
+        self.prefix = app.config.get('ACCESS_CACHE_KEY_PREFIX', 'agile_srs:access')
+        self.ttl = app.config.get('ACCESS_CACHE_TTL', 30)
+        app.extensions['access_cache'] = self
+
+    def get(self, req_id, user_id):
+        """返回用户对需求的访问信息"""
+        user_id = str(user_id)
+        scoped = g.setdefault('requirement_access', {})
+        if (req_id, user_id) in scoped:
+            return scoped[(req_id, user_id)]
+
+        access = self._get_shared(req_id, user_id)
+        if access is None:
+            access = self._load(req_id, user_id)
+            if self.ttl:
+                self._set_shared(req_id, user_id, access)
+        scoped[(req_id, user_id)] = access
+        return access
+
+    def invalidate(self, req_id, user_ids=None):
+        """使缓存失效：指定user_ids时只失效这些成员，否则失效该需求的所有缓存"""
+        user_ids = [str(user_id) for user_id in user_ids] if user_ids is not None else None
+        scoped = g.get('requirement_access', {})
+        for key in list(scoped):
+            if key[0] == req_id and (user_ids is None or key[1] in user_ids):
+                del scoped[key]
+
+        if self.redis is None:
+            return
+        try:
+            if user_ids is None:
+                self.redis.delete(self._key(req_id))
+            elif user_ids:
+                self.redis.hdel(self._key(req_id), *user_ids)
+        except Exception as e:
+            # 无法失效时已缓存的权限最多在ACCESS_CACHE_TTL后过期
+            logger.warning(f"Failed to invalidate access cache in Redis for requirement {req_id}: {str(e)}")
+
+    def _key(self, req_id):
+        return f'{self.prefix}:{req_id}'
+
+    def _load(self, req_id, user_id):
+        """一次联表查询取得需求的创建者和当前用户的成员角色"""
+        from .. import db
+        from ..models.requirement import Requirement, UserRequirement
+
+        row = db.session.query(Requirement.creator_id, UserRequirement.role)\
+            .outerjoin(UserRequirement, db.and_(
+                UserRequirement.requirement_id == Requirement.id,
+                UserRequirement.user_id == user_id
+            ))\
+            .filter(Requirement.id == req_id).first()
+        if row is None:
+            return RequirementAccess(False)
+        creator_id, role = row
+        return RequirementAccess(True, creator_id, role)
+
+    def _get_shared(self, req_id, user_id):
+        if not redis_available(self.redis):
+            return None
+        try:
+            data = self.redis.hget(self._key(req_id), user_id)
+            return RequirementAccess.from_json(data) if data else None
+        except Exception as e:
+            logger.warning(f"Failed to read access cache from Redis: {str(e)}")
+            return None
+
+    def _set_shared(self, req_id, user_id, access):
+        if not redis_available(self.redis):
+            return
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hset(self._key(req_id), user_id, access.to_json())
+            pipe.expire(self._key(req_id), self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to write access cache to Redis: {str(e)}")
+
+
+def requirement_access(role='member'):
+    """路由装饰器：校验需求存在及当前用户的权限，须放在jwt_required之后
+
+    role为'member'时要求当前用户是需求成员，为'creator'时要求是创建者，为None时只校验需求存在。
+    校验结果保存在g.access中供视图函数使用。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(req_id, *args, **kwargs):
+            from .. import access_cache
+
+            user_id = get_jwt_identity()
+            access = access_cache.get(req_id, user_id)
+            if not access.exists:
+                return jsonify({'message': 'Requirement not found'}), 404
+            if role == 'member' and not access.is_member:
+                logger.warning(f"Permission denied: User {user_id} tried to access requirement {req_id}")
+                return jsonify({'message': 'Permission denied'}), 403
+            if role == 'creator' and not access.is_creator(user_id):
+                logger.warning(f"Permission denied: User {user_id} is not the creator of requirement {req_id}")
+                return jsonify({'message': 'Permission denied'}), 403
+            g.access = access
+            return view(req_id, *args, **kwargs)
+        return wrapper
+    return decorator
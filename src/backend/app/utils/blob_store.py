@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from .. import db
+from ..models.blob import FileBlob
+from .storage import blob_path, temp_path, copy_stream, file_sha256
+
+logger = logging.getLogger(__name__)
+
+# 引用归零、等待事务提交后删除的文件后缀
+RETIRED_SUFFIX = '.deleting'
+
+
+def _acquire(digest, path, size):
+    """增加文件引用计数，首次出现的内容新建记录（与调用方的事务一起提交）"""
+    updated = db.session.execute(
+        db.update(FileBlob).where(FileBlob.hash == digest)
+        .values(ref_count=FileBlob.ref_count + 1)
+    ).rowcount
+    if updated:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(FileBlob(hash=digest, path=path, size=size, ref_count=1))
+    except IntegrityError:
+        # 并发请求已写入同一内容
+        db.session.execute(
+            db.update(FileBlob).where(FileBlob.hash == digest)
+            .values(ref_count=FileBlob.ref_count + 1)
+        )
+
+
+def _place(partial, digest, size):
+    upload_dir = current_app.config['UPLOAD_FOLDER']
+    path = blob_path(upload_dir, digest)
+    _acquire(digest, path, size)
+
+    if os.path.exists(path):
+        # 相同内容已存储，丢弃本次上传的副本
+        os.remove(partial)
+        logger.info(f"Deduplicated upload into existing blob {digest}")
+    else:
+        os.replace(partial, path)
+    return digest, path
+
+
+def store_stream(stream):
+    """分块读取上传流并同时计算SHA-256，相同内容只保存一份，返回(哈希, 文件路径)"""
+    upload_dir = current_app.config['UPLOAD_FOLDER']
+    partial = temp_path(upload_dir)
+    hasher = hashlib.sha256()
+    try:
+        with open(partial, 'wb') as target:
+            size = copy_stream(stream, target, current_app.config['UPLOAD_CHUNK_SIZE'], hasher=hasher)
+        return _place(partial, hasher.hexdigest(), size)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def store_partial(partial):
+    """将分块上传完成的临时文件存入内容寻址存储，返回(哈希, 文件路径)"""
+    digest = file_sha256(partial, current_app.config['UPLOAD_CHUNK_SIZE'])
+    return _place(partial, digest, os.path.getsize(partial))
+
+
+def release(content):
+    """释放内容记录对文件的引用，返回引用归零后需要删除的文件路径
+
+    调用方在事务提交后用remove_file删除返回的文件，回滚时用restore_file恢复。
+    """
+    if not content.file_path:
+        return None
+
+    if content.content_hash:
+        # 锁定文件记录直到事务结束，并发上传相同内容时_acquire会等待本事务提交，
+        # 之后看到的是已删除的记录和已移走的文件，会重新写入文件而不是复用即将删除的文件
+        blob = db.session.query(FileBlob).filter_by(hash=content.content_hash).with_for_update().first()
+        if blob:
+            blob.ref_count -= 1
+            if blob.ref_count > 0:
+                return None
+            db.session.delete(blob)
+            db.session.flush()
+            return _retire(blob.path)
+
+    # 旧版本上传的文件不在内容寻址存储中，无其他记录引用时直接删除
+    from ..models.requirement import RequirementContent
+    others = RequirementContent.query.filter(
+        RequirementContent.file_path == content.file_path,
+        RequirementContent.id != content.id
+    ).count()
+    return None if others else content.file_path
+
+
+def _retire(path):
+    """在持有记录锁时把待删除的文件移到旁边，返回移动后的路径"""
+    if not os.path.exists(path):
+        return None
+    retired = path + RETIRED_SUFFIX
+    os.replace(path, retired)
+    return retired
+
+
+def restore_file(path):
+    """事务回滚时把release移走的文件放回原处"""
+    if path and path.endswith(RETIRED_SUFFIX) and os.path.exists(path):
+        original = path[:-len(RETIRED_SUFFIX)]
+        if not os.path.exists(original):
+            os.replace(path, original)
+
+
+def remove_file(path):
+    """删除已无引用的文件"""
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+            logger.info(f"Removed unreferenced file {path}")
+        except OSError as e:
+            logger.warning(f"Failed to remove file {path}: {str(e)}")
@@ -0,0 +1,108 @@
+import base64
+import gzip
+import logging
+import zlib
+
+from flask import current_app, has_app_context
+from sqlalchemy.types import Text, TypeDecorator
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 压缩存储的文本以控制字符开头，后接编码标识和base64编码的压缩数据；普通文本不会以该字符开头
+STORED_MARKER = '\x1f'
+_CODEC_TAGS = {'zlib': 'z', 'zstd': 's'}
+_TAG_CODECS = {tag: codec for codec, tag in _CODEC_TAGS.items()}
+
+
+def available_encodings():
+    """可预先压缩的响应编码，按优先顺序排列；未安装brotli时只有gzip"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress_body(data, encoding):
+    """按Content-Encoding压缩响应体，结果是确定的（gzip头中不写入时间），同一内容得到相同的字节"""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+def negotiate_encoding(accept_encodings):
+    """根据请求的Accept-Encoding选择可用的压缩编码，客户端不接受压缩时返回None"""
+    for encoding in available_encodings():
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def _text_settings():
+    if has_app_context():
+        config = current_app.config
+        return config.get('TEXT_COMPRESSION', 'zlib'), config.get('TEXT_COMPRESSION_MIN_LENGTH', 1024)
+    return 'zlib', 1024
+
+
+def encode_stored_text(value, codec=None, min_length=None):
+    """将文本转换为数据库中的存储形式：足够长且压缩后更短时压缩，否则原样存储"""
+    default_codec, default_min_length = _text_settings()
+    codec = codec or default_codec
+    min_length = default_min_length if min_length is None else min_length
+    # 以标记字符开头的普通文本也必须压缩，避免读取时被误认为压缩数据
+    if value is None or codec == 'none' or (len(value) < min_length and not value.startswith(STORED_MARKER)):
+        return value
+
+    raw = value.encode('utf-8')
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('TEXT_COMPRESSION=zstd requires the zstandard package')
+        compressed = zstandard.ZstdCompressor(level=9).compress(raw)
+    else:
+        codec = 'zlib'
+        compressed = zlib.compress(raw, 9)
+    stored = f'{STORED_MARKER}{_CODEC_TAGS[codec]}:{base64.b64encode(compressed).decode("ascii")}'
+    if len(stored) >= len(raw) and not value.startswith(STORED_MARKER):
+        return value
+    return stored
+
+
+def decode_stored_text(value):
+    """还原数据库中存储的文本，未压缩的文本原样返回"""
+    if not value or not value.startswith(STORED_MARKER):
+        return value
+    codec = _TAG_CODECS[value[1]]
+    compressed = base64.b64decode(value[3:])
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('Reading zstd-compressed text requires the zstandard package')
+        raw = zstandard.ZstdDecompressor().decompress(compressed)
+    else:
+        raw = zlib.decompress(compressed)
+    return raw.decode('utf-8')
+
+
+class CompressedText(TypeDecorator):
+    """透明压缩的文本列
+
+    数据库中仍为Text类型，较长的文本按TEXT_COMPRESSION配置压缩后存储，读取时自动解压，
+    与未压缩的历史数据兼容。压缩后的值不能用于LIKE等文本比较。
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return encode_stored_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decode_stored_text(value)
@@ -0,0 +1,106 @@
+import re
+
+# Markdown标题行，例如 "## 3. 功能要求"
+_HEADING = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+# 标题前的编号，例如 "3." "3、" "三、" "(3)"
+_NUMBERING = re.compile(r'^(\(?[0-9一二三四五六七八九十]+[.、)）]?\s*)+')
+
+
+def _headings(document):
+    """返回(行号, 级别, 标题文本)列表，忽略代码块中的内容"""
+    headings = []
+    in_code = False
+    for index, line in enumerate(document.splitlines()):
+        if line.lstrip().startswith('```'):
+            in_code = not in_code
+            continue
+        if in_code:
+            continue
+        match = _HEADING.match(line)
+        if match:
+            headings.append((index, len(match.group(1)), match.group(2)))
+    return headings
+
+
+def section_key(title):
+    """标题的比较键：去掉编号、强调符号和空白，用于匹配不同版本中的同一章节"""
+    title = title.replace('*', '').replace('_', '').strip()
+    title = _NUMBERING.sub('', title)
+    return re.sub(r'\s+', '', title).lower()
+
+
+def _section_level(headings):
+    """章节级别取文档中最高的标题级别；若该级别只有开头的一个文档标题，则使用下一级"""
+    levels = sorted({level for _, level, _ in headings})
+    level = levels[0]
+    if len(levels) > 1 and sum(1 for _, l, _ in headings if l == level) == 1 and headings[0][1] == level:
+        level = levels[1]
+    return level
+
+
+def section_level(document):
+    """文档章节标题的级别（#的个数），没有标题时返回None"""
+    headings = _headings(document)
+    return _section_level(headings) if headings else None
+
+
+def split_sections(document):
+    """将文档拆分为(前言, [(标题, 章节全文)])，章节级别见section_level"""
+    headings = _headings(document)
+    if not headings:
+        return document, []
+
+    level = _section_level(headings)
+    lines = document.splitlines(keepends=True)
+    starts = [(index, title) for index, l, title in headings if l == level]
+    preamble = ''.join(lines[:starts[0][0]])
+    sections = []
+    for (start, title), following in zip(starts, starts[1:] + [(len(lines), None)]):
+        sections.append((title, ''.join(lines[start:following[0]])))
+    return preamble, sections
+
+
+def merge_sections(document, patch):
+    """用patch中的章节替换document中标题相同的章节，新章节追加到末尾
+
+    返回(合并后的文档, 被替换或新增的章节标题列表)。补丁的章节标题级别与原文档不一致，
+    或补丁章节对应的是原文档中的小节时（例如只输出了“### 2.1”），无法确定替换位置，
+    返回(原文档, [])，由调用方改为完整生成。
+    """
+    preamble, sections = split_sections(document)
+    _, patch_sections = split_sections(patch)
+    if not patch_sections:
+        return document, []
+
+    level = '##'
+    if sections:
+        level = _HEADING.match(sections[0][1].splitlines()[0]).group(1)
+        if section_level(patch) != len(level):
+            return document, []
+        section_keys = {section_key(title) for title, _ in sections}
+        subsection_keys = {
+            section_key(title) for _, heading_level, title in _headings(document) if heading_level > len(level)
+        }
+        if any(section_key(title) in subsection_keys - section_keys for title, _ in patch_sections):
+            return document, []
+
+    replaced = []
+    merged = list(sections)
+    for title, text in patch_sections:
+        body = text.split('\n', 1)[1] if '\n' in text else ''
+        new_text = f'{level} {title}\n{body}'
+        if not new_text.endswith('\n'):
+            new_text += '\n'
+        key = section_key(title)
+        for index, (existing_title, existing_text) in enumerate(merged):
+            if section_key(existing_title) == key:
+                # 保留原文档的标题写法（编号等）
+                merged[index] = (existing_title, f'{level} {existing_title}\n{body}'.rstrip('\n') + '\n\n')
+                break
+        else:
+            if merged and not merged[-1][1].endswith('\n\n'):
+                merged[-1] = (merged[-1][0], merged[-1][1] + '\n')
+            merged.append((title, new_text))
+        replaced.append(title)
+
+    return preamble + ''.join(text for _, text in merged), replaced
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from .. import db, job_queue, generation_cache, single_flight
+from ..models.requirement import Requirement, RequirementContent
+from ..models.document import RequirementDocument
+from ..models.job import GenerationJob
+from .llm_integration import DocumentGenerator
+from .text_extraction import cached_texts, request_extractions
+from .http_cache import bump_revision
+
+logger = logging.getLogger(__name__)
+
+# 生成方式：auto在可行时增量生成，full总是完整生成，incremental要求增量生成（不可行时仍完整生成），
+# sections按章节并发生成后拼接
+GENERATION_MODES = ('auto', 'full', 'incremental', 'sections')
+
+# 生成用途：final为正式版本，preview为快速预览；配置了LLM_MODELS时据此选择模型
+GENERATION_PURPOSES = ('final', 'preview')
+
+# 每条内容在版本来源中保存的摘录长度，内容删除后仍可告知模型删除了什么
+SOURCE_EXCERPT_LENGTH = 200
+
+
+def build_requirement_data(requirement):
+    """收集生成文档所需的需求数据"""
+    # 按id排序，保证相同内容生成相同的提示词（缓存键稳定）
+    contents = RequirementContent.query.filter_by(requirement_id=requirement.id)\
+        .order_by(RequirementContent.id).all()
+    logger.info(f"Found {len(contents)} content items for requirement: {requirement.id}")
+
+    # 只使用已完成的附件文本提取结果，尚未提取的附件补充创建后台任务，不等待结果
+    extracted = cached_texts(contents)
+    content_dicts = []
+    pending = []
+    for content in contents:
+        # 生成提示词时旧记录没有file_name，仍需要用文件路径显示文件名
+        content_dict = content.to_dict(RequirementContent.SERIALIZABLE_FIELDS + ('file_path',))
+        if content.content_hash in extracted:
+            content_dict['extracted_text'] = extracted[content.content_hash]
+        else:
+            pending.append(content)
+        content_dicts.append(content_dict)
+    # 循环结束后统一创建，最多提交一次
+    request_extractions(pending)
+
+    return {
+        'title': requirement.title,
+        'description': requirement.description,
+        'contents': content_dicts
+    }
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def content_sources(generator, requirement_data):
+    """记录生成所用的需求内容：标题描述的哈希，以及每条内容的哈希和摘录"""
+    header = _sha256(f"{requirement_data.get('title') or ''}\0{requirement_data.get('description') or ''}")
+    items = {}
+    for content in requirement_data.get('contents', []):
+        text = generator.render_content(content)
+        items[str(content['id'])] = {'hash': _sha256(text), 'excerpt': text[:SOURCE_EXCERPT_LENGTH]}
+    return {'header': header, 'items': items}
+
+
+def content_delta(previous_sources, sources, requirement_data):
+    """比较两个版本的来源，返回(新增内容列表, 已删除内容的摘录列表)；内容变化视为删除后新增"""
+    previous_items = previous_sources.get('items', {})
+    current_items = sources['items']
+    added = [
+        content for content in requirement_data.get('contents', [])
+        if previous_items.get(str(content['id']), {}).get('hash') != current_items[str(content['id'])]['hash']
+    ]
+    removed = [
+        {'id': int(content_id), 'excerpt': item.get('excerpt', '')}
+        for content_id, item in previous_items.items()
+        if current_items.get(content_id, {}).get('hash') != item.get('hash')
+    ]
+    return added, removed
+
+
+def save_document_version(req_id, document, prompt_hash=None, mode='full', sources=None, max_attempts=3):
+    """保存新的文档版本，并发写入同一版本号时重试"""
+    for attempt in range(max_attempts):
+        latest_version = db.session.query(db.func.max(RequirementDocument.version))\
+            .filter_by(requirement_id=req_id).scalar() or 0
+
+        doc_record = RequirementDocument(
+            requirement_id=req_id,
+            version=latest_version + 1,
+            content=document,
+            content_size=len(document),
+            pdf_path=None,  # PDF不再生成，设为None
+            prompt_hash=prompt_hash,
+            mode=mode,
+            sources=json.dumps(sources, ensure_ascii=False) if sources is not None else None
+        )
+        db.session.add(doc_record)
+        try:
+            db.session.flush()
+            bump_revision(req_id)
+            db.session.commit()
+            return doc_record
+        except IntegrityError:
+            db.session.rollback()
+            logger.warning(f"Version conflict saving document for requirement: {req_id}, attempt {attempt + 1}")
+
+    raise RuntimeError(f"Could not allocate a document version for requirement: {req_id}")
+
+
+def _generate_incremental(requirement, generator, requirement_data, sources, prompt_hash):
+    """在最新版本基础上按内容变化增量生成，不可行时返回None"""
+    previous = RequirementDocument.query.filter_by(requirement_id=requirement.id)\
+        .order_by(RequirementDocument.version.desc()).first()
+    # 只在LLM真实生成且记录了来源的版本上增量更新，示例文档和出错时的备用文档不作为基础
+    if not previous or not previous.sources or not previous.prompt_hash:
+        return None
+
+    previous_sources = json.loads(previous.sources)
+    if previous_sources.get('header') != sources['header']:
+        logger.info(f"Requirement {requirement.id} title or description changed, incremental generation skipped")
+        return None
+
+    added, removed = content_delta(previous_sources, sources, requirement_data)
+    max_changes = current_app.config.get('INCREMENTAL_MAX_CHANGES', 20)
+    if not added and not removed:
+        return None
+    if len(added) + len(removed) > max_changes:
+        logger.info(f"Requirement {requirement.id} has {len(added) + len(removed)} changed contents, "
+                    f"more than {max_changes}; incremental generation skipped")
+        return None
+
+    document, sections = generator.try_generate_incremental(previous.content, requirement_data, added, removed)
+    if document is None:
+        return None
+    logger.info(f"Incrementally updated version {previous.version} of requirement {requirement.id}: "
+                f"{len(added)} added, {len(removed)} removed, sections {', '.join(sections)}")
+    return save_document_version(requirement.id, document, prompt_hash, mode='incremental', sources=sources)
+
+
+def lookup_document_version(requirement, purpose='final', mode=None):
+    """查找与当前需求内容、模型和温度匹配的已生成版本，不调用模型，没有时返回None
+
+    mode为空时匹配任意生成方式的版本。
+    """
+    generator = DocumentGenerator(purpose=purpose)
+    return generation_cache.lookup(
+        requirement.id, generator.cache_keys(build_requirement_data(requirement), [mode] if mode else GENERATION_MODES)
+    )
+
+
+def generate_document_version(requirement, force=False, mode='auto', purpose='final'):
+    """生成需求文档并保存为新版本，返回(文档版本记录, 是否复用了已有结果)
+
+    提示词、生成方式、模型和温度均未变化时直接复用最新的匹配版本；force为True时强制重新生成。
+    相同输入的并发请求只生成一次，其余请求等待并复用同一个新版本。
+    mode不为full时，若自上一版本以来只有少量内容变化，只把上一版本和变化的内容发给模型，按章节更新文档。
+    purpose决定模型路由：preview使用延迟较低的模型，final使用适合正式版本的模型。
+    """
+    requirement_data = build_requirement_data(requirement)
+    generator = DocumentGenerator(purpose=purpose)
+    prompt_hash = generator.cache_key(requirement_data, mode)
+
+    if not force:
+        cached = generation_cache.lookup(requirement.id, prompt_hash)
+        if cached:
+            return cached, True
+
+    # 合并同一输入的并发生成请求，只调用一次模型，其余请求复用同一个新版本
+    doc_id, shared = single_flight.do(
+        generation_flight_key(requirement.id, prompt_hash),
+        lambda: _generate_version(requirement, generator, requirement_data, prompt_hash, mode).id,
+        lookup=newer_version_lookup(requirement.id, prompt_hash)
+    )
+    # 结束当前事务，确保能读到其他线程或进程刚提交的版本
+    db.session.rollback()
+    return RequirementDocument.query.get(doc_id), shared
+
+
+def generation_flight_key(req_id, prompt_hash):
+    return f'generate:{req_id}:{prompt_hash}'
+
+
+def newer_version_lookup(req_id, prompt_hash):
+    """返回查询函数：查找在当前最新版本之后、由其他进程生成的相同输入的版本ID"""
+    baseline = db.session.query(db.func.max(RequirementDocument.version))\
+        .filter_by(requirement_id=req_id).scalar() or 0
+
+    def lookup():
+        db.session.rollback()
+        document = RequirementDocument.query.filter(
+            RequirementDocument.requirement_id == req_id,
+            RequirementDocument.prompt_hash == prompt_hash,
+            RequirementDocument.version > baseline
+        ).first()
+        return document.id if document else None
+    return lookup
+
+
+def _generate_version(requirement, generator, requirement_data, prompt_hash, mode):
+    """调用模型生成并保存新版本"""
+    sources = content_sources(generator, requirement_data)
+    if mode == 'sections':
+        logger.info(f"Starting section-parallel generation for requirement: {requirement.id} - {requirement.title}")
+        document, cacheable = generator.try_generate_sections(requirement_data)
+        return save_document_version(requirement.id, document, prompt_hash if cacheable else None,
+                                     mode='sections', sources=sources)
+
+    if mode != 'full':
+        doc_record = _generate_incremental(requirement, generator, requirement_data, sources, prompt_hash)
+        if doc_record:
+            return doc_record
+        if mode == 'incremental':
+            logger.info(f"Incremental generation not possible for requirement: {requirement.id}, generating in full")
+
+    logger.info(f"Starting document generation for requirement: {requirement.id} - {requirement.title}")
+    document, cacheable = generator.try_generate(requirement_data)
+    return save_document_version(requirement.id, document, prompt_hash if cacheable else None, sources=sources)
+
+
+def enqueue_generation_job(req_id, user_id, force=False, mode='auto', purpose='final'):
+    """创建文档生成任务并放入后台队列"""
+    job = GenerationJob(
+        id=str(uuid.uuid4()),
+        requirement_id=req_id,
+        requested_by=user_id,
+        status='queued'
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    job_queue.enqueue('generate_document', job.id, force, mode, purpose)
+    logger.info(f"Queued document generation job {job.id} for requirement: {req_id}")
+    return job
+
+
+@job_queue.task('generate_document')
+def run_generation_job(job_id, force=False, mode='auto', purpose='final'):
+    """后台执行文档生成任务"""
+    job = GenerationJob.query.get(job_id)
+    if not job:
+        logger.warning(f"Generation job not found: {job_id}")
+        return
+    # 任务可能在worker崩溃后被重新投递，已结束的任务不再执行
+    if job.status in ('done', 'failed'):
+        logger.info(f"Generation job {job_id} already {job.status}, skipping")
+        return
+
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+
+    try:
+        requirement = Requirement.query.get(job.requirement_id)
+        if not requirement:
+            raise ValueError(f"Requirement not found: {job.requirement_id}")
+
+        doc_record, _ = generate_document_version(requirement, force=force, mode=mode, purpose=purpose)
+
+        job.status = 'done'
+        job.version = doc_record.version
+        logger.info(f"Generation job {job_id} finished with version {doc_record.version}")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Generation job {job_id} failed: {str(e)}", exc_info=True)
+        job.status = 'failed'
+        job.error = str(e)
+
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def expire_stale_job(job):
+    """超过GENERATION_JOB_TIMEOUT仍未完成的任务标记为失败，返回是否做了修改"""
+    if job.status not in ('queued', 'running'):
+        return False
+    timeout = current_app.config.get('GENERATION_JOB_TIMEOUT', 1800)
+    if datetime.utcnow() - job.created_at < timedelta(seconds=timeout):
+        return False
+
+    logger.warning(f"Generation job {job.id} timed out in status {job.status}")
+    job.status = 'failed'
+    job.error = 'Generation job timed out'
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return True
@@ -0,0 +1,39 @@
+import hashlib
+import hmac
+import time
+
+from flask import current_app, url_for
+
+
+def _signature(content_id, user_id, expires):
+    key = current_app.config['SECRET_KEY'].encode('utf-8')
+    message = f'{content_id}:{user_id}:{expires}'.encode('utf-8')
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+
+def signed_file_url(req_id, content_id, user_id):
+    """生成上传文件的临时访问地址，返回(地址, 过期时间戳)
+
+    <img>/<audio>无法携带请求头，用只对单个文件有效的签名地址代替在查询参数中传递JWT。
+    过期时间按FILE_URL_TTL对齐，同一时间段内同一文件的地址不变，浏览器缓存仍然有效。
+    """
+    ttl = current_app.config.get('FILE_URL_TTL', 900)
+    expires = (int(time.time()) // ttl + 2) * ttl
+    url = url_for('requirements.download_content_file', req_id=req_id, content_id=content_id,
+                  uid=user_id, expires=expires, sig=_signature(content_id, user_id, expires))
+    return url, expires
+
+
+def verify_file_signature(content_id, args):
+    """校验签名地址的查询参数，有效时返回签发时的用户ID，否则返回None"""
+    try:
+        user_id = int(args['uid'])
+        expires = int(args['expires'])
+        signature = args['sig']
+    except (KeyError, ValueError):
+        return None
+    if expires < time.time():
+        return None
+    if not hmac.compare_digest(signature, _signature(content_id, user_id, expires)):
+        return None
+    return user_id
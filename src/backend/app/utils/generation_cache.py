@@ -0,0 +1,79 @@
+import hashlib
+import logging
+import threading
+
+from .redis_client import get_redis, redis_available
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_cache_key(prompt, model, temperature):
+    """根据提示词、模型和温度计算生成结果的缓存键"""
+    digest = hashlib.sha256()
+    for part in (model, repr(temperature), prompt):
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class GenerationCache:
+    """以提示词哈希为键的文档生成缓存
+
+    缓存内容直接复用RequirementDocument中记录了prompt_hash的历史版本，
+    命中/未命中计数优先记录在Redis中，使多个进程的统计合并；Redis不可用时记录在进程内。
+    """
+
+    def __init__(self, app=None):
+        self.redis = None
+        self.stats_key = None
+        self._counters = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.redis = get_redis(app)
+        self.stats_key = app.config.get('GENERATION_CACHE_STATS_KEY', 'agile_srs:generation_cache:stats')
+        app.extensions['generation_cache'] = self
+
+    def lookup(self, req_id, prompt_hash):
+        """查找该需求下提示词哈希一致的最新文档版本，未命中返回None
+
+        prompt_hash可以是多个哈希的列表，返回与其中任意一个一致的最新版本。
+        """
+        from ..models.document import RequirementDocument
+
+        hashes = [prompt_hash] if isinstance(prompt_hash, str) else list(prompt_hash)
+        document = RequirementDocument.query.filter(
+            RequirementDocument.requirement_id == req_id,
+            RequirementDocument.prompt_hash.in_(hashes)
+        ).order_by(RequirementDocument.version.desc()).first()
+
+        self._record('hits' if document else 'misses')
+        if document:
+            logger.info(f"Generation cache hit for requirement: {req_id}, version: {document.version}")
+        return document
+
+    def _record(self, counter):
+        if redis_available(self.redis):
+            try:
+                self.redis.hincrby(self.stats_key, counter, 1)
+                return
+            except Exception as e:
+                logger.warning(f"Failed to record cache stats in Redis: {str(e)}")
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self):
+        counters = dict(self._counters)
+        if redis_available(self.redis):
+            try:
+                stored = self.redis.hgetall(self.stats_key)
+                for name in counters:
+                    counters[name] += int(stored.get(name.encode(), 0))
+            except Exception as e:
+                logger.warning(f"Failed to read cache stats from Redis: {str(e)}")
+
+        total = counters['hits'] + counters['misses']
+        counters['hit_rate'] = round(counters['hits'] / total, 4) if total else 0.0
+        return counters
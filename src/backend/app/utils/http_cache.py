@@ -0,0 +1,81 @@
+import hashlib
+import logging
+from functools import wraps
+
+from flask import g, request, current_app
+
+from .. import db
+from ..models.requirement import Requirement
+
+logger = logging.getLogger(__name__)
+
+
+def bump_revision(req_id):
+    """递增需求的修订号，随调用方的事务一起提交
+
+    内容、成员、文档和需求本身发生变化时调用，读接口的ETag由修订号计算。
+    保留updated_at不变，避免需求列表的排序被内容提交等操作改变。
+    """
+    db.session.execute(
+        db.update(Requirement)
+        .where(Requirement.id == req_id)
+        .values(
+            revision=db.func.coalesce(Requirement.revision, 0) + 1,
+            updated_at=Requirement.updated_at
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def current_revision(req_id):
+    """只查询需求的修订号和更新时间，不加载内容等数据行"""
+    row = db.session.query(Requirement.revision, Requirement.updated_at)\
+        .filter(Requirement.id == req_id).first()
+    if row is None:
+        return None, None
+    return row[0] or 0, row[1]
+
+
+def revision_etag(resource, req_id, revision):
+    """由资源名、需求、修订号和查询参数计算ETag，同一资源不同的分页、字段参数对应不同的ETag"""
+    raw = f'{resource}:{req_id}:{revision}:{request.query_string.decode("latin-1")}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def revalidated(resource, last_modified=False):
+    """路由装饰器：为需求下的读接口添加ETag（及Last-Modified），客户端缓存未过期时直接返回304
+
+    须放在requirement_access之后。304只需查询一次修订号，不执行视图函数。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(req_id, *args, **kwargs):
+            revision, updated_at = current_revision(req_id)
+            if revision is None:
+                return view(req_id, *args, **kwargs)
+
+            # 供后续的响应缓存复用，避免再次查询
+            g.revision = revision
+            etag = revision_etag(resource, req_id, revision)
+            modified = updated_at.replace(microsecond=0) if last_modified and updated_at else None
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = modified is not None and request.if_modified_since is not None \
+                    and modified <= request.if_modified_since.replace(tzinfo=None)
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(req_id, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if modified is not None:
+                response.last_modified = modified
+            # 允许浏览器保存响应，但每次使用前都需要重新验证
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
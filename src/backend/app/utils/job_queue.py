@@ -0,0 +1,294 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from .redis_client import get_redis, redis_available
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """后台任务队列
+
+    优先使用REDIS_URL对应的Redis列表作为队列，多个进程可以共同消费；
+    Redis不可用时使用数据库中的queued_jobs表，任务在进程重启后不会丢失。
+    任务被取出后仍保留在处理中列表（或表中），执行期间定期续期，执行完成才删除；
+    进程崩溃时续期停止，超过JOB_VISIBILITY_TIMEOUT后由其他worker重新放回队列，
+    超过JOB_MAX_ATTEMPTS次仍未完成的任务被丢弃。任务状态由各任务自行持久化到数据库。
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.redis = None
+        self.queue_key = None
+        self.visibility_timeout = 120
+        self.heartbeat_interval = 30
+        self.max_attempts = 3
+        self.poll_interval = 1
+        self._handlers = {}
+        self._start_hooks = []
+        self._workers = []
+        self._active = {}
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._last_reap = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.queue_key = app.config.get('JOB_QUEUE_KEY', 'agile_srs:jobs')
+        self.visibility_timeout = app.config.get('JOB_VISIBILITY_TIMEOUT', 120)
+        self.heartbeat_interval = app.config.get('JOB_HEARTBEAT_INTERVAL', 30)
+        self.max_attempts = app.config.get('JOB_MAX_ATTEMPTS', 3)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', 1)
+        self.redis = get_redis(app)
+        if self.redis is not None:
+            logger.info(f"Job queue using Redis backend: {self.queue_key}")
+        app.extensions['job_queue'] = self
+
+    def start(self):
+        """按JOB_WORKERS启动任务工作线程
+
+        只由服务进程（gunicorn的post_worker_init、python run.py）调用；flask db-upgrade等CLI命令
+        也会创建应用，不能在init_app中启动，否则CLI进程会取出任务并在退出时中断它们。
+        """
+        count = self.app.config.get('JOB_WORKERS', 2)
+        if count > 0:
+            self._run_start_hooks()
+        self.start_workers(count)
+
+    @property
+    def processing_key(self):
+        return f'{self.queue_key}:processing'
+
+    @property
+    def claims_key(self):
+        return f'{self.queue_key}:claims'
+
+    def task(self, name):
+        """注册任务处理函数"""
+        def decorator(func):
+            self._handlers[name] = func
+            return func
+        return decorator
+
+    def on_start(self, func):
+        """注册在任务线程启动前执行的函数（例如需要在进程只有一个线程时创建的子进程池）"""
+        self._start_hooks.append(func)
+        return func
+
+    def _run_start_hooks(self):
+        with self.app.app_context():
+            for hook in self._start_hooks:
+                hook()
+
+    def enqueue(self, name, *args):
+        """将任务加入队列，立即返回"""
+        if name not in self._handlers:
+            raise ValueError(f"Unknown job type: {name}")
+
+        payload = json.dumps({'id': uuid.uuid4().hex, 'name': name, 'args': list(args), 'attempts': 0})
+        if redis_available(self.redis):
+            try:
+                self.redis.lpush(self.queue_key, payload)
+                return
+            except Exception as e:
+                logger.warning(f"Failed to push job to Redis, using database queue: {str(e)}")
+        self._db_enqueue(name, payload)
+        self._wakeup.set()
+
+    def start_workers(self, count):
+        with self._lock:
+            started = bool(self._workers)
+            for _ in range(max(count - len(self._workers), 0)):
+                worker = threading.Thread(target=self._worker_loop, daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            if self._workers and not started:
+                threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+
+    def run_forever(self):
+        """在当前线程中持续消费任务，用于独立的worker进程"""
+        self._run_start_hooks()
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+        self._worker_loop()
+
+    # Redis队列：BRPOPLPUSH原子地把任务移入处理中列表，claims哈希记录每个任务最近一次续期的时间
+
+    def _redis_claim(self, timeout):
+        payload = self.redis.brpoplpush(self.queue_key, self.processing_key, timeout=timeout)
+        if payload is None:
+            return None
+        job = json.loads(payload)
+        self.redis.hset(self.claims_key, job['id'], time.time())
+        return ('redis', payload, job)
+
+    def _redis_reap(self):
+        """把续期超时的处理中任务放回队列"""
+        deadline = time.time() - self.visibility_timeout
+        for payload in self.redis.lrange(self.processing_key, 0, -1):
+            job = json.loads(payload)
+            # 刚取出尚未记录续期时间的任务，从现在开始计时
+            if self.redis.hsetnx(self.claims_key, job['id'], time.time()):
+                continue
+            claimed_at = float(self.redis.hget(self.claims_key, job['id']) or 0)
+            if claimed_at > deadline:
+                continue
+            # 只有成功移出处理中列表的worker负责重新入队，避免多个worker重复放回
+            if not self.redis.lrem(self.processing_key, 1, payload):
+                continue
+            self.redis.hdel(self.claims_key, job['id'])
+            job['attempts'] = job.get('attempts', 0) + 1
+            if job['attempts'] >= self.max_attempts:
+                logger.error(f"Dropping job {job['name']} {job['id']} after {job['attempts']} attempts")
+                continue
+            logger.warning(f"Requeueing stale job {job['name']} {job['id']} (attempt {job['attempts'] + 1})")
+            self.redis.lpush(self.queue_key, json.dumps(job))
+
+    # 数据库队列：通过带条件的UPDATE认领任务，只有一个worker能更新成功
+
+    def _db_enqueue(self, name, payload):
+        from .. import db
+        from ..models.job import QueuedJob
+
+        with self.app.app_context():
+            db.session.add(QueuedJob(name=name, payload=payload))
+            db.session.commit()
+
+    def _db_claim(self):
+        from .. import db
+        from ..models.job import QueuedJob
+
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=self.visibility_timeout)
+        candidates = QueuedJob.query.filter(db.or_(
+            QueuedJob.claimed_at.is_(None), QueuedJob.claimed_at < stale_before
+        )).order_by(QueuedJob.id).limit(10).all()
+
+        # 提交后对象会过期，先取出认领前的值
+        rows = [(job.id, job.name, job.payload, job.attempts, job.claimed_at) for job in candidates]
+        for job_id, name, payload, attempts, previous_claim in rows:
+            if previous_claim is None:
+                same_claim = QueuedJob.claimed_at.is_(None)
+            else:
+                same_claim = QueuedJob.claimed_at == previous_claim
+            claimed = QueuedJob.query.filter(QueuedJob.id == job_id, same_claim).update(
+                {'claimed_at': now, 'attempts': QueuedJob.attempts + 1}, synchronize_session=False
+            )
+            db.session.commit()
+            if not claimed:
+                continue
+
+            if attempts >= self.max_attempts:
+                logger.error(f"Dropping job {name} {job_id} after {attempts} attempts")
+                QueuedJob.query.filter_by(id=job_id).delete()
+                db.session.commit()
+                continue
+            if previous_claim is not None:
+                logger.warning(f"Requeueing stale job {name} {job_id} (attempt {attempts + 1})")
+            return ('db', job_id, json.loads(payload))
+        return None
+
+    def _next_job(self):
+        """取出下一个任务，返回(后端, 标识, 任务内容)，没有任务时返回None"""
+        use_redis = redis_available(self.redis)
+        if use_redis:
+            try:
+                if time.monotonic() - self._last_reap > self.heartbeat_interval:
+                    self._last_reap = time.monotonic()
+                    self._redis_reap()
+                claimed = self._redis_claim(timeout=5)
+                if claimed:
+                    return claimed
+            except Exception as e:
+                logger.warning(f"Failed to pop job from Redis: {str(e)}")
+                time.sleep(self.poll_interval)
+
+        # 数据库队列同时承接Redis写入失败时的任务；Redis处于重试等待期时只使用数据库队列
+        with self.app.app_context():
+            claimed = self._db_claim()
+        if claimed is None and not use_redis:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+        return claimed
+
+    def _complete(self, backend, handle, job):
+        if backend == 'redis':
+            pipe = self.redis.pipeline()
+            pipe.lrem(self.processing_key, 1, handle)
+            pipe.hdel(self.claims_key, job['id'])
+            pipe.execute()
+        else:
+            from .. import db
+            from ..models.job import QueuedJob
+
+            # 任务可能留下未完成的事务，先回滚再删除
+            db.session.rollback()
+            QueuedJob.query.filter_by(id=handle).delete()
+            db.session.commit()
+
+    def _heartbeat_loop(self):
+        """定期为执行中的任务续期，避免被当作崩溃的任务重新入队"""
+        while True:
+            time.sleep(self.heartbeat_interval)
+            with self._lock:
+                active = list(self._active.values())
+            if not active:
+                continue
+            try:
+                with self.app.app_context():
+                    self._refresh_claims(active)
+            except Exception as e:
+                logger.warning(f"Failed to refresh job claims: {str(e)}")
+
+    def _refresh_claims(self, active):
+        from .. import db
+        from ..models.job import QueuedJob
+
+        redis_ids = [job['id'] for backend, _, job in active if backend == 'redis']
+        if redis_ids:
+            now = time.time()
+            self.redis.hset(self.claims_key, mapping={job_id: now for job_id in redis_ids})
+        db_ids = [handle for backend, handle, _ in active if backend == 'db']
+        if db_ids:
+            QueuedJob.query.filter(QueuedJob.id.in_(db_ids)).update(
+                {'claimed_at': datetime.utcnow()}, synchronize_session=False
+            )
+            db.session.commit()
+
+    def _worker_loop(self):
+        while True:
+            try:
+                claimed = self._next_job()
+            except Exception as e:
+                logger.error(f"Failed to fetch next job: {str(e)}", exc_info=True)
+                time.sleep(self.poll_interval)
+                continue
+            if claimed is None:
+                continue
+
+            backend, handle, job = claimed
+            handler = self._handlers.get(job.get('name'))
+            worker_id = threading.get_ident()
+            with self._lock:
+                self._active[worker_id] = claimed
+
+            with self.app.app_context():
+                try:
+                    if handler is None:
+                        logger.error(f"Discarding job with unknown type: {job!r}")
+                    else:
+                        handler(*job['args'])
+                except Exception as e:
+                    logger.error(f"Job {job['name']} failed: {str(e)}", exc_info=True)
+                finally:
+                    with self._lock:
+                        self._active.pop(worker_id, None)
+                    try:
+                        self._complete(backend, handle, job)
+                    except Exception as e:
+                        logger.error(f"Failed to acknowledge job {job.get('id')}: {str(e)}")
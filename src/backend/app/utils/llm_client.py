@@ -0,0 +1,334 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+
+from .model_router import ModelRouter
+
+logger = logging.getLogger(__name__)
+
+# 默认模型名称
+DEFAULT_MODEL = 'deepseek-ai/DeepSeek-R1'
+
+# 可重试的错误：限流、服务端错误、超时和连接失败
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.TryAgain,
+)
+
+
+class LLMUnavailableError(Exception):
+    """所有模型服务均不可用（重试耗尽、熔断或超过截止时间）"""
+
+
+def _is_retryable(error):
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    status = getattr(error, 'http_status', None)
+    return isinstance(error, openai.error.APIError) and (status is None or status >= 500)
+
+
+def _retry_after(error):
+    """读取429/503响应中的Retry-After（秒）"""
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after') or headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """单个模型服务的熔断器
+
+    连续失败failure_threshold次后打开，打开期间直接跳过该服务；
+    reset_timeout秒后进入半开状态，放行一次试探请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class _SharedSession(requests.Session):
+    """多线程共享的Session
+
+    openai 0.27每隔180秒关闭并重建线程缓存的Session，共享Session被关闭会断开其他线程正在使用的连接，
+    这里忽略close，连接池随进程一起释放。
+    """
+
+    def close(self):
+        pass
+
+
+class LLMEndpoint:
+    """一个模型服务地址；model为空时使用请求指定的模型"""
+
+    def __init__(self, base_url, api_key, model=None, breaker=None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.breaker = breaker or CircuitBreaker()
+
+    @property
+    def name(self):
+        return f"{self.base_url} ({self.model or 'default model'})"
+
+    def to_dict(self):
+        return {
+            'base_url': self.base_url,
+            'model': self.model,
+            'state': self.breaker.state,
+            'failures': self.breaker.failures
+        }
+
+
+class LLMClient:
+    """应用级LLM客户端
+
+    在create_app中创建一次，所有请求和后台任务线程共享：
+    - API密钥和服务地址通过每次调用的参数传入，不再修改openai模块的全局配置；
+    - 使用带连接池的requests.Session，保持与LLM服务的长连接；
+    - 每次调用有总截止时间，限流和服务端错误按带随机抖动的指数退避重试；
+    - 每个服务地址有独立的熔断器，主服务不可用时依次尝试LLM_FALLBACKS中的备用服务。
+    """
+
+    # 各项重试、超时和熔断参数的默认值，与config.py一致
+    DEFAULT_SETTINGS = {
+        'LLM_CONNECT_TIMEOUT': 10,
+        'LLM_REQUEST_TIMEOUT': 120,
+        'LLM_DEADLINE': 300,
+        'LLM_MAX_RETRIES': 3,
+        'LLM_RETRY_BASE_DELAY': 1.0,
+        'LLM_RETRY_MAX_DELAY': 30.0,
+        'LLM_BREAKER_THRESHOLD': 5,
+        'LLM_BREAKER_RESET': 30,
+    }
+
+    def __init__(self, app=None):
+        self.api_key = None
+        self.base_url = None
+        self.model = None
+        self.api_key_valid = False
+        self.session = None
+        self.endpoints = []
+        self.router = None
+        self.settings = dict(self.DEFAULT_SETTINGS)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.configure(
+            api_key=app.config.get('LLM_API_KEY'),
+            base_url=app.config.get('LLM_BASE_URL'),
+            model=app.config.get('LLM_MODEL'),
+            pool_size=app.config.get('LLM_POOL_SIZE', 10),
+            fallbacks=app.config.get('LLM_FALLBACKS'),
+            models=app.config.get('LLM_MODELS'),
+            settings={key: app.config[key] for key in self.DEFAULT_SETTINGS if key in app.config}
+        )
+        # openai 0.27按线程缓存Session，指定共享Session后所有线程复用同一个连接池。
+        # requestssession是模块级设置，只由第一个初始化的应用设置一次，from_env创建的独立客户端不修改它
+        if openai.requestssession is None:
+            openai.requestssession = self.session
+        app.extensions['llm_client'] = self
+
+    @classmethod
+    def from_env(cls, api_key=None, model=None, base_url=None):
+        """在没有Flask应用上下文时，根据环境变量创建客户端"""
+        client = cls()
+        client.configure(
+            api_key=api_key or os.getenv('LLM_API_KEY'),
+            base_url=base_url or os.getenv('LLM_BASE_URL'),
+            model=model or os.getenv('LLM_MODEL'),
+            pool_size=int(os.getenv('LLM_POOL_SIZE') or 10),
+            fallbacks=os.getenv('LLM_FALLBACKS'),
+            models=os.getenv('LLM_MODELS'),
+            settings={
+                key: type(default)(os.environ[key])
+                for key, default in cls.DEFAULT_SETTINGS.items() if os.environ.get(key)
+            }
+        )
+        return client
+
+    def configure(self, api_key, base_url, model, pool_size=10, fallbacks=None, models=None, settings=None):
+        """fallbacks为备用服务列表（或其JSON字符串），每项包含base_url，可选model和api_key；
+        models为可选模型及其延迟、成本特征列表（或其JSON字符串），为空时只使用model"""
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model or DEFAULT_MODEL
+        self.settings = dict(self.DEFAULT_SETTINGS, **(settings or {}))
+        self.router = ModelRouter(self.model, models)
+
+        # 验证API密钥
+        if not self.api_key:
+            logger.warning('LLM API key is not configured.')
+            self.api_key_valid = False
+        elif self.api_key in ['your-llm-api-key-here', 'LLM_API_KEY']:
+            # 检测默认占位符值
+            logger.warning('LLM API key is using default placeholder value.')
+            self.api_key_valid = False
+        else:
+            self.api_key_valid = True
+
+        self.endpoints = self._build_endpoints(fallbacks)
+        self.session = self._build_session(pool_size)
+        logger.info(f"LLM client configured - Model: {self.model}, Base URL: {self.base_url}, "
+                    f"API key: {'valid' if self.api_key_valid else 'invalid'}, pool size: {pool_size}")
+
+    def _build_session(self, pool_size):
+        session = _SharedSession()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _build_endpoints(self, fallbacks):
+        """主服务在前，备用服务按配置顺序排列"""
+        if isinstance(fallbacks, str):
+            fallbacks = json.loads(fallbacks) if fallbacks.strip() else []
+
+        def breaker():
+            return CircuitBreaker(self.settings['LLM_BREAKER_THRESHOLD'], self.settings['LLM_BREAKER_RESET'])
+
+        endpoints = [LLMEndpoint(self.base_url, self.api_key, breaker=breaker())]
+        for item in fallbacks or []:
+            endpoints.append(LLMEndpoint(
+                item['base_url'],
+                item.get('api_key') or self.api_key,
+                model=item.get('model'),
+                breaker=breaker()
+            ))
+        if len(endpoints) > 1:
+            logger.info(f"LLM fallbacks configured: {', '.join(endpoint.name for endpoint in endpoints[1:])}")
+        return endpoints
+
+    def _backoff(self, attempt, error):
+        """带完全随机抖动的指数退避；服务端给出Retry-After时至少等待该时长"""
+        cap = min(self.settings['LLM_RETRY_MAX_DELAY'], self.settings['LLM_RETRY_BASE_DELAY'] * (2 ** attempt))
+        delay = random.uniform(0, cap)
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.settings['LLM_RETRY_MAX_DELAY']))
+        return delay
+
+    def chat_completion(self, messages, deadline=None, **kwargs):
+        """调用ChatCompletion接口，参数与openai.ChatCompletion.create一致
+
+        deadline为本次调用（含重试和切换备用服务）的总时长（秒），默认为LLM_DEADLINE；
+        purpose为调用用途（final、preview、summary），延迟样本按模型和用途分别统计。
+        所有服务均失败时抛出LLMUnavailableError；请求参数错误等不可重试的错误直接抛出。
+        """
+        model = kwargs.pop('model', None) or self.model
+        purpose = kwargs.pop('purpose', None)
+        expires_at = time.monotonic() + (deadline or self.settings['LLM_DEADLINE'])
+        last_error = None
+
+        for endpoint in self.endpoints:
+            # 先检查截止时间再请求放行：半开状态下放行的试探请求必须以成功或失败结束，否则熔断器一直停在半开
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                raise LLMUnavailableError(f"LLM call deadline exceeded: {last_error}") from last_error
+            if not endpoint.breaker.allow():
+                logger.warning(f"Circuit open for LLM endpoint {endpoint.name}, skipping")
+                continue
+
+            for attempt in range(self.settings['LLM_MAX_RETRIES'] + 1):
+                # 重试前上一次请求已记录失败，不再持有试探资格
+                if attempt:
+                    remaining = expires_at - time.monotonic()
+                    if remaining <= 0:
+                        raise LLMUnavailableError(f"LLM call deadline exceeded: {last_error}") from last_error
+
+                try:
+                    start_time = time.monotonic()
+                    response = openai.ChatCompletion.create(
+                        api_key=endpoint.api_key,
+                        api_base=endpoint.base_url,
+                        model=endpoint.model or model,
+                        messages=messages,
+                        request_timeout=(
+                            min(self.settings['LLM_CONNECT_TIMEOUT'], remaining),
+                            min(self.settings['LLM_REQUEST_TIMEOUT'], remaining)
+                        ),
+                        **kwargs
+                    )
+                    endpoint.breaker.record_success()
+                    # 流式调用此时只收到响应头，耗时不代表整次生成，不计入延迟统计
+                    if not kwargs.get('stream'):
+                        self.router.record(endpoint.model or model, time.monotonic() - start_time, purpose)
+                    return response
+                except Exception as e:
+                    if not _is_retryable(e):
+                        # 请求本身有误（参数、鉴权等），服务可达，不计入熔断
+                        endpoint.breaker.record_success()
+                        raise
+                    last_error = e
+                    endpoint.breaker.record_failure()
+                    logger.warning(f"LLM call to {endpoint.name} failed (attempt {attempt + 1}): {str(e)}")
+
+                if endpoint.breaker.state != 'closed' or attempt == self.settings['LLM_MAX_RETRIES']:
+                    break
+                time.sleep(max(min(self._backoff(attempt, last_error), expires_at - time.monotonic()), 0))
+
+        raise LLMUnavailableError(
+            f"All LLM endpoints failed or are unavailable: {last_error or 'circuit open'}"
+        ) from last_error
+
+    def select_model(self, purpose='final'):
+        """按用途和实测延迟选择本次调用的模型"""
+        return self.router.select(purpose)
+
+    def model_family(self, purpose='final'):
+        """该用途下可能被选中的所有模型，用于生成结果的缓存键，不随延迟路由的选择变化"""
+        return ','.join(self.router.candidates(purpose))
+
+    def status(self):
+        """各服务地址的熔断状态及各模型的延迟统计"""
+        return {
+            'endpoints': [endpoint.to_dict() for endpoint in self.endpoints],
+            'models': self.router.stats()
+        }
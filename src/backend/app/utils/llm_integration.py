@@ -1,9 +1,13 @@
-import openai
 import os
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from fpdf import FPDF
-from flask import current_app, Blueprint, jsonify
+from flask import current_app, has_app_context, Blueprint, jsonify
+from .llm_client import LLMClient, LLMUnavailableError
+from .generation_cache import prompt_cache_key
+from .prompt_budget import PromptBudget, count_tokens
+from .doc_sections import merge_sections, section_level
 
 # 创建测试蓝图
 test_blueprint = Blueprint('test', __name__, url_prefix='/api/test')
@@ -27,70 +31,93 @@ def test_config():
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 需求文档的章节结构（章节标题, 章节要点），完整生成和按章节并行生成共用
+DOCUMENT_SECTIONS = [
+    ('需求概述', ['需求背景', '需求目标']),
+    ('用户场景', ['主要用户角色', '使用场景描述']),
+    ('功能要求', ['核心功能列表', '功能详细描述']),
+    ('非功能要求', ['性能要求', '安全要求', '兼容性要求']),
+    ('附录', ['术语解释', '参考资料']),
+]
+
+
+def _structure_prompt():
+    """完整生成时要求的文档结构说明"""
+    structure = '\n'.join(
+        f"{i}. {title}\n" + ''.join(f"   - {topic}\n" for topic in topics)
+        for i, (title, topics) in enumerate(DOCUMENT_SECTIONS, 1)
+    )
+    return f"""
+
+请按照以下结构生成需求文档：
+
+{structure}
+请确保文档内容专业、完整、清晰，符合软件工程规范。
+"""
+
+
+def _strip_leading_heading(text):
+    """去掉模型在章节正文前自行添加的标题行"""
+    lines = text.strip().splitlines()
+    if lines and lines[0].lstrip().startswith('#'):
+        lines = lines[1:]
+    return '\n'.join(lines).strip()
+
 
 class DocumentGenerator:
-    def __init__(self, api_key=None, model=None, base_url=None):
-        # 优先从Flask配置中获取
-        if current_app:
-            # 打印当前配置环境信息
-            current_config_name = os.getenv('FLASK_CONFIG', 'default')
-            logger.info(f"Current Flask configuration name: {current_config_name}")
-            
-            # 获取并记录所有LLM相关配置
-            config_model = current_app.config.get('LLM_MODEL', 'DeepSeek-R1')
-            config_api_key = current_app.config.get('LLM_API_KEY', 'Not found')
-            config_base_url = current_app.config.get('LLM_BASE_URL', 'Not found')
-            
-            # 检查配置来源
-            logger.info(f"Flask app config - LLM_API_KEY: {config_api_key}, LLM_MODEL: {config_model}, LLM_BASE_URL: {config_base_url}")
-            
-            # 打印配置文件内容进行调试
-            try:
-                import config
-                logger.info(f"Direct config import - LLM_API_KEY: {config.Config.LLM_API_KEY}, LLM_MODEL: {config.Config.LLM_MODEL}")
-            except Exception as e:
-                logger.warning(f"Failed to directly import config: {str(e)}")
-            
-            self.api_key = api_key or config_api_key
-            self.model = model or config_model
-            self.base_url = base_url or config_base_url
-            logger.info(f"Loading LLM configuration from Flask app - Model: {self.model}, Base URL: {self.base_url}")
-            logger.info(f"Final API key value before setting: {self.api_key}")
-        else:
-            env_model = os.getenv('LLM_MODEL', 'DeepSeek-R1')
-            env_api_key = os.getenv('LLM_API_KEY', 'Not found')
-            env_base_url = os.getenv('LLM_BASE_URL', 'Not found')
-            logger.info(f"Environment variables - LLM_API_KEY: {env_api_key}, LLM_MODEL: {env_model}, LLM_BASE_URL: {env_base_url}")
-            
-            self.api_key = api_key or env_api_key
-            self.model = model or env_model
-            self.base_url = base_url or env_base_url
-            logger.info(f"Loading LLM configuration from environment - Model: {self.model}, Base URL: {self.base_url}")
-        
-        # 强制使用配置文件中设置的模型名称
-        if self.model != 'deepseek-ai/DeepSeek-R1':
-            logger.warning(f"Overriding model to use configured value: deepseek-ai/DeepSeek-R1 instead of {self.model}")
-            self.model = 'deepseek-ai/DeepSeek-R1'
-            
-        openai.api_key = self.api_key
-        openai.api_base = self.base_url
-        logger.info(f"OpenAI client configured with API key: {'Set' if self.api_key else 'Not set'}, API base: {self.base_url}")
-        logger.info(f"OpenAI client full config - API key exists: {bool(openai.api_key)}, API key length: {len(openai.api_key) if openai.api_key else 0}")
-
-        # 验证API密钥
-        if not self.api_key:
-            logger.warning('LLM API key is not configured.')
-            self.api_key_valid = False
-        elif self.api_key in ['your-llm-api-key-here', 'LLM_API_KEY']:
-            # 检测默认占位符值
-            logger.warning(f'LLM API key is using default placeholder value: {self.api_key}')
-            self.api_key_valid = False
-        else:
-            self.api_key_valid = True
-            logger.info(f'LLM API key validation passed (length: {len(self.api_key)})')
+    def __init__(self, client=None, api_key=None, model=None, base_url=None, purpose='final'):
+        """client为空时使用create_app中创建的共享LLM客户端
+
+        显式传入api_key/model/base_url时创建独立的客户端，不影响共享客户端。
+        未指定model时按用途（final正式版本、preview预览）由客户端根据实测延迟选择模型，同一个生成器的所有调用
+        使用同一模型；缓存键使用该用途的所有候选模型，路由切换模型后仍能复用已生成的版本。
+        """
+        if client is None:
+            if api_key or model or base_url or not has_app_context():
+                client = LLMClient.from_env(api_key=api_key, model=model, base_url=base_url)
+            else:
+                client = current_app.extensions['llm_client']
+        
+        self.client = client
+        self.purpose = purpose
+        self._model = model or client.select_model(purpose)
+        self._cache_model = model or client.model_family(purpose)
+        self.temperature = 0.7
+        
+        # 输出长度和上下文窗口，决定提示词中需求内容可用的token预算
+        config = current_app.config if has_app_context() else {}
+        self.max_tokens = int(config.get('LLM_MAX_TOKENS') or os.getenv('LLM_MAX_TOKENS') or 2000)
+        self.context_tokens = int(config.get('LLM_CONTEXT_TOKENS') or os.getenv('LLM_CONTEXT_TOKENS') or 32000)
+        self.summary_batch_tokens = int(config.get('PROMPT_SUMMARY_BATCH_TOKENS') or 4000)
+        self.summary_workers = int(config.get('PROMPT_SUMMARY_WORKERS') or 4)
+        # 按章节并行生成时的并发数、单个章节的重试次数和首次重试间隔（秒）
+        self.section_workers = int(config.get('SECTION_WORKERS') or 5)
+        self.section_retries = int(config.get('SECTION_MAX_RETRIES', 2))
+        self.section_retry_delay = float(config.get('SECTION_RETRY_DELAY', 1.0))
+        self._last_prompt = None
+    
+    @property
+    def model(self):
+        return self._model
+    
+    @property
+    def api_key(self):
+        return self.client.api_key
+    
+    @property
+    def api_key_valid(self):
+        return self.client.api_key_valid
     
     def generate_requirement_doc(self, requirement_data):
         """根据需求数据生成完整的需求文档"""
+        document, _ = self.try_generate(requirement_data)
+        return document
+    
+    def try_generate(self, requirement_data):
+        """生成需求文档，返回(文档内容, 是否为LLM真实生成结果)
+
+        示例文档和出错时的备用文档不应被缓存复用，调用方据此区分。
+        """
         requirement_title = requirement_data.get('title', 'N/A')
         logger.info(f"Starting document generation for requirement: {requirement_title}")
         
@@ -98,48 +125,24 @@ class DocumentGenerator:
         logger.debug(f"Generated prompt length: {len(prompt)} characters")
         
         try:
-            if not self.api_key or not getattr(self, 'api_key_valid', True):
+            if self.is_mock_mode():
                 # 如果API密钥无效或未配置，返回示例文档内容，而不是抛出异常
                 logger.warning("Using mock document content due to invalid or unconfigured LLM API key")
-                
-                # 生成示例Markdown文档
-                mock_document = f"# {requirement_title}\n\n"
-                
-                # 添加需求描述
-                description = requirement_data.get('description', '无描述')
-                mock_document += f"## 需求概述\n\n{description}\n\n"
-                
-                # 添加内容列表
-                mock_document += "## 收集到的内容\n\n"
-                contents = requirement_data.get('contents', [])
-                for i, content in enumerate(contents, 1):
-                    if content.get('content_type') == 'markdown' and content.get('content_text'):
-                        mock_document += f"### {i}. 文本内容\n\n{content.get('content_text')[:100]}...\n\n"
-                    elif content.get('file_path'):
-                        file_name = os.path.basename(content.get('file_path'))
-                        mock_document += f"### {i}. 文件附件\n\n[{file_name}]\n\n"
-                
-                # 添加其他章节
-                mock_document += "## 用户场景\n\n此处为用户场景描述\n\n"
-                mock_document += "## 功能要求\n\n此处为功能要求列表\n\n"
-                mock_document += "## 非功能要求\n\n此处为非功能要求描述\n\n"
-                mock_document += "## 附录\n\n此处为附录信息\n\n"
-                mock_document += "*此文档使用示例模板生成，因为未配置有效的LLM API密钥。*\n"
-                
-                return mock_document
+                return self._build_mock_document(requirement_data), False
             
             # 如果API密钥有效，调用LLM API
             start_time = time.time()
             logger.info(f"Calling LLM API with model: {self.model}")
             
-            response = openai.ChatCompletion.create(
-                model=self.model,
+            response = self.client.chat_completion(
                 messages=[
                     {"role": "system", "content": "You are a professional requirement analyst."},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.7,
-                max_tokens=2000
+                model=self.model,
+                purpose=self.purpose,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
             )
             
             end_time = time.time()
@@ -153,62 +156,315 @@ class DocumentGenerator:
                        Completion: {token_usage.get('completion_tokens', 0)}, \
                        Total: {token_usage.get('total_tokens', 0)}")
             
-            return response.choices[0].message.content
+            return response.choices[0].message.content, True
+        except LLMUnavailableError:
+            # 模型服务不可用（重试耗尽、熔断或超时）时直接报错，不保存备用文档
+            raise
         except Exception as e:
             logger.error(f"Unexpected error generating document: {str(e)}", exc_info=True)
             # 即使发生错误，也返回一个示例文档
             fallback_document = f"# {requirement_title}\n\n## 错误信息\n\n生成文档时发生错误：{str(e)}\n\n*此文档为备用模板，用于测试下载功能。*\n"
-            return fallback_document
+            return fallback_document, False
     
-    def _build_prompt(self, requirement_data):
-        """构建LLM提示词"""
-        prompt = f"""
-请根据以下用户需求信息，生成一份完整、专业的用户需求文档：
+    def try_generate_sections(self, requirement_data):
+        """按章节并发生成需求文档并按顺序拼接，返回(文档内容, 是否为LLM真实生成结果)
 
-需求标题：{requirement_data.get('title', '')}
-需求描述：{requirement_data.get('description', '')}
-
-收集到的原始需求内容：
-"""
+        各章节互不依赖，总耗时接近最慢的章节；单个章节失败时按指数退避重试，
+        重试仍失败的章节以错误说明代替，整篇文档不缓存。
+        """
+        requirement_title = requirement_data.get('title', 'N/A')
+        if self.is_mock_mode():
+            logger.warning("Using mock document content due to invalid or unconfigured LLM API key")
+            return self._build_mock_document(requirement_data), False
         
-        # 添加收集到的内容
-        contents = requirement_data.get('contents', [])
-        for i, content in enumerate(contents, 1):
-            if content['content_type'] == 'markdown':
-                prompt += f"\n{i}. 文本内容：{content['content_text']}"
-            elif content['content_type'] == 'image':
-                prompt += f"\n{i}. 图片内容：[图片文件 - {content.get('file_path', 'N/A')}]"
-            elif content['content_type'] == 'audio':
-                prompt += f"\n{i}. 语音内容：[音频文件 - {content.get('file_path', 'N/A')}]"
+        # 先在当前线程构建需求信息（可能需要摘要），各章节复用
+        self._build_contents_prompt(requirement_data)
+        start_time = time.time()
+        workers = min(self.section_workers, len(DOCUMENT_SECTIONS))
+        logger.info(f"Starting section-parallel generation for requirement: {requirement_title} with {workers} workers")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda index: self._generate_section(requirement_data, index),
+                range(len(DOCUMENT_SECTIONS))
+            ))
         
-        prompt += """
+        document = f"# {requirement_title}\n\n"
+        cacheable = True
+        for i, ((title, _), (text, ok)) in enumerate(zip(DOCUMENT_SECTIONS, results), 1):
+            document += f"## {i}. {title}\n\n{text.strip()}\n\n"
+            cacheable = cacheable and ok
+        
+        logger.info(f"Section-parallel generation completed in {round(time.time() - start_time, 2)} seconds "
+                    f"for requirement: {requirement_title}")
+        return document, cacheable
+    
+    def _generate_section(self, requirement_data, index):
+        """生成单个章节，失败时重试，返回(章节正文, 是否成功)"""
+        title = DOCUMENT_SECTIONS[index][0]
+        prompt = self._build_section_prompt(requirement_data, index)
+        for attempt in range(self.section_retries + 1):
+            try:
+                start_time = time.time()
+                response = self.client.chat_completion(
+                    messages=[
+                        {"role": "system", "content": "You are a professional requirement analyst."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    model=self.model,
+                    purpose=self.purpose,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens
+                )
+                text = _strip_leading_heading(response.choices[0].message.content or '')
+                logger.info(f"Section {title} generated in {round(time.time() - start_time, 2)} seconds")
+                return text, True
+            except LLMUnavailableError as e:
+                # 客户端已完成重试和备用服务切换，不再重复重试
+                logger.error(f"Section {title} failed, LLM unavailable: {str(e)}")
+                break
+            except Exception as e:
+                logger.warning(f"Section {title} failed (attempt {attempt + 1}/{self.section_retries + 1}): {str(e)}")
+                if attempt < self.section_retries:
+                    time.sleep(self.section_retry_delay * (2 ** attempt))
+        
+        return "*生成该章节时发生错误，请稍后重新生成。*", False
+    
+    def try_generate_incremental(self, previous_document, requirement_data, added, removed):
+        """根据上一版本文档和内容变化生成章节补丁并合并，返回(新文档, 修改的章节列表)
 
-请按照以下结构生成需求文档：
+        added为新增内容（与requirement_data['contents']中的元素格式相同），removed为已删除内容的摘录。
+        示例模式或补丁无法解析时返回(None, [])，由调用方改为完整生成。
+        """
+        requirement_title = requirement_data.get('title', 'N/A')
+        if self.is_mock_mode():
+            return None, []
+        
+        prompt = self._build_patch_prompt(previous_document, added, removed)
+        logger.info(f"Starting incremental generation for requirement: {requirement_title} "
+                    f"({len(added)} added, {len(removed)} removed)")
+        start_time = time.time()
+        try:
+            response = self.client.chat_completion(
+                messages=[
+                    {"role": "system", "content": "You are a professional requirement analyst."},
+                    {"role": "user", "content": prompt}
+                ],
+                model=self.model,
+                purpose=self.purpose,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
+            )
+            patch = response.choices[0].message.content or ''
+        except Exception as e:
+            logger.error(f"Incremental generation failed for requirement: {requirement_title}: {str(e)}", exc_info=True)
+            return None, []
+        
+        document, sections = merge_sections(previous_document, patch)
+        if not sections:
+            logger.warning(f"Incremental generation returned no mergeable sections for requirement: {requirement_title}")
+            return None, []
+        logger.info(f"Incremental generation completed in {round(time.time() - start_time, 2)} seconds, "
+                    f"updated sections: {', '.join(sections)}")
+        return document, sections
+    
+    def _build_patch_prompt(self, previous_document, added, removed):
+        """构建增量更新的提示词：上一版本文档 + 新增和删除的内容"""
+        header = f"""
+以下是当前版本的用户需求文档：
 
-1. 需求概述
-   - 需求背景
-   - 需求目标
+{previous_document}
 
-2. 用户场景
-   - 主要用户角色
-   - 使用场景描述
+自该版本生成以来，收集到的原始需求内容发生了以下变化：
+"""
+        # 补丁的章节标题须与原文档的章节同级，否则无法合并
+        marks = '#' * (section_level(previous_document) or 2)
+        footer = f"""
 
-3. 功能要求
-   - 核心功能列表
-   - 功能详细描述
+请根据这些变化更新需求文档，只输出需要修改的章节：
+- 每个章节以“{marks} 章节标题”开头，标题级别和文字与原文档中的章节标题保持一致；
+- 输出该章节修改后的完整内容（包括其中的全部小节），不需要修改的章节不要输出，不要单独输出小节；
+- 如需新增章节，使用同一级别的新标题。
+"""
+        budget = self.context_tokens - self.max_tokens - count_tokens(header + footer) - 100
+        items = PromptBudget(
+            self.client, budget,
+            batch_tokens=self.summary_batch_tokens,
+            workers=self.summary_workers
+        ).fit([f"（新增）{self.render_content(content)}" for content in added] +
+              [f"（已删除，应从文档中移除仅由该内容支持的需求）{item['excerpt']}" for item in removed])
+        
+        prompt = header
+        for i, item in enumerate(items, 1):
+            prompt += f"\n{i}. {item}"
+        return prompt + footer
+    
+    def is_mock_mode(self):
+        """API密钥无效或未配置时使用示例文档"""
+        return not self.api_key or not getattr(self, 'api_key_valid', True)
+    
+    def cache_key(self, requirement_data, mode='full'):
+        """计算本次生成的缓存键（未经摘要的提示词 + 生成方式 + 用途的候选模型 + 温度）
 
-4. 非功能要求
-   - 性能要求
-   - 安全要求
-   - 兼容性要求
+        摘要结果只由原文和token预算决定，因此用原文计算即可，计算缓存键时不会调用模型做摘要；
+        摘要在实际生成（后台任务或流式响应）中构建提示词时才进行。
+        """
+        return self.cache_keys(requirement_data, (mode,))[0]
+    
+    def cache_keys(self, requirement_data, modes):
+        """按多个生成方式计算缓存键，提示词只渲染一次"""
+        prompt = self._contents_header(requirement_data)
+        for i, item in enumerate(self._render_items(requirement_data), 1):
+            prompt += f"\n{i}. {item}"
+        prompt += f"{_structure_prompt()}\0{self.context_tokens}"
+        return [prompt_cache_key(f"{prompt}\0{mode}", self._cache_model, self.temperature) for mode in modes]
+    
+    def stream_requirement_doc(self, requirement_data):
+        """以流式方式生成需求文档，逐段返回LLM输出的文本"""
+        requirement_title = requirement_data.get('title', 'N/A')
+        logger.info(f"Starting streaming document generation for requirement: {requirement_title}")
+        
+        prompt = self._build_prompt(requirement_data)
+        
+        if self.is_mock_mode():
+            logger.warning("Using mock document content due to invalid or unconfigured LLM API key")
+            mock_document = self._build_mock_document(requirement_data)
+            # 按行输出示例文档，模拟流式效果
+            for line in mock_document.splitlines(keepends=True):
+                yield line
+            return
+        
+        start_time = time.time()
+        first_token_time = None
+        logger.info(f"Calling LLM API in streaming mode with model: {self.model}")
+        
+        response = self.client.chat_completion(
+            messages=[
+                {"role": "system", "content": "You are a professional requirement analyst."},
+                {"role": "user", "content": prompt}
+            ],
+            model=self.model,
+            purpose=self.purpose,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stream=True
+        )
+        
+        for chunk in response:
+            if not chunk.get('choices'):
+                continue
+            delta = chunk['choices'][0].get('delta', {}).get('content')
+            if not delta:
+                continue
+            if first_token_time is None:
+                first_token_time = time.time()
+                logger.info(f"First token received after {round(first_token_time - start_time, 2)} seconds for requirement: {requirement_title}")
+            yield delta
+        
+        logger.info(f"LLM streaming completed in {round(time.time() - start_time, 2)} seconds for requirement: {requirement_title}")
+    
+    def _build_mock_document(self, requirement_data):
+        """生成示例Markdown文档（未配置有效API密钥时使用）"""
+        requirement_title = requirement_data.get('title', 'N/A')
+        mock_document = f"# {requirement_title}\n\n"
+        
+        # 添加需求描述
+        description = requirement_data.get('description', '无描述')
+        mock_document += f"## 需求概述\n\n{description}\n\n"
+        
+        # 添加内容列表
+        mock_document += "## 收集到的内容\n\n"
+        contents = requirement_data.get('contents', [])
+        for i, content in enumerate(contents, 1):
+            if content.get('content_type') == 'markdown' and content.get('content_text'):
+                mock_document += f"### {i}. 文本内容\n\n{content.get('content_text')[:100]}...\n\n"
+            elif content.get('file_path'):
+                file_name = os.path.basename(content.get('file_path'))
+                mock_document += f"### {i}. 文件附件\n\n[{file_name}]\n\n"
+        
+        # 添加其他章节
+        mock_document += "## 用户场景\n\n此处为用户场景描述\n\n"
+        mock_document += "## 功能要求\n\n此处为功能要求列表\n\n"
+        mock_document += "## 非功能要求\n\n此处为非功能要求描述\n\n"
+        mock_document += "## 附录\n\n此处为附录信息\n\n"
+        mock_document += "*此文档使用示例模板生成，因为未配置有效的LLM API密钥。*\n"
+        
+        return mock_document
+    
+    def render_content(self, content):
+        """将单条需求内容转换为提示词文本（不含编号，便于按内容缓存摘要）"""
+        file_name = content.get('file_name') or content.get('file_path') or 'N/A'
+        text = ''
+        if content['content_type'] in ('text', 'markdown'):
+            if content.get('content_text'):
+                text = f"文本内容：{content['content_text']}"
+        elif content['content_type'] == 'image':
+            text = f"图片内容：[图片文件 - {file_name}]"
+        elif content['content_type'] == 'audio':
+            text = f"语音内容：[音频文件 - {file_name}]"
+        elif content['content_type'] == 'file':
+            text = f"文件内容：[附件 - {file_name}]"
+        
+        # 附件中提取的文字（语音转写、PDF文本、图片OCR），由后台任务预先生成
+        extracted_text = content.get('extracted_text')
+        if extracted_text:
+            text += f"\n   附件文字内容（{file_name}）：{extracted_text}"
+        return text
+    
+    def _build_prompt(self, requirement_data):
+        """构建LLM提示词"""
+        return self._build_contents_prompt(requirement_data) + _structure_prompt()
+    
+    def _build_section_prompt(self, requirement_data, index):
+        """构建单个章节的提示词：需求信息与完整生成相同，只要求输出指定章节"""
+        title, topics = DOCUMENT_SECTIONS[index]
+        return self._build_contents_prompt(requirement_data) + f"""
 
-5. 附录
-   - 术语解释
-   - 参考资料
+完整的需求文档包含以下章节：{'、'.join(section for section, _ in DOCUMENT_SECTIONS)}。
+本次只撰写第{index + 1}章“{title}”，内容包括：{'、'.join(topics)}。
+不要输出标题和其他章节，直接输出该章节的正文。
 
 请确保文档内容专业、完整、清晰，符合软件工程规范。
 """
+    
+    def _contents_header(self, requirement_data):
+        return f"""
+请根据以下用户需求信息，生成一份完整、专业的用户需求文档：
+
+需求标题：{requirement_data.get('title', '')}
+需求描述：{requirement_data.get('description', '')}
+
+收集到的原始需求内容：
+"""
+    
+    def _render_items(self, requirement_data):
+        """按顺序渲染各条需求内容，跳过没有任何文字的内容（例如空文本），避免提示词中出现空条目"""
+        items = [self.render_content(content) for content in requirement_data.get('contents', [])]
+        return [item for item in items if item]
+    
+    def _build_contents_prompt(self, requirement_data):
+        """构建提示词中的需求信息部分
+
+        需求内容超出token预算时先摘要再放入提示词；同一份需求数据只构建一次。
+        """
+        if self._last_prompt and self._last_prompt[0] is requirement_data:
+            return self._last_prompt[1]
+        
+        header = self._contents_header(requirement_data)
+        
+        # 上下文窗口扣除输出长度、模板和系统提示词后，剩余部分用于需求内容
+        budget = self.context_tokens - self.max_tokens - count_tokens(header + _structure_prompt()) - 100
+        items = self._render_items(requirement_data)
+        items = PromptBudget(
+            self.client, budget,
+            batch_tokens=self.summary_batch_tokens,
+            workers=self.summary_workers
+        ).fit(items)
+        
+        prompt = header
+        for i, item in enumerate(items, 1):
+            prompt += f"\n{i}. {item}"
         
+        self._last_prompt = (requirement_data, prompt)
         return prompt
     
     def export_to_pdf(self, content, req_id):
@@ -0,0 +1,157 @@
+import importlib
+import logging
+import pkgutil
+from datetime import datetime
+
+import click
+
+from .. import db
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationOps:
+    """迁移脚本可用的在线变更操作
+
+    所有操作都是幂等的：新建的数据库由db.create_all()直接创建完整结构，
+    迁移脚本再次执行时会跳过已存在的列和索引。
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+
+    def _inspector(self):
+        return db.inspect(self.engine)
+
+    def has_column(self, table, column):
+        return column in {col['name'] for col in self._inspector().get_columns(table)}
+
+    def has_index(self, table, name):
+        return name in {index['name'] for index in self._inspector().get_indexes(table)}
+
+    def add_column(self, table, column):
+        """添加可为空的新列，MySQL下使用ALGORITHM=INSTANT避免重建表"""
+        if self.has_column(table, column.name):
+            return False
+
+        column_type = column.type.compile(dialect=self.engine.dialect)
+        ddl = f'ALTER TABLE {table} ADD COLUMN {column.name} {column_type} NULL'
+        logger.info(f"Adding column {table}.{column.name}")
+        with self.engine.begin() as conn:
+            if self.dialect == 'mysql':
+                try:
+                    conn.execute(db.text(f'{ddl}, ALGORITHM=INSTANT'))
+                    return True
+                except Exception as e:
+                    logger.warning(f"Instant ADD COLUMN not supported, falling back to INPLACE: {str(e)}")
+                    ddl = f'{ddl}, ALGORITHM=INPLACE, LOCK=NONE'
+            conn.execute(db.text(ddl))
+        return True
+
+    def create_index(self, table, name, columns, unique=False):
+        """在线创建索引，MySQL下使用ALGORITHM=INPLACE, LOCK=NONE，建索引期间不阻塞读写"""
+        if self.has_index(table, name):
+            return False
+
+        ddl = f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})"
+        if self.dialect == 'mysql':
+            ddl += ' ALGORITHM=INPLACE LOCK=NONE'
+        logger.info(f"Creating index {name} on {table}")
+        with self.engine.begin() as conn:
+            conn.execute(db.text(ddl))
+        return True
+
+    def backfill(self, table, target_column, source_columns, compute, key_column='id', batch_size=500,
+                 where=None, where_params=None):
+        """分批回填新列
+
+        每批按主键顺序读取target_column为空（或满足where条件）的batch_size行，用compute(row)计算新值，
+        更新后立即提交，单个事务只锁定一批行，避免长时间锁表。
+        """
+        select_columns = ', '.join([key_column] + list(source_columns))
+        last_key = None
+        total = 0
+        while True:
+            where_sql = f'({where})' if where else f'{target_column} IS NULL'
+            params = {'limit': batch_size, **(where_params or {})}
+            if last_key is not None:
+                where_sql += f' AND {key_column} > :last_key'
+                params['last_key'] = last_key
+
+            with self.engine.begin() as conn:
+                rows = conn.execute(db.text(
+                    f'SELECT {select_columns} FROM {table} WHERE {where_sql} '
+                    f'ORDER BY {key_column} LIMIT :limit'
+                ), params).mappings().all()
+                if not rows:
+                    break
+
+                updates = [{'key': row[key_column], 'value': compute(row)} for row in rows]
+                conn.execute(db.text(
+                    f'UPDATE {table} SET {target_column} = :value WHERE {key_column} = :key'
+                ), updates)
+
+            last_key = rows[-1][key_column]
+            total += len(rows)
+            logger.info(f"Backfilled {total} rows of {table}.{target_column}")
+        return total
+
+
+def load_migrations():
+    """按版本号顺序加载app/migrations下的迁移脚本"""
+    from .. import migrations as package
+
+    modules = []
+    for module_info in pkgutil.iter_modules(package.__path__):
+        module = importlib.import_module(f'{package.__name__}.{module_info.name}')
+        modules.append(module)
+    return sorted(modules, key=lambda module: module.revision)
+
+
+def applied_revisions():
+    from ..models.schema_migration import SchemaMigration
+    return {row.revision for row in SchemaMigration.query.all()}
+
+
+def upgrade_database():
+    """创建缺失的表并依次执行尚未执行的迁移，返回本次执行的版本号列表"""
+    from ..models.schema_migration import SchemaMigration
+
+    db.create_all()
+    done = applied_revisions()
+    ops = MigrationOps(db.engine)
+
+    applied = []
+    for module in load_migrations():
+        if module.revision in done:
+            continue
+        logger.info(f"Applying migration {module.revision}: {(module.__doc__ or '').strip()}")
+        module.upgrade(ops)
+        db.session.add(SchemaMigration(revision=module.revision, applied_at=datetime.utcnow()))
+        db.session.commit()
+        applied.append(module.revision)
+    return applied
+
+
+def init_migrations(app):
+    """注册迁移相关的CLI命令，并按配置在启动时自动升级数据库"""
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade():
+        """执行所有未完成的数据库迁移"""
+        applied = upgrade_database()
+        click.echo(f"Applied migrations: {', '.join(applied) if applied else 'none'}")
+
+    @app.cli.command('db-status')
+    def db_status():
+        """查看数据库迁移状态"""
+        db.create_all()
+        done = applied_revisions()
+        for module in load_migrations():
+            state = 'applied' if module.revision in done else 'pending'
+            click.echo(f"{module.revision}  {state:<8} {(module.__doc__ or '').strip()}")
+
+    if app.config.get('AUTO_MIGRATE'):
+        with app.app_context():
+            upgrade_database()
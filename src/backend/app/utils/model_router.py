@@ -0,0 +1,134 @@
+import json
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 调用用途：final为正式文档版本，preview为流式预览等交互场景，summary为提示词内容摘要
+PURPOSES = ('final', 'preview', 'summary')
+
+# 计算p95前至少需要的样本数，样本不足时使用配置中的预估延迟
+MIN_SAMPLES = 5
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    index = min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class ModelProfile:
+    """一个可选模型及其延迟、成本特征
+
+    latency为预估单次调用耗时（秒），在实测样本不足时使用；cost为相对成本；
+    max_p95为延迟上限，实测p95超过该值时暂不选用；purposes为可用于哪些调用用途。
+    实测样本按调用用途分别保存：摘要和正式文档的输入输出长度差别很大，混在一起无法反映各用途的延迟。
+    """
+
+    def __init__(self, name, purposes=PURPOSES, latency=30.0, cost=1.0, max_p95=None, window=50):
+        self.name = name
+        self.purposes = tuple(purposes)
+        self.latency = float(latency)
+        self.cost = float(cost)
+        self.max_p95 = max_p95
+        self.window = window
+        self.samples = {}
+
+    def record(self, seconds, purpose=None):
+        self.samples.setdefault(purpose, deque(maxlen=self.window)).append(seconds)
+
+    def _samples(self, purpose):
+        if purpose is None:
+            return [value for samples in self.samples.values() for value in samples]
+        return self.samples.get(purpose, ())
+
+    def p50(self, purpose=None):
+        samples = self._samples(purpose)
+        if len(samples) < MIN_SAMPLES:
+            return self.latency
+        return _percentile(samples, 0.5)
+
+    def p95(self, purpose=None):
+        samples = self._samples(purpose)
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return _percentile(samples, 0.95)
+
+    def healthy(self, purpose=None):
+        p95 = self.p95(purpose)
+        return self.max_p95 is None or p95 is None or p95 <= self.max_p95
+
+    def to_dict(self):
+        p95 = self.p95()
+        return {
+            'name': self.name,
+            'purposes': list(self.purposes),
+            'cost': self.cost,
+            'max_p95': self.max_p95,
+            'samples': len(self._samples(None)),
+            'p50': round(self.p50(), 3),
+            'p95': round(p95, 3) if p95 is not None else None,
+            'by_purpose': {
+                purpose or 'unknown': {
+                    'samples': len(samples),
+                    'p50': round(self.p50(purpose), 3),
+                    'p95': round(self.p95(purpose), 3) if self.p95(purpose) is not None else None
+                }
+                for purpose, samples in self.samples.items()
+            }
+        }
+
+
+class ModelRouter:
+    """按用途和实测延迟为每次调用选择模型
+
+    在可用于该用途的模型中排除p95超出上限的模型，再按滚动p50延迟乘以相对成本选择得分最低者；
+    全部超出上限时仍在所有候选中选择，保证总能返回一个模型。
+    """
+
+    def __init__(self, default_model, profiles=None, window=50):
+        self._lock = threading.Lock()
+        self.window = window
+        self.profiles = {}
+        for item in self._parse(profiles):
+            profile = ModelProfile(window=window, **item)
+            self.profiles[profile.name] = profile
+        if not self.profiles:
+            self.profiles[default_model] = ModelProfile(default_model, window=window)
+        self.default_model = default_model if default_model in self.profiles else next(iter(self.profiles))
+
+    @staticmethod
+    def _parse(profiles):
+        if isinstance(profiles, str):
+            profiles = json.loads(profiles) if profiles.strip() else []
+        return profiles or []
+
+    def select(self, purpose='final'):
+        with self._lock:
+            candidates = [profile for profile in self.profiles.values() if purpose in profile.purposes]
+            if not candidates:
+                return self.default_model
+            healthy = [profile for profile in candidates if profile.healthy(purpose)] or candidates
+            chosen = min(healthy, key=lambda profile: profile.p50(purpose) * profile.cost)
+        logger.debug(f"Routed {purpose} call to model {chosen.name}")
+        return chosen.name
+
+    def candidates(self, purpose='final'):
+        """可用于该用途的模型名称（已排序），没有时为默认模型；与实测延迟无关"""
+        with self._lock:
+            names = sorted(profile.name for profile in self.profiles.values() if purpose in profile.purposes)
+        return names or [self.default_model]
+
+    def record(self, model, seconds, purpose=None):
+        """记录一次成功调用的耗时；未指定用途的样本只计入统计，不参与选择"""
+        with self._lock:
+            profile = self.profiles.get(model)
+            if profile is None:
+                # 备用服务上的模型等未在配置中列出的模型也记录延迟，但不参与选择
+                profile = self.profiles[model] = ModelProfile(model, purposes=(), window=self.window)
+            profile.record(seconds, purpose)
+
+    def stats(self):
+        with self._lock:
+            return [profile.to_dict() for profile in self.profiles.values()]
@@ -0,0 +1,274 @@
+import hashlib
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.exc import IntegrityError
+
+from .. import db
+from ..models.derived_text import DerivedText
+
+logger = logging.getLogger(__name__)
+
+# 摘要缓存在derived_texts中的类型；提示词模板变化时修改版本号使旧摘要失效
+SUMMARY = 'summary'
+SUMMARY_VERSION = 'v1'
+
+SUMMARY_SYSTEM_PROMPT = "You are a professional requirement analyst. Summarize faithfully and concisely."
+
+# 匹配摘要结果中的条目编号，例如 "[3] ..."
+_ITEM_MARKER = re.compile(r'^\s*\[(\d+)\]\s*', re.MULTILINE)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:
+    _encoding = None
+
+_CJK = re.compile(r'[　-〿㐀-䶿一-鿿＀-￯]')
+
+
+def count_tokens(text):
+    """估算文本的token数，安装tiktoken时精确计算，否则按中文每字1个、其他字符每4个1个估算"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text, max_tokens):
+    """截断文本使其不超过max_tokens"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ''
+    # 按比例估算截断位置，再逐步收缩
+    end = max(int(len(text) * max_tokens / count_tokens(text)), 1)
+    while end > 1 and count_tokens(text[:end]) > max_tokens:
+        end = int(end * 0.9)
+    return text[:end] + '…'
+
+
+def split_to_chunks(text, max_tokens):
+    """将超长文本按段落切分为不超过max_tokens的片段"""
+    chunks = []
+    current = ''
+    for paragraph in text.splitlines(keepends=True):
+        while count_tokens(paragraph) > max_tokens:
+            head = truncate_to_tokens(paragraph, max_tokens)[:-1]
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(head)
+            paragraph = paragraph[len(head):]
+        if current and count_tokens(current + paragraph) > max_tokens:
+            chunks.append(current)
+            current = ''
+        current += paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def summary_key(text):
+    return hashlib.sha256(f'{SUMMARY}-{SUMMARY_VERSION}\0{text}'.encode('utf-8')).hexdigest()
+
+
+class PromptBudget:
+    """按token预算组装需求内容
+
+    内容总量不超过预算时原样使用；超出时先分批并行摘要各条内容（map），
+    摘要仍超出预算时再逐级合并（reduce）。每条内容的摘要按内容哈希缓存在derived_texts中，
+    新增一条内容时只需摘要这一条。
+    """
+
+    def __init__(self, client, budget, batch_tokens=4000, workers=4, summary_tokens=300, temperature=0.3):
+        self.client = client
+        self.budget = budget
+        self.batch_tokens = batch_tokens
+        self.workers = workers
+        self.summary_tokens = summary_tokens
+        self.temperature = temperature
+
+    @property
+    def can_summarize(self):
+        return self.client is not None and self.client.api_key_valid
+
+    def fit(self, items):
+        """输入各条内容文本，返回适合放入提示词的文本列表（可能少于输入条数）"""
+        total = sum(count_tokens(item) for item in items)
+        if total <= self.budget:
+            return list(items)
+
+        logger.info(f"Prompt contents use {total} tokens, over the budget of {self.budget}; summarizing {len(items)} items")
+        if not self.can_summarize:
+            return self._truncate(items)
+
+        summaries = self._map(items)
+        if sum(count_tokens(summary) for summary in summaries) <= self.budget:
+            return summaries
+        return self._reduce(summaries)
+
+    def _truncate(self, items):
+        """无法调用模型时，按平均份额截断每条内容"""
+        share = max(self.budget // max(len(items), 1), 1)
+        return [truncate_to_tokens(item, share) for item in items]
+
+    def _map(self, items):
+        """摘要所有内容，已缓存的直接复用，其余按批并行生成"""
+        keys = [summary_key(item) for item in items]
+        summaries = self._cached(keys)
+
+        # 超过单批大小的内容切块摘要，再按顺序拼接
+        units = []
+        for index, (item, key) in enumerate(zip(items, keys)):
+            if key in summaries:
+                continue
+            for chunk in split_to_chunks(item, self.batch_tokens):
+                units.append((index, chunk))
+
+        if units:
+            chunk_summaries = self._summarize_units([chunk for _, chunk in units])
+            produced = {}
+            for (index, chunk), summary in zip(units, chunk_summaries):
+                produced.setdefault(index, []).append(summary)
+
+            new_summaries = {}
+            for index, parts in produced.items():
+                if any(part is None for part in parts):
+                    # 本次摘要失败的内容不缓存，截断后使用
+                    continue
+                new_summaries[keys[index]] = '\n'.join(parts)
+            self._store(new_summaries)
+            summaries.update(new_summaries)
+            logger.info(f"Summarized {len(produced)} content items, {len(items) - len(produced)} served from cache")
+
+        item_share = max(self.budget // max(len(items), 1), self.summary_tokens)
+        return [summaries.get(key) or truncate_to_tokens(item, item_share) for item, key in zip(items, keys)]
+
+    def _reduce(self, summaries):
+        """逐级合并摘要，直到总量不超过预算"""
+        while len(summaries) > 1 and sum(count_tokens(summary) for summary in summaries) > self.budget:
+            groups = self._batches(summaries)
+            if len(groups) == len(summaries):
+                break
+            texts = ['\n'.join(group) for group in groups]
+            keys = [summary_key(text) for text in texts]
+            cached = self._cached(keys)
+
+            pending = [i for i, key in enumerate(keys) if key not in cached]
+            combined = self._parallel(self._combine, [texts[i] for i in pending])
+            new_summaries = {keys[i]: result for i, result in zip(pending, combined) if result}
+            self._store(new_summaries)
+            cached.update(new_summaries)
+
+            logger.info(f"Reduced {len(summaries)} summaries into {len(groups)}")
+            summaries = [cached.get(key) or truncate_to_tokens(text, self.summary_tokens)
+                         for text, key in zip(texts, keys)]
+
+        if sum(count_tokens(summary) for summary in summaries) > self.budget:
+            return self._truncate(summaries)
+        return summaries
+
+    def _batches(self, texts):
+        """按顺序将文本分组，每组不超过batch_tokens"""
+        groups = []
+        current = []
+        current_tokens = 0
+        for text in texts:
+            tokens = count_tokens(text)
+            if current and current_tokens + tokens > self.batch_tokens:
+                groups.append(current)
+                current = []
+                current_tokens = 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _summarize_units(self, units):
+        """分批摘要，返回与units一一对应的摘要列表，失败的条目为None"""
+        groups = self._batches(units)
+        results = self._parallel(self._summarize_batch, groups)
+        summaries = []
+        for group, result in zip(groups, results):
+            summaries.extend(result or [None] * len(group))
+        return summaries
+
+    def _parallel(self, func, args):
+        if not args:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(args))) as executor:
+            return list(executor.map(func, args))
+
+    def _summarize_batch(self, texts):
+        """一次调用摘要一批内容，要求模型按编号逐条输出"""
+        numbered = '\n\n'.join(f'[{i}] {text}' for i, text in enumerate(texts, 1))
+        prompt = (
+            f"以下是用户需求的{len(texts)}条原始内容。请分别为每一条写一段简洁的中文摘要，"
+            f"保留需求要点、约束条件和关键数据，每条不超过{self.summary_tokens}字。\n"
+            f"按原编号逐条输出，格式为“[编号] 摘要”，不要合并或省略任何一条。\n\n{numbered}"
+        )
+        try:
+            output = self._complete(prompt, self.summary_tokens * len(texts) + 100)
+        except Exception as e:
+            logger.error(f"Failed to summarize {len(texts)} content items: {str(e)}")
+            return None
+
+        parsed = {}
+        markers = list(_ITEM_MARKER.finditer(output))
+        for marker, following in zip(markers, markers[1:] + [None]):
+            end = following.start() if following else len(output)
+            parsed[int(marker.group(1))] = output[marker.end():end].strip()
+        if len(texts) == 1 and not parsed:
+            parsed[1] = output.strip()
+        return [parsed.get(i) or None for i in range(1, len(texts) + 1)]
+
+    def _combine(self, text):
+        """将一组摘要合并为一段更短的摘要"""
+        prompt = (
+            "以下是同一需求中多条内容的摘要。请将它们合并为一段简洁的中文摘要，"
+            f"保留所有不同的需求要点和约束条件，不超过{self.summary_tokens * 2}字。\n\n{text}"
+        )
+        try:
+            return self._complete(prompt, self.summary_tokens * 2 + 100).strip() or None
+        except Exception as e:
+            logger.error(f"Failed to combine summaries: {str(e)}")
+            return None
+
+    def _complete(self, prompt, max_tokens):
+        response = self.client.chat_completion(
+            messages=[
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            model=self.client.select_model('summary'),
+            purpose='summary',
+            temperature=self.temperature,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content or ''
+
+    def _cached(self, keys):
+        if not keys:
+            return {}
+        rows = DerivedText.query.filter(
+            DerivedText.content_hash.in_(set(keys)),
+            DerivedText.kind == SUMMARY,
+            DerivedText.status == 'done'
+        ).all()
+        return {row.content_hash: row.text for row in rows if row.text}
+
+    def _store(self, summaries):
+        for key, text in summaries.items():
+            try:
+                with db.session.begin_nested():
+                    db.session.add(DerivedText(content_hash=key, kind=SUMMARY, status='done', text=text))
+            except IntegrityError:
+                # 并发请求已写入同一摘要
+                pass
+        if summaries:
+            db.session.commit()
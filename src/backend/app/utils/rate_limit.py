@@ -0,0 +1,104 @@
+import logging
+import math
+import threading
+import time
+
+from .redis_client import get_redis, redis_available
+
+logger = logging.getLogger(__name__)
+
+# 令牌桶：按经过的时间补充令牌，不超过容量；令牌足够则扣除并放行，否则返回需要等待的秒数
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_limit(value):
+    """解析"10/minute"形式的限额，返回(每秒补充的令牌数, 桶容量)；为空或0表示不限制"""
+    if not value:
+        return None
+    count, _, period = str(value).partition('/')
+    count = int(count)
+    if count <= 0:
+        return None
+    period = period.strip() or 'minute'
+    seconds = int(period) if period.isdigit() else _PERIODS[period]
+    return count / seconds, count
+
+
+class RateLimiter:
+    """令牌桶限流器
+
+    优先使用Redis（Lua脚本保证原子性），多个进程共享同一个桶；Redis不可用时退化为进程内计数。
+    """
+
+    def __init__(self, app=None):
+        self.redis = None
+        self.prefix = None
+        self.limits = {}
+        self._script = None
+        self._buckets = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.redis = get_redis(app)
+        self.prefix = app.config.get('RATE_LIMIT_KEY_PREFIX', 'agile_srs:ratelimit')
+        self.limits = {
+            'generation_user': parse_limit(app.config.get('GENERATION_RATE_LIMIT_USER')),
+            'generation_requirement': parse_limit(app.config.get('GENERATION_RATE_LIMIT_REQUIREMENT')),
+        }
+        if self.redis is not None:
+            self._script = self.redis.register_script(_TOKEN_BUCKET_SCRIPT)
+        app.extensions['rate_limiter'] = self
+
+    def hit(self, scope, identity):
+        """消耗scope限额下identity的一个令牌，放行返回0，否则返回需要等待的秒数"""
+        limit = self.limits.get(scope)
+        if not limit:
+            return 0
+        rate, capacity = limit
+        key = f'{self.prefix}:{scope}:{identity}'
+
+        if self._script is not None and redis_available(self.redis):
+            try:
+                return float(self._script(keys=[key], args=[rate, capacity, time.time()]))
+            except Exception as e:
+                logger.warning(f"Rate limiting via Redis failed, using in-process buckets: {str(e)}")
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def check_generation(self, user_id, req_id):
+        """文档生成限流：先按用户、再按需求检查，返回需要等待的秒数（向上取整），0表示放行"""
+        for scope, identity in (('generation_user', user_id), ('generation_requirement', req_id)):
+            wait = self.hit(scope, identity)
+            if wait > 0:
+                logger.warning(f"Generation rate limit exceeded for {scope} {identity}, retry after {wait:.1f}s")
+                return max(math.ceil(wait), 1)
+        return 0
@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+
+import redis
+from redis.client import Pipeline
+
+logger = logging.getLogger(__name__)
+
+# 连接失败后的重试间隔（秒），每次失败翻倍，直到上限
+RETRY_BACKOFF = 1
+RETRY_BACKOFF_MAX = 60
+
+
+class RedisUnavailable(redis.ConnectionError):
+    """Redis处于重试等待期，命令未发送"""
+
+
+class ResilientRedis(redis.Redis):
+    """连接失败后按指数退避重试的Redis客户端
+
+    连接或超时错误后进入等待期，期间的命令立即抛出RedisUnavailable，调用方按原有逻辑退化到进程内实现，
+    不会每次都等待连接超时；等待期结束后的下一条命令重新尝试连接，成功后恢复正常。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._backoff = 0
+        self._retry_at = 0
+        self._state_lock = threading.Lock()
+
+    @property
+    def available(self):
+        """不在重试等待期内（并不保证下一条命令一定成功）"""
+        return time.monotonic() >= self._retry_at
+
+    def _check(self):
+        if not self.available:
+            raise RedisUnavailable(f'Redis unavailable, retrying in {self._retry_at - time.monotonic():.0f}s')
+
+    def _record(self, error=None):
+        with self._state_lock:
+            if error is None:
+                if self._backoff:
+                    logger.info("Reconnected to Redis")
+                self._backoff = 0
+                self._retry_at = 0
+                return
+            self._backoff = min(self._backoff * 2 or RETRY_BACKOFF, RETRY_BACKOFF_MAX)
+            self._retry_at = time.monotonic() + self._backoff
+        logger.warning(f"Redis unavailable, using in-process fallbacks; retrying in {self._backoff}s: {str(error)}")
+
+    def _call(self, func, *args, **kwargs):
+        self._check()
+        try:
+            result = func(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self._record(e)
+            raise
+        if self._backoff:
+            self._record()
+        return result
+
+    def execute_command(self, *args, **options):
+        return self._call(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        self._check()
+        return _ResilientPipeline(self, transaction, shard_hint)
+
+
+class _ResilientPipeline(Pipeline):
+    """执行结果计入所属客户端的连接状态"""
+
+    def __init__(self, client, transaction, shard_hint):
+        super().__init__(client.connection_pool, client.response_callbacks, transaction, shard_hint)
+        self._client = client
+
+    def execute(self, raise_on_error=True):
+        return self._client._call(super().execute, raise_on_error)
+
+
+def redis_available(client):
+    """client已配置且不在重试等待期内"""
+    return client is not None and client.available
+
+
+def get_redis(app):
+    """获取应用共享的Redis客户端，未配置REDIS_URL时返回None
+
+    客户端缓存在app.extensions中。启动时连接失败不会永久放弃：客户端仍然返回，
+    按指数退避重试，Redis恢复后各扩展自动重新使用；可用redis_available()判断当前是否处于等待期。
+    """
+    if 'redis' in app.extensions:
+        return app.extensions['redis']
+
+    client = None
+    redis_url = app.config.get('REDIS_URL')
+    if redis_url:
+        client = ResilientRedis.from_url(redis_url, socket_connect_timeout=1)
+        try:
+            client.ping()
+            logger.info(f"Connected to Redis: {redis_url}")
+        except (redis.ConnectionError, redis.TimeoutError):
+            # 已由客户端记录并进入重试等待期
+            pass
+        except Exception as e:
+            logger.warning(f"Redis check failed at startup: {str(e)}")
+
+    app.extensions['redis'] = client
+    return client
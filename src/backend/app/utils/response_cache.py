@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, request, current_app
+from flask_jwt_extended import get_jwt_identity
+
+from .redis_client import get_redis, redis_available
+
+logger = logging.getLogger(__name__)
+
+# 缓存范围：revision按需求修订号区分版本，写操作递增修订号后旧缓存自然失效；
+# user按用户的列表版本号区分，由写接口调用invalidate_lists递增。列表版本号必须在所有进程间共享，
+# 因此user范围只在Redis可用时缓存，否则直接执行视图
+SCOPES = ('revision', 'user')
+
+
+class ResponseCache:
+    """读接口的响应缓存
+
+    缓存序列化后的JSON响应体，键中包含版本号，数据变化时递增版本号即可使旧缓存失效，
+    无需逐个删除。优先使用Redis在多个进程间共享；Redis不可用时revision范围使用进程内LRU缓存，
+    user范围不缓存。
+    """
+
+    def __init__(self, app=None):
+        self.redis = None
+        self.prefix = None
+        self.ttl = 300
+        self.max_bytes = 1024 * 1024
+        self.local_size = 1000
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.redis = get_redis(app)
+        self.prefix = app.config.get('RESPONSE_CACHE_KEY_PREFIX', 'agile_srs:response')
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', 300)
+        self.max_bytes = app.config.get('RESPONSE_CACHE_MAX_BYTES', 1024 * 1024)
+        self.local_size = app.config.get('RESPONSE_CACHE_LOCAL_SIZE', 1000)
+        app.extensions['response_cache'] = self
+
+    def cached(self, resource, scope='revision'):
+        """路由装饰器：缓存视图的200响应，须放在权限校验之后"""
+        if scope not in SCOPES:
+            raise ValueError(f'Unknown response cache scope: {scope}')
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.ttl:
+                    return view(*args, **kwargs)
+
+                key = self._key(resource, scope)
+                if key is None:
+                    return view(*args, **kwargs)
+                body = self._get(key)
+                if body is not None:
+                    return current_app.response_class(body, mimetype='application/json')
+
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed and response.is_json:
+                    body = response.get_data()
+                    if len(body) <= self.max_bytes:
+                        self._set(key, body)
+                return response
+            return wrapper
+        return decorator
+
+    def _document_key(self, req_id, version, encoding):
+        return f'{self.prefix}:document:{req_id}:v{version}:{encoding}'
+
+    def get_document_body(self, req_id, version, encoding):
+        """读取缓存的文档版本响应体（按encoding压缩），未缓存时返回None"""
+        if not self.ttl:
+            return None
+        return self._get(self._document_key(req_id, version, encoding))
+
+    def set_document_body(self, req_id, version, encoding, body):
+        """缓存文档版本的压缩响应体，版本写入后不再变化，无需失效"""
+        if self.ttl and len(body) <= self.max_bytes:
+            self._set(self._document_key(req_id, version, encoding), body)
+
+    def invalidate_lists(self, user_ids):
+        """递增这些用户的列表版本号，使其需求列表缓存失效"""
+        user_ids = [str(user_id) for user_id in user_ids]
+        if not user_ids:
+            return
+        if self.redis is None:
+            return
+        try:
+            pipe = self.redis.pipeline()
+            for user_id in user_ids:
+                pipe.incr(self._version_key(user_id))
+            pipe.execute()
+        except Exception as e:
+            # 无法递增时已缓存的列表最多在RESPONSE_CACHE_TTL后过期
+            logger.warning(f"Failed to bump response cache versions in Redis: {str(e)}")
+
+    def _version_key(self, user_id):
+        return f'{self.prefix}:version:list:{user_id}'
+
+    def _list_version(self, user_id):
+        """读取用户的列表版本号，Redis不可用时返回None"""
+        if not redis_available(self.redis):
+            return None
+        try:
+            return int(self.redis.get(self._version_key(user_id)) or 0)
+        except Exception as e:
+            logger.warning(f"Failed to read response cache version from Redis: {str(e)}")
+            return None
+
+    def _key(self, resource, scope):
+        """计算当前请求的缓存键，无法可靠区分版本时返回None（不缓存）"""
+        view_args = request.view_args or {}
+        if scope == 'revision':
+            from .http_cache import current_revision
+            req_id = view_args['req_id']
+            # revalidated已查询过修订号时直接复用
+            revision = g.get('revision')
+            if revision is None:
+                revision = current_revision(req_id)[0]
+            version = f'{req_id}:r{revision}'
+        else:
+            user_id = str(get_jwt_identity())
+            list_version = self._list_version(user_id)
+            if list_version is None:
+                return None
+            version = f'u{user_id}:v{list_version}'
+
+        # 路由参数和查询参数决定响应内容，一并计入键
+        raw = '&'.join(f'{name}={view_args[name]}' for name in sorted(view_args)) + '?' + \
+            request.query_string.decode('latin-1')
+        digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        return f'{self.prefix}:{resource}:{version}:{digest}'
+
+    def _get(self, key):
+        if redis_available(self.redis):
+            try:
+                return self.redis.get(key)
+            except Exception as e:
+                logger.warning(f"Failed to read response cache from Redis: {str(e)}")
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry[0]
+
+    def _set(self, key, body):
+        if redis_available(self.redis):
+            try:
+                self.redis.set(key, body, ex=self.ttl)
+                return
+            except Exception as e:
+                logger.warning(f"Failed to write response cache to Redis: {str(e)}")
+        with self._lock:
+            self._local[key] = (body, time.monotonic() + self.ttl)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+import uuid
+
+from .redis_client import get_redis, redis_available
+
+logger = logging.getLogger(__name__)
+
+# 仅在持有者匹配时释放锁，避免锁过期后误删其他进程重新获得的锁
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class Flight:
+    """一次进行中的调用，由领头者完成，跟随者等待其结果"""
+
+    def __init__(self, key, token=None):
+        self.key = key
+        self.token = token
+        self.result = None
+        self.error = None
+        # 其他进程已持有Redis锁，本次未成为领头者
+        self.abandoned = False
+        self.done = threading.Event()
+
+
+class SingleFlight:
+    """合并并发的相同调用（single-flight）
+
+    同一进程内，跟随者直接等待领头者的返回值；不同进程之间通过Redis锁选出领头者，
+    其他进程的跟随者轮询lookup（例如查询已保存的文档版本）直到结果出现或锁被释放。
+    Redis不可用时只在进程内合并。
+    """
+
+    def __init__(self, app=None):
+        self.redis = None
+        self.prefix = None
+        self.timeout = 600
+        self.poll_interval = 0.5
+        self._release = None
+        self._flights = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.redis = get_redis(app)
+        self.prefix = app.config.get('SINGLE_FLIGHT_KEY_PREFIX', 'agile_srs:flight')
+        self.timeout = app.config.get('SINGLE_FLIGHT_TIMEOUT', 600)
+        if self.redis is not None:
+            self._release = self.redis.register_script(_RELEASE_SCRIPT)
+        app.extensions['single_flight'] = self
+
+    def acquire(self, key):
+        """尝试成为key的领头者，成功返回Flight，已有其他调用进行中返回None"""
+        with self._lock:
+            if key in self._flights:
+                return None
+            flight = self._flights[key] = Flight(key)
+
+        if redis_available(self.redis):
+            token = uuid.uuid4().hex
+            try:
+                if not self.redis.set(f'{self.prefix}:{key}', token, nx=True, ex=int(self.timeout)):
+                    with self._lock:
+                        self._flights.pop(key, None)
+                    flight.abandoned = True
+                    flight.done.set()
+                    return None
+                flight.token = token
+            except Exception as e:
+                logger.warning(f"Single-flight lock via Redis failed, coalescing in-process only: {str(e)}")
+        return flight
+
+    def finish(self, flight, result=None, error=None):
+        """领头者完成调用，唤醒本进程内的跟随者并释放锁"""
+        flight.result = result
+        flight.error = error
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight.done.set()
+
+        if flight.token and self._release is not None:
+            try:
+                self._release(keys=[f'{self.prefix}:{flight.key}'], args=[flight.token])
+            except Exception as e:
+                logger.warning(f"Failed to release single-flight lock {flight.key}: {str(e)}")
+
+    def wait(self, key, lookup=None):
+        """等待其他调用完成
+
+        返回(是否等到结果, 结果)。进程内的领头者直接返回其结果（领头者出错时重新抛出）；
+        其他进程的领头者通过lookup()获取结果，锁释放后仍无结果则返回(False, None)，由调用方自行执行。
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+        if flight is not None:
+            if not flight.done.wait(self.timeout):
+                return False, None
+            if flight.error is not None:
+                raise flight.error
+            # 领头者被放弃（其他进程持有锁）或未产生结果（例如客户端断开）时，改为查询或自行执行
+            if not flight.abandoned and flight.result is not None:
+                return True, flight.result
+
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            result = lookup() if lookup else None
+            if result is not None:
+                return True, result
+            if not self._locked(key):
+                return False, None
+            time.sleep(self.poll_interval)
+        return False, None
+
+    def _locked(self, key):
+        if not redis_available(self.redis):
+            return False
+        try:
+            return bool(self.redis.exists(f'{self.prefix}:{key}'))
+        except Exception:
+            return False
+
+    def do(self, key, func, lookup=None):
+        """执行func，相同key的并发调用只执行一次，返回(结果, 是否复用了其他调用的结果)
+
+        func的返回值不能为None，None表示领头者未完成，跟随者将重新尝试。
+        """
+        while True:
+            flight = self.acquire(key)
+            if flight is not None:
+                try:
+                    result = func()
+                except Exception as e:
+                    self.finish(flight, error=e)
+                    raise
+                self.finish(flight, result=result)
+                return result, False
+
+            logger.info(f"Waiting for in-flight call: {key}")
+            found, result = self.wait(key, lookup)
+            if found:
+                return result, True
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import uuid
+
+# 内容类型判断所用的文件扩展名
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+AUDIO_EXTENSIONS = ('.mp3',)
+
+
+def safe_filename(filename):
+    """去除路径部分，保留原始文件名（含中文）"""
+    name = os.path.basename((filename or '').replace('\\', '/')).strip()
+    return name or 'upload'
+
+
+def detect_content_type(filename, content_type):
+    """根据文件扩展名确定内容类型；已指定为markdown时保留markdown类型"""
+    if content_type == 'markdown':
+        return content_type
+    lower_name = filename.lower()
+    if lower_name.endswith(IMAGE_EXTENSIONS):
+        return 'image'
+    if lower_name.endswith(AUDIO_EXTENSIONS):
+        return 'audio'
+    return 'file'
+
+
+def blob_path(upload_dir, digest):
+    """按内容哈希前缀分目录存放，避免单个目录下文件过多
+
+    例如 uploads/blobs/ab/cd/abcd...（完整SHA-256）
+    """
+    directory = os.path.join(upload_dir, 'blobs', digest[:2], digest[2:4])
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, digest)
+
+
+def temp_path(upload_dir, name=None):
+    """上传过程中的临时文件路径"""
+    directory = os.path.join(upload_dir, '.partial')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name or uuid.uuid4().hex)
+
+
+def copy_stream(stream, target, chunk_size, hasher=None, limit=None):
+    """按固定大小分块将输入流写入目标文件，返回写入的字节数
+
+    超过limit时抛出ValueError。
+    """
+    written = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        written += len(chunk)
+        if limit is not None and written > limit:
+            raise ValueError('Upload exceeds declared size')
+        if hasher is not None:
+            hasher.update(chunk)
+        target.write(chunk)
+    return written
+
+
+def file_sha256(path, chunk_size):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
@@ -0,0 +1,257 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from .. import db, job_queue
+from ..models.blob import FileBlob
+from ..models.derived_text import DerivedText
+from ..models.requirement import RequirementContent
+from .storage import AUDIO_EXTENSIONS, IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# 提取方式
+TRANSCRIPT = 'transcript'  # 语音转写
+PDF_TEXT = 'pdf_text'      # PDF文本层
+OCR = 'ocr'                # 图片文字识别
+
+PDF_EXTENSIONS = ('.pdf',)
+
+# 提取任务超过TEXT_EXTRACTION_TIMEOUT再加上该时长（秒）仍未完成，视为已中断
+STALE_MARGIN = 600
+
+_pool = None
+_pool_broken = False
+_pool_lock = threading.Lock()
+
+# 子进程中缓存已加载的语音模型，避免每个文件重复加载
+_whisper_model = None
+
+
+def _transcribe_file(path, model_name):
+    """使用本地Whisper模型（CPU）转写音频文件"""
+    global _whisper_model
+    from faster_whisper import WhisperModel
+
+    if _whisper_model is None:
+        _whisper_model = WhisperModel(model_name, device='cpu', compute_type='int8')
+    segments, _ = _whisper_model.transcribe(path)
+    return ''.join(segment.text for segment in segments).strip()
+
+
+def _extract_pdf_text(path):
+    """提取PDF文本层"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return '\n'.join((page.extract_text() or '').strip() for page in reader.pages).strip()
+
+
+def _ocr_image(path, languages):
+    """使用Tesseract识别图片中的文字"""
+    import pytesseract
+    from PIL import Image
+
+    with Image.open(path) as image:
+        return pytesseract.image_to_string(image, lang=languages).strip()
+
+
+def _run_extractor(kind, path, options):
+    """在子进程中执行具体的提取函数"""
+    if kind == TRANSCRIPT:
+        return _transcribe_file(path, options['model'])
+    if kind == PDF_TEXT:
+        return _extract_pdf_text(path)
+    if kind == OCR:
+        return _ocr_image(path, options['languages'])
+    raise ValueError(f"Unknown extraction kind: {kind}")
+
+
+def _get_pool(workers):
+    """返回提取进程池，未预先启动时在首次使用时创建；进程池损坏后返回None
+
+    使用fork：spawn/forkserver会在子进程中重新导入主模块（run.py），从而再次创建应用。
+    fork只复制当前线程，其他线程持有的锁（日志、数据库连接池等）在子进程中永远不会释放，
+    因此服务进程在启动任务线程之前由start_pool创建进程池并启动全部子进程。
+    子进程异常退出（OOM、提取库崩溃）后进程池不可再用，此时任务线程已在运行，不能重新fork，
+    之后的提取在任务线程中直接执行，直到服务进程重启。
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None and not _pool_broken:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        return _pool
+
+
+def _discard_pool(pool):
+    """丢弃已损坏的进程池"""
+    global _pool, _pool_broken
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            _pool_broken = True
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@job_queue.on_start
+def start_pool():
+    """任务线程启动前创建进程池；fork上下文的进程池在第一次提交任务时一次启动全部子进程"""
+    if not current_app.config.get('TEXT_EXTRACTION_ENABLED'):
+        return
+    _get_pool(current_app.config.get('TEXT_EXTRACTION_WORKERS', 1)).submit(int).result()
+    logger.info('Text extraction process pool started')
+
+
+def extraction_kind(content):
+    """根据附件文件名确定提取方式，不支持的文件返回None"""
+    if not content.content_hash:
+        return None
+    name = (content.file_name or content.file_path or '').lower()
+    if name.endswith(AUDIO_EXTENSIONS):
+        return TRANSCRIPT
+    if name.endswith(PDF_EXTENSIONS):
+        return PDF_TEXT
+    if name.endswith(IMAGE_EXTENSIONS):
+        return OCR
+    return None
+
+
+def request_extraction(content):
+    """为单个附件创建文本提取任务，返回是否新加入了队列"""
+    return request_extractions([content]) > 0
+
+
+def request_extractions(contents):
+    """为尚未提取文本的附件批量创建提取任务，返回加入队列的任务数
+
+    同一文件内容只提取一次。一次查询已有的提取记录，只在新增或重新入队时提交一次，
+    避免在build_requirement_data的循环中逐条提交使已加载的内容过期而逐行重新查询。
+    """
+    if not current_app.config.get('TEXT_EXTRACTION_ENABLED'):
+        return 0
+    wanted = {}
+    for content in contents:
+        kind = extraction_kind(content)
+        if kind:
+            wanted[(content.content_hash, kind)] = True
+    if not wanted:
+        return 0
+
+    existing = {
+        (record.content_hash, record.kind): record
+        for record in DerivedText.query.filter(
+            DerivedText.content_hash.in_({content_hash for content_hash, _ in wanted})
+        ).all()
+    }
+
+    queued = []
+    for key in wanted:
+        record = existing.get(key)
+        if record is not None:
+            if _requeue_stale(record):
+                queued.append(key)
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.add(DerivedText(content_hash=key[0], kind=key[1], status='pending'))
+            queued.append(key)
+        except IntegrityError:
+            # 其他请求已创建同一文件的提取任务
+            pass
+    if not queued:
+        return 0
+    db.session.commit()
+
+    for content_hash, kind in queued:
+        job_queue.enqueue('extract_text', content_hash, kind)
+        logger.info(f"Queued {kind} extraction for blob {content_hash}")
+    return len(queued)
+
+
+def _requeue_stale(record):
+    """pending或running状态超过提取超时仍未更新的任务（例如worker进程中途退出）标记为重新入队，由调用方提交"""
+    if record.status not in ('pending', 'running'):
+        return False
+    stale_after = current_app.config.get('TEXT_EXTRACTION_TIMEOUT', 1800) + STALE_MARGIN
+    if datetime.utcnow() - record.updated_at < timedelta(seconds=stale_after):
+        return False
+
+    # 只有条件更新成功的请求负责重新入队
+    requeued = DerivedText.query.filter_by(
+        content_hash=record.content_hash, kind=record.kind, status=record.status, updated_at=record.updated_at
+    ).update({'status': 'pending', 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    if requeued:
+        logger.warning(f"Requeueing stale {record.kind} extraction for blob {record.content_hash}")
+    return bool(requeued)
+
+
+def cached_texts(contents):
+    """一次查询取得已完成的提取文本，返回{content_hash: text}，不等待未完成的任务"""
+    hashes = {content.content_hash for content in contents if content.content_hash}
+    if not hashes:
+        return {}
+    rows = DerivedText.query.filter(
+        DerivedText.content_hash.in_(hashes),
+        DerivedText.status == 'done'
+    ).all()
+    return {row.content_hash: row.text for row in rows if row.text}
+
+
+@job_queue.task('extract_text')
+def run_extraction(content_hash, kind):
+    """后台提取任务：在进程池中执行，当前工作线程只等待结果"""
+    record = DerivedText.query.get((content_hash, kind))
+    if not record or record.status == 'done':
+        return
+
+    blob = FileBlob.query.get(content_hash)
+    if blob:
+        path = blob.path
+    else:
+        content = RequirementContent.query.filter_by(content_hash=content_hash).first()
+        path = content.file_path if content else None
+    if not path:
+        record.status = 'failed'
+        record.error = 'File not found'
+        db.session.commit()
+        return
+
+    record.status = 'running'
+    db.session.commit()
+
+    options = {
+        'model': current_app.config.get('TRANSCRIBE_MODEL', 'base'),
+        'languages': current_app.config.get('OCR_LANGUAGES', 'chi_sim+eng')
+    }
+    pool = _get_pool(current_app.config.get('TEXT_EXTRACTION_WORKERS', 1))
+    try:
+        if pool is None:
+            record.text = _run_extractor(kind, path, options)
+        else:
+            future = pool.submit(_run_extractor, kind, path, options)
+            record.text = future.result(timeout=current_app.config.get('TEXT_EXTRACTION_TIMEOUT', 1800))
+        record.status = 'done'
+        record.error = None
+        logger.info(f"Extracted {kind} for blob {content_hash} ({len(record.text)} characters)")
+    except BrokenProcessPool as e:
+        # 导致子进程退出的可能就是当前文件，不在任务线程中重试，避免拖垮服务进程
+        logger.error(f"Text extraction process died while extracting {kind} for blob {content_hash}, "
+                     f"running later extractions in job threads until restart: {str(e)}")
+        _discard_pool(pool)
+        record.status = 'failed'
+        record.error = 'Extraction process exited unexpectedly'
+    except ImportError as e:
+        logger.warning(f"Extractor for {kind} unavailable, install its optional dependency to enable it: {str(e)}")
+        record.status = 'unavailable'
+        record.error = str(e)
+    except Exception as e:
+        logger.error(f"{kind} extraction failed for blob {content_hash}: {str(e)}", exc_info=True)
+        record.status = 'failed'
+        record.error = str(e)
+    db.session.commit()
@@ -0,0 +1,72 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from .. import db, job_queue
+from ..models.upload import UploadSession
+from .storage import temp_path
+
+logger = logging.getLogger(__name__)
+
+_last_cleanup = 0
+_cleanup_lock = threading.Lock()
+
+
+def session_expiry():
+    """新建或续传的上传会话的过期时间"""
+    return datetime.utcnow() + timedelta(seconds=current_app.config.get('UPLOAD_SESSION_TTL', 24 * 3600))
+
+
+def schedule_cleanup():
+    """距上次清理超过UPLOAD_CLEANUP_INTERVAL时加入清理任务；每个进程各自计时，重复清理没有副作用"""
+    global _last_cleanup
+    interval = current_app.config.get('UPLOAD_CLEANUP_INTERVAL', 3600)
+    with _cleanup_lock:
+        if time.monotonic() - _last_cleanup < interval:
+            return False
+        _last_cleanup = time.monotonic()
+    job_queue.enqueue('cleanup_uploads')
+    return True
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@job_queue.task('cleanup_uploads')
+def cleanup_uploads(batch_size=500):
+    """删除过期的上传会话及其临时文件，并删除没有对应会话、超过有效期的临时文件"""
+    upload_dir = current_app.config['UPLOAD_FOLDER']
+    now = datetime.utcnow()
+    removed = 0
+    while True:
+        expired = UploadSession.query.filter(UploadSession.expires_at <= now).limit(batch_size).all()
+        if not expired:
+            break
+        for upload in expired:
+            _remove(temp_path(upload_dir, upload.id))
+            db.session.delete(upload)
+        db.session.commit()
+        removed += len(expired)
+
+    # 会话创建失败或提交内容时中断留下的临时文件
+    partial_dir = os.path.dirname(temp_path(upload_dir, 'x'))
+    cutoff = time.time() - current_app.config.get('UPLOAD_SESSION_TTL', 24 * 3600)
+    active = {row.id for row in db.session.query(UploadSession.id).all()}
+    orphans = 0
+    for name in os.listdir(partial_dir):
+        path = os.path.join(partial_dir, name)
+        if name not in active and os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+            _remove(path)
+            orphans += 1
+
+    if removed or orphans:
+        logger.info(f"Removed {removed} expired upload sessions and {orphans} orphaned partial files")
+    return removed
@@ -8,18 +8,101 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'your-jwt-secret-key-here'
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    # 分块上传：每次写盘的块大小，以及单个文件的大小上限（每个分块请求仍受MAX_CONTENT_LENGTH限制）
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE') or 512 * 1024 * 1024)
+    # 分块上传会话的有效期（秒，每收到一个分块顺延），以及清理过期会话和临时文件的最短间隔（秒）
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL') or 24 * 3600)
+    UPLOAD_CLEANUP_INTERVAL = int(os.environ.get('UPLOAD_CLEANUP_INTERVAL') or 3600)
+    # 设置后文件下载交由nginx通过X-Accel-Redirect发送，值为nginx中internal location的前缀
+    UPLOAD_ACCEL_REDIRECT_PREFIX = os.environ.get('UPLOAD_ACCEL_REDIRECT_PREFIX')
+    # 上传文件签名访问地址的有效时长（秒），实际有效期在1到2倍之间
+    FILE_URL_TTL = int(os.environ.get('FILE_URL_TTL') or 900)
     
     # LLM配置
     # 硅基流动模型服务地址
     LLM_BASE_URL = os.environ.get('LLM_BASE_URL') or 'https://api.siliconflow.cn/v1'
     # 模型API密钥
     LLM_API_KEY = os.environ.get('LLM_API_KEY') or 'sk-placeholder-for-testing'
-    # 模型名称
+    # 模型名称（未配置LLM_MODELS时所有调用均使用该模型）
     LLM_MODEL = os.environ.get('LLM_MODEL') or 'deepseek-ai/DeepSeek-R1'
+    # 可选模型列表（JSON），按调用用途（final正式版本、preview预览、summary内容摘要）和实测延迟路由，例如：
+    # [{"name": "deepseek-ai/DeepSeek-R1", "purposes": ["final"], "latency": 60, "cost": 4, "max_p95": 180},
+    #  {"name": "deepseek-ai/DeepSeek-V3", "purposes": ["final", "preview", "summary"], "latency": 15, "cost": 1}]
+    LLM_MODELS = os.environ.get('LLM_MODELS') or '[]'
+    # 与模型服务之间保持的HTTP连接池大小
+    LLM_POOL_SIZE = int(os.environ.get('LLM_POOL_SIZE') or 10)
+    # 备用模型服务（JSON列表，按顺序尝试），例如 [{"base_url": "https://...", "model": "...", "api_key": "..."}]
+    LLM_FALLBACKS = os.environ.get('LLM_FALLBACKS') or '[]'
+    # 超时（秒）：建立连接、单次请求读取，以及单次调用含重试和切换备用服务的总截止时间
+    LLM_CONNECT_TIMEOUT = int(os.environ.get('LLM_CONNECT_TIMEOUT') or 10)
+    LLM_REQUEST_TIMEOUT = int(os.environ.get('LLM_REQUEST_TIMEOUT') or 120)
+    LLM_DEADLINE = int(os.environ.get('LLM_DEADLINE') or 300)
+    # 限流(429)和服务端错误(5xx)的重试次数，以及指数退避的初始和最大间隔（秒）
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 3))
+    LLM_RETRY_BASE_DELAY = 1.0
+    LLM_RETRY_MAX_DELAY = 30.0
+    # 熔断：连续失败次数达到阈值后暂停调用该服务，经过LLM_BREAKER_RESET秒后再试探
+    LLM_BREAKER_THRESHOLD = int(os.environ.get('LLM_BREAKER_THRESHOLD') or 5)
+    LLM_BREAKER_RESET = int(os.environ.get('LLM_BREAKER_RESET') or 30)
+    # 模型上下文窗口和单次生成的最大输出长度（token）
+    LLM_CONTEXT_TOKENS = int(os.environ.get('LLM_CONTEXT_TOKENS') or 32000)
+    LLM_MAX_TOKENS = int(os.environ.get('LLM_MAX_TOKENS') or 2000)
+    # 需求内容超出上下文预算时分批并行摘要：每批的token上限和并发数
+    PROMPT_SUMMARY_BATCH_TOKENS = int(os.environ.get('PROMPT_SUMMARY_BATCH_TOKENS') or 4000)
+    PROMPT_SUMMARY_WORKERS = int(os.environ.get('PROMPT_SUMMARY_WORKERS') or 4)
+    # 自上一版本以来变化的内容条数不超过该值时，只把上一版本和变化的内容发给模型，按章节增量更新文档
+    INCREMENTAL_MAX_CHANGES = int(os.environ.get('INCREMENTAL_MAX_CHANGES') or 20)
+    # 按章节并行生成（?mode=sections）：并发请求数、单个章节失败后的重试次数及首次重试间隔（秒）
+    SECTION_WORKERS = int(os.environ.get('SECTION_WORKERS') or 5)
+    SECTION_MAX_RETRIES = int(os.environ.get('SECTION_MAX_RETRIES', 2))
+    SECTION_RETRY_DELAY = 1.0
+
+    # 文档生成限流（令牌桶），格式为"次数/时间单位"，时间单位为second、minute、hour、day或秒数，为空则不限制
+    GENERATION_RATE_LIMIT_USER = os.environ.get('GENERATION_RATE_LIMIT_USER', '10/minute')
+    GENERATION_RATE_LIMIT_REQUIREMENT = os.environ.get('GENERATION_RATE_LIMIT_REQUIREMENT', '20/minute')
+    # 合并并发的相同生成请求：等待进行中生成的最长时间（秒），也是跨进程锁的过期时间
+    SINGLE_FLIGHT_TIMEOUT = int(os.environ.get('SINGLE_FLIGHT_TIMEOUT') or 900)
+    # 需求访问权限（是否存在、创建者、成员角色）在Redis中的共享缓存时间（秒），设为0或Redis不可用时每个请求都查询数据库
+    ACCESS_CACHE_TTL = int(os.environ.get('ACCESS_CACHE_TTL', 30))
+    # 读接口响应缓存（Redis，不可用时为进程内LRU）：过期时间（秒，设为0则关闭）、单个响应的大小上限和进程内条目数上限
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+    RESPONSE_CACHE_MAX_BYTES = 1024 * 1024
+    RESPONSE_CACHE_LOCAL_SIZE = int(os.environ.get('RESPONSE_CACHE_LOCAL_SIZE') or 1000)
+    # 文档版本和需求内容文本的压缩存储：zlib、zstd（需安装zstandard）或none，以及开始压缩的最小字符数
+    TEXT_COMPRESSION = os.environ.get('TEXT_COMPRESSION') or 'zlib'
+    TEXT_COMPRESSION_MIN_LENGTH = int(os.environ.get('TEXT_COMPRESSION_MIN_LENGTH') or 1024)
 
     # Redis配置（用于缓存）
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
 
+    # 后台任务配置（文档生成等耗时任务）
+    # 每个服务进程内的任务工作线程数，设为0则只入队不消费（由独立的worker进程处理）；
+    # 工作线程由gunicorn.conf.py和python run.py启动，flask CLI命令不会启动
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    # Redis中任务队列的键名，Redis不可用时使用数据库中的queued_jobs表
+    JOB_QUEUE_KEY = os.environ.get('JOB_QUEUE_KEY') or 'agile_srs:jobs'
+    # 执行中的任务每隔JOB_HEARTBEAT_INTERVAL秒续期，超过JOB_VISIBILITY_TIMEOUT秒未续期视为worker已崩溃，重新入队
+    JOB_HEARTBEAT_INTERVAL = int(os.environ.get('JOB_HEARTBEAT_INTERVAL') or 30)
+    JOB_VISIBILITY_TIMEOUT = int(os.environ.get('JOB_VISIBILITY_TIMEOUT') or 120)
+    # 同一任务最多执行的次数，超过后丢弃
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 3)
+    # 数据库队列空闲时的轮询间隔（秒）
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL') or 1)
+    # 文档生成任务超过该时间（秒）仍未完成时标记为失败，客户端不再等待
+    GENERATION_JOB_TIMEOUT = int(os.environ.get('GENERATION_JOB_TIMEOUT') or 1800)
+
+    # 附件文本提取：语音转写(faster-whisper)、PDF文本(pypdf)、图片OCR(pytesseract)
+    # 在独立进程池中以CPU运行，依赖均为可选，未安装时对应任务标记为unavailable
+    TEXT_EXTRACTION_ENABLED = os.environ.get('TEXT_EXTRACTION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    TEXT_EXTRACTION_WORKERS = int(os.environ.get('TEXT_EXTRACTION_WORKERS') or 1)
+    TEXT_EXTRACTION_TIMEOUT = 30 * 60  # 单个文件提取超时（秒）
+    TRANSCRIBE_MODEL = os.environ.get('TRANSCRIBE_MODEL') or 'base'
+    OCR_LANGUAGES = os.environ.get('OCR_LANGUAGES') or 'chi_sim+eng'
+
+    # 启动时自动执行数据库迁移；多进程部署时应关闭，改为部署前执行 flask db-upgrade
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', 'true').lower() in ('1', 'true', 'yes')
+
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -31,6 +114,8 @@ class DevelopmentConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+    # 生产环境由容器启动命令统一执行迁移，避免多个gunicorn worker并发迁移
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', 'false').lower() in ('1', 'true', 'yes')
 
 
 config = {
@@ -0,0 +1,23 @@
+# Gunicorn配置
+#
+# 流式生成文档（SSE）在整个生成期间占用处理请求的线程，同步worker下每个流独占一个进程，
+# 并且超过timeout没有返回就会被主进程杀掉。这里使用gthread：每个进程用多个线程处理请求，
+# 主循环在请求处理期间仍持续向主进程报告心跳；timeout按最长生成时间设置，作为进程卡死时的兜底。
+import os
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:5000'
+workers = int(os.environ.get('GUNICORN_WORKERS') or 4)
+worker_class = 'gthread'
+# 每个进程可同时处理的请求数（含进行中的生成流）
+threads = int(os.environ.get('GUNICORN_THREADS') or 16)
+
+# 单次生成最长LLM_DEADLINE秒，留出保存版本等余量
+timeout = int(os.environ.get('LLM_DEADLINE') or 300) + 60
+# 重启或缩容时等待进行中的生成流结束
+graceful_timeout = timeout
+keepalive = 5
+
+
+def post_worker_init(worker):
+    """应用加载完成后在每个worker进程中启动后台任务线程（flask CLI命令不会启动）"""
+    worker.wsgi.extensions['job_queue'].start()
@@ -2,14 +2,15 @@ import os
 import sys
 from app import create_app, db
 from app.models.user import User
+from app.utils.migrations import upgrade_database
 
 def init_db():
     # 创建Flask应用上下文
     app = create_app(os.getenv('FLASK_CONFIG') or 'default')
     
     with app.app_context():
-        # 创建所有表
-        db.create_all()
+        # 创建所有表并执行未完成的迁移
+        upgrade_database()
         
         # 检查是否已存在admin用户
         admin_user = User.query.filter_by(username='admin').first()
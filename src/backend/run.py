@@ -1,7 +1,8 @@
 import os
-from app import create_app, db
+from app import create_app, db, job_queue
 from app.models.user import User
 from app.models.requirement import Requirement, UserRequirement, RequirementContent
+from app.models.job import GenerationJob
 
 app = create_app(os.getenv('FLASK_CONFIG') or 'default')
 
@@ -13,11 +14,16 @@ def make_shell_context():
         User=User,
         Requirement=Requirement,
         UserRequirement=UserRequirement,
-        RequirementContent=RequirementContent
+        RequirementContent=RequirementContent,
+        GenerationJob=GenerationJob
     )
 
-with app.app_context():
-    db.create_all()
+@app.cli.command('jobs-worker')
+def jobs_worker():
+    """以独立进程消费后台任务队列（配合JOB_WORKERS=0使用）"""
+    job_queue.run_forever()
 
 if __name__ == '__main__':
+    # 任务线程只在服务进程中启动，flask CLI命令（如db-upgrade）不会消费任务
+    job_queue.start()
     app.run(debug=False, host='0.0.0.0', port=5001)
\ No newline at end of file
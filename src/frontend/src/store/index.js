@@ -43,6 +43,10 @@ export const useRequirementStore = defineStore('requirement', {
       this.requirements = requirements
     },
     
+    appendRequirements(requirements) {
+      this.requirements.push(...requirements)
+    },
+    
     setCurrentRequirement(requirement) {
       this.currentRequirement = requirement
     },
@@ -13,10 +13,8 @@ api.interceptors.request.use(
     const userStore = useUserStore()
     const token = userStore.token
     
-    // 添加防缓存头部
-    config.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    config.headers['Pragma'] = 'no-cache'
-    config.headers['Expires'] = '0'
+    // 不设置Cache-Control请求头：请求头中的no-cache会使浏览器绕过HTTP缓存、不发送If-None-Match，
+    // 是否重新验证由服务器响应的Cache-Control决定（列表等接口返回no-cache，每次验证后得到304）
     
     if (token) {
       config.headers.Authorization = `Bearer ${token}`
@@ -46,11 +44,66 @@ api.interceptors.response.use(
   }
 )
 
-export const generateDocument = (reqId) => api.post(`/requirements/${reqId}/generate-document`);
+// purpose决定生成用途和选用的模型：final为正式版本，preview为交互式预览
+export const generateDocument = (reqId, purpose = 'final') =>
+  api.post(`/requirements/${reqId}/generate-document`, null, { params: { purpose } });
+// 以SSE流式生成文档，每收到一段内容调用onDelta，返回最终版本号
+export const streamDocument = async (reqId, onDelta, purpose = 'final') => {
+  const userStore = useUserStore()
+  const response = await fetch(`/api/requirements/${reqId}/generate-document/stream?purpose=${encodeURIComponent(purpose)}`, {
+    method: 'POST',
+    headers: { Authorization: `Bearer ${userStore.token}` }
+  })
+  if (!response.ok || !response.body) {
+    throw new Error(`生成文档失败 (${response.status})`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+      const event = raw.match(/^event: (.*)$/m)?.[1]
+      const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}')
+      if (event === 'delta') {
+        onDelta(data.content)
+      } else if (event === 'done') {
+        return data.version
+      } else if (event === 'error') {
+        throw new Error(data.error || data.message)
+      }
+    }
+  }
+  throw new Error('文档生成流意外中断')
+};
+// 大文件分块上传：创建上传会话、按服务端返回的块大小依次上传，最后提交内容
+export const uploadFileChunked = async (reqId, file, fields = {}) => {
+  const { data } = await api.post(`/requirements/${reqId}/uploads`, { filename: file.name, size: file.size })
+  const uploadId = data.upload.id
+  let offset = data.upload.received_size
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + data.chunk_size)
+    const response = await api.put(`/requirements/${reqId}/uploads/${uploadId}`, chunk, {
+      params: { offset },
+      headers: { 'Content-Type': 'application/octet-stream' }
+    })
+    offset = response.data.upload.received_size
+  }
+  return api.post(`/requirements/${reqId}/uploads/${uploadId}/complete`, fields)
+};
+export const getGenerationJob = (reqId, jobId) => api.get(`/requirements/${reqId}/jobs/${jobId}`);
 export const exportPdf = (reqId) => api.get(`/requirements/${reqId}/export-pdf`, { responseType: 'blob' });
 export const exportMarkdown = (reqId) => api.get(`/requirements/${reqId}/export-markdown`, { responseType: 'blob' });
 export const getDocumentVersions = (reqId) => api.get(`/requirements/${reqId}/documents`);
 export const getDocumentByVersion = (reqId, version) => api.get(`/requirements/${reqId}/documents/${version}`);
+export const getContentFileUrls = (reqId) => api.get(`/requirements/${reqId}/content-file-urls`);
 export const getUserByEmail = (email) => api.get(`/users/email/${email}`);
 export const searchUsersByEmail = (emailPrefix) => api.get(`/users/search?email_prefix=${emailPrefix}`);
 export default api
\ No newline at end of file
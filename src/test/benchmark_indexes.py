@@ -0,0 +1,198 @@
+"""索引性能基准测试
+
+在临时SQLite数据库中写入10k需求、100k内容，分别在删除和创建热点索引的情况下，
+输出requirements.py各接口所用查询的执行计划和接口耗时。
+
+用法：python benchmark_indexes.py [--requirements 10000] [--contents 100000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+# 使用临时数据库，不启动后台任务线程，LLM使用示例文档
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+os.environ['DEV_DATABASE_URL'] = f'sqlite:///{DB_FILE}'
+os.environ['JOB_WORKERS'] = '0'
+os.environ['LLM_API_KEY'] = 'your-llm-api-key-here'
+
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.user import User
+from app.models.requirement import Requirement, UserRequirement, RequirementContent
+from app.models.document import RequirementDocument
+
+# 本次基准测试关注的索引
+HOT_INDEXES = [
+    'ix_requirements_creator_id',
+    'ix_user_requirements_requirement_id',
+    'ix_requirement_contents_requirement_id_id',
+]
+
+
+def seed(num_users, num_requirements, num_contents, num_documents):
+    """批量写入测试数据，返回(热点用户ID, 热点需求ID)"""
+    random.seed(42)
+    now = datetime.utcnow()
+
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x'}
+        for i in range(1, num_users + 1)
+    ])
+
+    req_ids = [f'req-{i:08d}' for i in range(num_requirements)]
+    db.session.execute(db.insert(Requirement), [
+        {
+            'id': req_id,
+            'title': f'需求 {i}',
+            'description': '基准测试数据',
+            'creator_id': random.randint(1, num_users),
+            'created_at': now,
+            'updated_at': now - timedelta(seconds=i),
+            'status': random.choice(['draft', 'in_progress', 'completed'])
+        }
+        for i, req_id in enumerate(req_ids)
+    ])
+
+    # 每个需求3名成员，用户1参与前500个需求
+    memberships = set()
+    for i, req_id in enumerate(req_ids):
+        members = random.sample(range(2, num_users + 1), 3)
+        if i < 500:
+            members[0] = 1
+        for user_id in members:
+            memberships.add((user_id, req_id))
+    db.session.execute(db.insert(UserRequirement), [
+        {'user_id': user_id, 'requirement_id': req_id, 'role': 'member', 'joined_at': now}
+        for user_id, req_id in memberships
+    ])
+
+    db.session.execute(db.insert(RequirementContent), [
+        {
+            'requirement_id': random.choice(req_ids),
+            'content_type': 'markdown',
+            'content_text': f'内容 {i} ' * 20,
+            'submitted_by': random.randint(1, num_users),
+            'submitted_at': now
+        }
+        for i in range(num_contents)
+    ])
+
+    db.session.execute(db.insert(RequirementDocument), [
+        {
+            'requirement_id': req_ids[i % num_requirements],
+            'version': i // num_requirements + 1,
+            'content': f'# 文档 {i}',
+            'generated_at': now
+        }
+        for i in range(num_documents)
+    ])
+    db.session.commit()
+
+    # 热点需求：用户1参与、内容最多的需求
+    hot_req = db.session.query(RequirementContent.requirement_id, db.func.count())\
+        .filter(RequirementContent.requirement_id.in_(req_ids[:500]))\
+        .group_by(RequirementContent.requirement_id)\
+        .order_by(db.func.count().desc()).first()[0]
+    return 1, hot_req
+
+
+def drop_hot_indexes():
+    for name in HOT_INDEXES:
+        db.session.execute(db.text(f'DROP INDEX IF EXISTS {name}'))
+    db.session.commit()
+
+
+def create_hot_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in HOT_INDEXES:
+                index.create(db.engine, checkfirst=True)
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+def explain(sql, params):
+    rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}'), params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def run(client, headers, endpoints, queries, repeat):
+    results = {}
+    for name, url in endpoints:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            response = client.get(url, headers=headers)
+            # 示例文档不参与缓存，导出总是创建后台生成任务（202）
+            assert response.status_code in (200, 202), \
+                (url, response.status_code, response.get_data(as_text=True)[:200])
+        results[name] = (time.perf_counter() - start) / repeat * 1000
+
+    plans = {name: explain(sql, params) for name, (sql, params) in queries.items()}
+    return results, plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='索引性能基准测试')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--requirements', type=int, default=10000)
+    parser.add_argument('--contents', type=int, default=100000)
+    parser.add_argument('--documents', type=int, default=30000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app('default')
+    with app.app_context():
+        db.create_all()
+        print(f'Seeding {DB_FILE} ...')
+        user_id, req_id = seed(args.users, args.requirements, args.contents, args.documents)
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+        endpoints = [
+            ('list', '/api/requirements/list'),
+            ('get', f'/api/requirements/{req_id}'),
+            ('participants', f'/api/requirements/{req_id}/participants'),
+            ('contents', f'/api/requirements/{req_id}/contents'),
+            ('documents', f'/api/requirements/{req_id}/documents'),
+            ('document_version', f'/api/requirements/{req_id}/documents/1'),
+            ('export_markdown', f'/api/requirements/{req_id}/export-markdown'),
+        ]
+        queries = {
+            'contents by requirement': (
+                'SELECT * FROM requirement_contents WHERE requirement_id = :r ORDER BY id', {'r': req_id}),
+            'members by requirement': (
+                'SELECT * FROM user_requirements WHERE requirement_id = :r', {'r': req_id}),
+            'requirements by creator': (
+                'SELECT * FROM requirements WHERE creator_id = :u', {'u': user_id}),
+            'latest document version': (
+                'SELECT max(version) FROM requirement_documents WHERE requirement_id = :r', {'r': req_id}),
+            'documents by requirement': (
+                'SELECT * FROM requirement_documents WHERE requirement_id = :r ORDER BY version DESC', {'r': req_id}),
+        }
+
+        drop_hot_indexes()
+        before, before_plans = run(client, headers, endpoints, queries, args.repeat)
+        create_hot_indexes()
+        after, after_plans = run(client, headers, endpoints, queries, args.repeat)
+
+    print('\n接口平均耗时 (ms)')
+    print(f"{'endpoint':<20}{'before':>10}{'after':>10}")
+    for name, _ in endpoints:
+        print(f'{name:<20}{before[name]:>10.2f}{after[name]:>10.2f}')
+
+    print('\n查询计划')
+    for name in queries:
+        print(f'- {name}')
+        print(f"    before: {'; '.join(before_plans[name])}")
+        print(f"    after:  {'; '.join(after_plans[name])}")
+
+
+if __name__ == '__main__':
+    main()
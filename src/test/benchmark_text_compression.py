@@ -0,0 +1,171 @@
+"""文本压缩存储基准测试
+
+在临时SQLite数据库中写入需求内容和多次重新生成的文档版本（经save_document_version写入，
+与实际生成时写入的列相同），先以未压缩形式存储，再执行迁移0007压缩已有数据，分别输出数据库文件大小
+（整理前的实际大小和VACUUM后的大小）、备份耗时和读取路径（文档版本、内容列表、生成文档时收集需求数据）的耗时。
+
+用法：python benchmark_text_compression.py [--requirements 50] [--versions 20] [--codec zlib] [--repeat 20]
+"""
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+# 使用临时数据库，不启动后台任务线程；关闭响应缓存，使每次请求都读取数据库
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+os.environ['DEV_DATABASE_URL'] = f'sqlite:///{DB_FILE}'
+os.environ['JOB_WORKERS'] = '0'
+os.environ['LLM_API_KEY'] = 'your-llm-api-key-here'
+os.environ['RESPONSE_CACHE_TTL'] = '0'
+os.environ['ACCESS_CACHE_TTL'] = '0'
+os.environ['AUTO_MIGRATE'] = 'false'
+
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.user import User
+from app.models.requirement import Requirement, UserRequirement, RequirementContent
+from app.utils.documents import build_requirement_data, save_document_version
+from app.utils.migrations import MigrationOps
+
+WORDS = ['用户', '系统', '需求', '文档', '版本', '协作', '权限', '导出', '上传', '审核', '通知', '接口',
+         '性能', '安全', '数据', '记录', '支持', '应当', '可以', '管理员', '成员', '提交', '生成', '历史']
+
+
+def markdown(rng, sections=5, sentences=12):
+    """生成近似真实需求文档的Markdown文本"""
+    lines = []
+    for i in range(sections):
+        lines.append(f'## {i + 1}. {rng.choice(WORDS)}{rng.choice(WORDS)}')
+        for _ in range(sentences):
+            lines.append('- ' + ''.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))) + '。')
+    return '\n'.join(lines)
+
+
+def seed(num_requirements, num_versions, num_contents):
+    """以未压缩形式写入测试数据，返回热点需求ID"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    db.session.execute(db.insert(User), [{'id': 1, 'username': 'user1', 'email': 'user1@example.com', 'password_hash': 'x'}])
+
+    req_ids = [f'req-{i:06d}' for i in range(num_requirements)]
+    db.session.execute(db.insert(Requirement), [
+        {'id': req_id, 'title': f'需求 {i}', 'description': '基准测试数据', 'creator_id': 1,
+         'created_at': now, 'updated_at': now, 'status': 'draft', 'revision': 0}
+        for i, req_id in enumerate(req_ids)
+    ])
+    db.session.execute(db.insert(UserRequirement), [
+        {'user_id': 1, 'requirement_id': req_id, 'role': 'owner', 'joined_at': now} for req_id in req_ids
+    ])
+
+    for req_id in req_ids:
+        db.session.execute(db.insert(RequirementContent), [
+            {'requirement_id': req_id, 'content_type': 'markdown', 'content_text': markdown(rng, 2, 8),
+             'submitted_by': 1, 'submitted_at': now}
+            for _ in range(num_contents)
+        ])
+    db.session.commit()
+
+    # 每次重新生成都保存一份完整文档，相邻版本大部分内容相同；与生成任务一样经save_document_version写入
+    for req_id in req_ids:
+        base = markdown(rng)
+        for _ in range(num_versions):
+            document = base + '\n' + markdown(rng, 1, 4)
+            save_document_version(req_id, document, prompt_hash=hashlib.sha256(document.encode('utf-8')).hexdigest())
+    return req_ids[0]
+
+
+def storage_stats():
+    """返回(实际文件大小MB, VACUUM后文件大小MB, 备份耗时ms)"""
+    db.session.commit()
+    size = os.path.getsize(DB_FILE) / 1024 / 1024
+    db.session.execute(db.text('VACUUM'))
+    db.session.commit()
+    vacuumed_size = os.path.getsize(DB_FILE) / 1024 / 1024
+
+    backup_file = DB_FILE + '.bak'
+    start = time.perf_counter()
+    source, target = sqlite3.connect(DB_FILE), sqlite3.connect(backup_file)
+    source.backup(target)
+    source.close()
+    target.close()
+    elapsed = (time.perf_counter() - start) * 1000
+    os.remove(backup_file)
+    return size, vacuumed_size, elapsed
+
+
+def run(client, headers, req_id, num_versions, repeat):
+    endpoints = [
+        ('document_version', lambda i: f'/api/requirements/{req_id}/documents/{i % num_versions + 1}'),
+        ('documents', lambda i: f'/api/requirements/{req_id}/documents?include=content'),
+        ('contents', lambda i: f'/api/requirements/{req_id}/contents'),
+    ]
+    results = {}
+    for name, url in endpoints:
+        start = time.perf_counter()
+        for i in range(repeat):
+            response = client.get(url(i), headers=headers)
+            assert response.status_code == 200, (name, response.status_code)
+        results[name] = (time.perf_counter() - start) / repeat * 1000
+
+    requirement = Requirement.query.get(req_id)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        db.session.expire_all()
+        build_requirement_data(requirement)
+    results['build_requirement_data'] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文本压缩存储基准测试')
+    parser.add_argument('--requirements', type=int, default=50)
+    parser.add_argument('--versions', type=int, default=20)
+    parser.add_argument('--contents', type=int, default=10)
+    parser.add_argument('--codec', default='zlib', choices=['zlib', 'zstd'])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app('default')
+    app.config['TEXT_EXTRACTION_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        print(f'Seeding {DB_FILE} ...')
+        app.config['TEXT_COMPRESSION'] = 'none'
+        req_id = seed(args.requirements, args.versions, args.contents)
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {create_access_token(identity="1")}'}
+        before_size, before_vacuumed, before_backup = storage_stats()
+        before = run(client, headers, req_id, args.versions, args.repeat)
+
+        # 与部署时相同，由迁移0007分批压缩已有数据
+        app.config['TEXT_COMPRESSION'] = args.codec
+        from app.migrations import m0007_compress_texts
+        start = time.perf_counter()
+        m0007_compress_texts.upgrade(MigrationOps(db.engine))
+        backfill_seconds = time.perf_counter() - start
+        db.session.expire_all()
+
+        after_size, after_vacuumed, after_backup = storage_stats()
+        after = run(client, headers, req_id, args.versions, args.repeat)
+
+    print(f'\n压缩回填耗时: {backfill_seconds:.2f}s')
+    print(f"\n{'':<24}{'plain':>12}{args.codec:>12}")
+    print(f"{'db size (MB)':<24}{before_size:>12.2f}{after_size:>12.2f}")
+    print(f"{'db size vacuumed (MB)':<24}{before_vacuumed:>12.2f}{after_vacuumed:>12.2f}")
+    print(f"{'backup (ms)':<24}{before_backup:>12.2f}{after_backup:>12.2f}")
+    print('\n读取路径平均耗时 (ms)')
+    for name in before:
+        print(f'{name:<24}{before[name]:>12.2f}{after[name]:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""LLM客户端容错与模型路由测试
+
+在本地启动兼容OpenAI接口的模拟服务，验证超时、重试、熔断、备用服务切换和按延迟选择模型。
+不需要启动后端服务和真实的模型API。
+
+用法：python test_llm_client.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+import openai
+from app.utils.llm_client import LLMClient, LLMUnavailableError
+from app.utils.model_router import ModelRouter
+
+
+class StubServer:
+    """模拟的ChatCompletion服务：按顺序返回statuses中的状态码，用完后返回200"""
+
+    def __init__(self, statuses=None, delay=0):
+        self.statuses = list(statuses or [])
+        self.delay = delay
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                server.requests.append(body)
+                time.sleep(server.delay)
+                status = server.statuses.pop(0) if server.statuses else 200
+                if status == 200:
+                    data = {
+                        'id': 'stub', 'object': 'chat.completion',
+                        'choices': [{'index': 0, 'finish_reason': 'stop',
+                                     'message': {'role': 'assistant', 'content': f"reply from {body['model']}"}}],
+                        'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}
+                    }
+                else:
+                    data = {'error': {'message': f'stub error {status}', 'type': 'stub'}}
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f'http://127.0.0.1:{self.httpd.server_address[1]}/v1'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_client(primary, fallbacks=None, models=None, **settings):
+    client = LLMClient()
+    client.configure(
+        api_key='sk-test',
+        base_url=primary.base_url,
+        model='primary-model',
+        pool_size=4,
+        fallbacks=fallbacks,
+        models=models,
+        settings=dict({
+            'LLM_RETRY_BASE_DELAY': 0.01,
+            'LLM_RETRY_MAX_DELAY': 0.05,
+            'LLM_REQUEST_TIMEOUT': 2,
+            'LLM_DEADLINE': 5,
+        }, **settings)
+    )
+    return client
+
+
+def ask(client, model=None, purpose=None):
+    response = client.chat_completion(messages=[{'role': 'user', 'content': 'hi'}], model=model, purpose=purpose)
+    return response.choices[0].message.content
+
+
+class LLMClientTest(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.close()
+
+    def server(self, **kwargs):
+        server = StubServer(**kwargs)
+        self.servers.append(server)
+        return server
+
+    def test_retries_server_errors(self):
+        stub = self.server(statuses=[503, 502, 429])
+        client = make_client(stub)
+        self.assertEqual(ask(client), f'reply from {client.model}')
+        self.assertEqual(len(stub.requests), 4)
+
+    def test_bad_request_is_not_retried(self):
+        stub = self.server(statuses=[400])
+        with self.assertRaises(openai.error.InvalidRequestError):
+            ask(make_client(stub))
+        self.assertEqual(len(stub.requests), 1)
+
+    def test_deadline_bounds_hung_server(self):
+        stub = self.server(delay=3)
+        client = make_client(stub, LLM_REQUEST_TIMEOUT=60, LLM_DEADLINE=1, LLM_MAX_RETRIES=5)
+        start = time.monotonic()
+        with self.assertRaises(LLMUnavailableError):
+            ask(client)
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_circuit_breaker_fails_fast(self):
+        stub = self.server(statuses=[503] * 10)
+        client = make_client(stub, LLM_MAX_RETRIES=5, LLM_BREAKER_THRESHOLD=3, LLM_BREAKER_RESET=60)
+        with self.assertRaises(LLMUnavailableError):
+            ask(client)
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(client.status()['endpoints'][0]['state'], 'open')
+
+        # 熔断期间不再请求该服务
+        with self.assertRaises(LLMUnavailableError):
+            ask(client)
+        self.assertEqual(len(stub.requests), 3)
+
+    def test_half_open_probe_closes_circuit(self):
+        stub = self.server(statuses=[503, 503])
+        client = make_client(stub, LLM_MAX_RETRIES=0, LLM_BREAKER_THRESHOLD=2, LLM_BREAKER_RESET=0.2)
+        for _ in range(2):
+            with self.assertRaises(LLMUnavailableError):
+                ask(client)
+        self.assertEqual(client.status()['endpoints'][0]['state'], 'open')
+
+        time.sleep(0.3)
+        self.assertEqual(ask(client), f'reply from {client.model}')
+        self.assertEqual(client.status()['endpoints'][0]['state'], 'closed')
+
+    def test_expired_deadline_does_not_hold_half_open_probe(self):
+        stub = self.server(statuses=[503, 503])
+        client = make_client(stub, LLM_MAX_RETRIES=0, LLM_BREAKER_THRESHOLD=2, LLM_BREAKER_RESET=0.2)
+        for _ in range(2):
+            with self.assertRaises(LLMUnavailableError):
+                ask(client)
+
+        # 半开状态下截止时间已过的调用不应占用试探资格，之后的调用仍可试探并关闭熔断器
+        time.sleep(0.3)
+        with self.assertRaises(LLMUnavailableError):
+            client.chat_completion(messages=[{'role': 'user', 'content': 'hi'}], deadline=1e-9)
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(ask(client), f'reply from {client.model}')
+        self.assertEqual(client.status()['endpoints'][0]['state'], 'closed')
+
+    def test_falls_back_to_next_endpoint(self):
+        primary = self.server(statuses=[503] * 10)
+        fallback = self.server()
+        client = make_client(
+            primary,
+            fallbacks=json.dumps([{'base_url': fallback.base_url, 'model': 'fallback-model'}]),
+            LLM_MAX_RETRIES=1
+        )
+        self.assertEqual(ask(client), 'reply from fallback-model')
+        self.assertEqual(len(primary.requests), 2)
+        self.assertEqual(len(fallback.requests), 1)
+
+    def test_configured_model_is_used(self):
+        stub = self.server()
+        self.assertEqual(ask(make_client(stub)), 'reply from primary-model')
+
+
+class ModelRouterTest(unittest.TestCase):
+    MODELS = [
+        {'name': 'reasoner', 'purposes': ['final'], 'latency': 60, 'cost': 4, 'max_p95': 120},
+        {'name': 'fast', 'purposes': ['final', 'preview', 'summary'], 'latency': 10, 'cost': 1},
+        {'name': 'small', 'purposes': ['preview', 'summary'], 'latency': 5, 'cost': 1},
+    ]
+
+    def test_routes_by_purpose_and_prior_latency(self):
+        router = ModelRouter('reasoner', self.MODELS)
+        self.assertEqual(router.select('preview'), 'small')
+        self.assertEqual(router.select('final'), 'fast')
+
+    def test_routes_by_measured_latency(self):
+        router = ModelRouter('reasoner', self.MODELS)
+        # small实测明显变慢后，预览改用fast
+        for _ in range(10):
+            router.record('small', 30, 'preview')
+            router.record('fast', 8, 'preview')
+        self.assertEqual(router.select('preview'), 'fast')
+
+    def test_excludes_models_over_p95_limit(self):
+        router = ModelRouter('reasoner', [
+            {'name': 'reasoner', 'purposes': ['final'], 'latency': 1, 'max_p95': 5},
+            {'name': 'fast', 'purposes': ['final'], 'latency': 20},
+        ])
+        self.assertEqual(router.select('final'), 'reasoner')
+        for _ in range(10):
+            router.record('reasoner', 10, 'final')
+        self.assertEqual(router.select('final'), 'fast')
+
+    def test_samples_are_kept_per_purpose(self):
+        router = ModelRouter('reasoner', self.MODELS)
+        # fast处理摘要时很快，但不能因此拉低它生成正式文档的延迟估计
+        for _ in range(10):
+            router.record('fast', 1, 'summary')
+            router.record('fast', 300, 'final')
+        self.assertEqual(router.select('final'), 'reasoner')
+        self.assertEqual(router.select('summary'), 'fast')
+
+    def test_candidates_do_not_follow_latency(self):
+        router = ModelRouter('reasoner', self.MODELS)
+        before = router.candidates('final')
+        for _ in range(10):
+            router.record('fast', 300, 'final')
+        # 路由已改选reasoner，但缓存键使用的候选模型不变
+        self.assertEqual(router.select('final'), 'reasoner')
+        self.assertEqual(router.candidates('final'), before)
+        self.assertEqual(before, ['fast', 'reasoner'])
+
+    def test_client_records_latency(self):
+        stub = StubServer(delay=0.05)
+        try:
+            client = make_client(stub, models=self.MODELS)
+            for _ in range(5):
+                ask(client, model='small', purpose='preview')
+            stats = {item['name']: item for item in client.status()['models']}
+            self.assertEqual(stats['small']['samples'], 5)
+            self.assertGreaterEqual(stats['small']['p50'], 0.05)
+            self.assertEqual(stats['small']['by_purpose']['preview']['samples'], 5)
+        finally:
+            stub.close()
+
+
+if __name__ == '__main__':
+    unittest.main()